@@ -0,0 +1,197 @@
+"""Choosing max_nodes from the vertex statistics of a dataset ("auto" mode).
+
+A fixed max_nodes suits some datasets badly. Datasets of many moderately
+detailed but spatially small features (parcels, survey blocks) gain nothing
+from being cut up, yet 256 splits each of them into several pieces and
+multiplies the output. Large, dense features (coastlines, EEZs) have to be
+cut finely or every query touching them clips thousands of vertices.
+
+The scan pass records a histogram of per-feature vertex counts and bbox
+extents (VertexHistogram), and choose_max_nodes picks the candidate max_nodes
+with the lowest modeled query cost: the expected work of a query window of
+query_extent degrees placed at random, where every output piece whose bbox it
+touches costs feature_cost (fetching, decoding, indexing) plus its vertex
+count (clipping).
+"""
+
+import math
+import os
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+
+DEFAULT_MAX_NODES = 256
+CANDIDATES = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+# Subdivided pieces average roughly this fraction of max_nodes vertices.
+# Smooth polygons come close to half; jagged coastlines fall apart into more,
+# smaller pieces.
+PIECE_FILL = 0.4
+# Extents of degenerate features are rounded up to this (degrees)
+_MIN_EXTENT = 2.0 ** -20
+
+
+def parse_max_nodes(value) -> Union[int, str, None]:
+    """max_nodes from an event or environment value: a positive int, "auto",
+    or None if the value is missing or malformed."""
+    if value is None:
+        return None
+    if isinstance(value, str) and value.strip().lower() == "auto":
+        return "auto"
+    try:
+        value = int(value)
+    except Exception:
+        return None
+    return value if value > 0 else None
+
+
+def model_settings_from_env() -> Dict[str, float]:
+    """Cost model settings.
+
+    AUTO_MAX_NODES_FEATURE_COST: cost of one output piece touched by a query,
+        in vertices clipped (default 200)
+    AUTO_MAX_NODES_QUERY_EXTENT: typical width of a query in degrees
+        (default 0.5)
+    """
+    settings = {"feature_cost": 200.0, "query_extent": 0.5}
+    for key, name in (("feature_cost", "AUTO_MAX_NODES_FEATURE_COST"), ("query_extent", "AUTO_MAX_NODES_QUERY_EXTENT")):
+        try:
+            value = float(os.getenv(name, str(settings[key])))
+            if value > 0:
+                settings[key] = value
+        except Exception:
+            pass
+    return settings
+
+
+def geometry_extent(geom) -> float:
+    """Larger side, in degrees, of the bbox of a GeoJSON-like (Multi)Polygon."""
+    if geom['type'] == 'Polygon':
+        rings = geom['coordinates'][:1]
+    elif geom['type'] == 'MultiPolygon':
+        rings = [polygon[0] for polygon in geom['coordinates'] if polygon]
+    else:
+        return 0.0
+    mins = []
+    maxs = []
+    for ring in rings:
+        if len(ring) == 0:
+            continue
+        coords = np.asarray(ring, dtype=float)[:, :2]
+        mins.append(coords.min(axis=0))
+        maxs.append(coords.max(axis=0))
+    if not mins:
+        return 0.0
+    width, height = np.max(maxs, axis=0) - np.min(mins, axis=0)
+    return float(max(width, height))
+
+
+def _bucket(value: float) -> int:
+    return math.floor(math.log2(value))
+
+
+class VertexHistogram:
+    """Features bucketed by powers of two of vertex count and bbox extent.
+
+    Each (vertex bucket, extent bucket) cell keeps its feature count and the
+    sums of vertices and extents, so the model can use the cell means.
+    """
+
+    def __init__(self):
+        self.cells: Dict[Tuple[int, int], List[float]] = {}
+
+    def add(self, num_nodes: int, extent: float):
+        num_nodes = max(1, int(num_nodes))
+        extent = max(_MIN_EXTENT, extent)
+        cell = self.cells.setdefault((_bucket(num_nodes), _bucket(extent)), [0, 0, 0.0])
+        cell[0] += 1
+        cell[1] += num_nodes
+        cell[2] += extent
+
+    @property
+    def num_features(self) -> int:
+        return sum(cell[0] for cell in self.cells.values())
+
+    def vertex_histogram(self) -> List[List[int]]:
+        """[[lower bound of vertex bucket, feature count], ...]"""
+        counts: Dict[int, int] = {}
+        for (vertex_bucket, _), cell in self.cells.items():
+            counts[vertex_bucket] = counts.get(vertex_bucket, 0) + cell[0]
+        return [[2 ** bucket, counts[bucket]] for bucket in sorted(counts)]
+
+    def extent_histogram(self) -> List[List[float]]:
+        """[[lower bound of extent bucket in degrees, feature count], ...]"""
+        counts: Dict[int, int] = {}
+        for (_, extent_bucket), cell in self.cells.items():
+            counts[extent_bucket] = counts.get(extent_bucket, 0) + cell[0]
+        return [[2.0 ** bucket, counts[bucket]] for bucket in sorted(counts)]
+
+
+def estimate_pieces(num_nodes: float, max_nodes: int) -> int:
+    """Pieces a feature of num_nodes vertices is subdivided into."""
+    if num_nodes <= max_nodes:
+        return 1
+    return math.ceil(num_nodes / (max_nodes * PIECE_FILL))
+
+
+def query_cost(histogram: VertexHistogram, max_nodes: int, feature_cost: float, query_extent: float) -> Tuple[float, int]:
+    """Modeled cost of a random query, and the estimated output feature count.
+
+    A feature of n vertices and extent E becomes p pieces of n / p vertices
+    and extent E / sqrt(p). A query of extent q touches a piece with
+    probability proportional to (E / sqrt(p) + q)^2, and then pays
+    feature_cost plus the piece's vertices.
+    """
+    cost = 0.0
+    pieces = 0
+    for count, sum_nodes, sum_extent in histogram.cells.values():
+        num_nodes = sum_nodes / count
+        extent = sum_extent / count
+        p = estimate_pieces(num_nodes, max_nodes)
+        touch = (extent / math.sqrt(p) + query_extent) ** 2
+        cost += count * p * touch * (feature_cost + num_nodes / p)
+        pieces += count * p
+    return cost, pieces
+
+
+def choose_max_nodes(histogram: VertexHistogram, feature_cost: float = 200.0, query_extent: float = 0.5) -> Tuple[int, Dict[str, Any]]:
+    """Pick the candidate max_nodes with the lowest modeled query cost.
+
+    Candidates within 0.05% of the lowest cost tie, and the one closest to
+    DEFAULT_MAX_NODES wins (e.g. when no feature needs subdividing at all).
+
+    Returns:
+        (max_nodes, model) where model holds the inputs (settings and
+        histograms) and every candidate's estimated output feature count and
+        cost relative to the chosen one
+    """
+    if histogram.num_features == 0:
+        return DEFAULT_MAX_NODES, {"reason": "empty dataset"}
+    costs = {
+        candidate: query_cost(histogram, candidate, feature_cost, query_extent)
+        for candidate in CANDIDATES
+    }
+    lowest = min(cost for cost, _ in costs.values())
+    chosen = min(
+        CANDIDATES,
+        key=lambda candidate: (
+            round(costs[candidate][0] / lowest, 3) if lowest else 0,
+            abs(math.log2(candidate / DEFAULT_MAX_NODES)),
+        ),
+    )
+    best = costs[chosen][0]
+    model = {
+        "feature_cost": feature_cost,
+        "query_extent": query_extent,
+        "num_features": histogram.num_features,
+        "vertex_histogram": histogram.vertex_histogram(),
+        "extent_histogram": histogram.extent_histogram(),
+        "candidates": [
+            {
+                "max_nodes": candidate,
+                "estimated_features": pieces,
+                "relative_cost": round(cost / best, 4) if best else 1.0,
+            }
+            for candidate, (cost, pieces) in costs.items()
+        ],
+    }
+    return chosen, model
@@ -0,0 +1,545 @@
+"""Benchmarks for the subdivision processors on synthetic inputs.
+
+Datasets are generated from a fixed seed, so every run (and every commit)
+processes the same features. They are written once as FlatGeobuf to a cache
+directory and reused. Each benchmark case runs in a fresh process so that its
+peak memory is not inflated by earlier cases.
+
+    python benchmark.py run --output before.json
+    python benchmark.py run --output after.json --cases coastlines,dense_points
+    python benchmark.py compare before.json after.json
+    python benchmark.py check-area --scale 0.1
+
+--scale shrinks or grows every dataset (e.g. --scale 0.1 for a quick run).
+Results are only comparable between runs with the same scale and seed.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import fiona
+import numpy as np
+import shapely
+from fiona.crs import CRS
+from shapely.geometry import shape
+
+from metrics import JobMetrics, peak_rss_mb
+
+# Bump when a generator changes, so cached datasets are regenerated and
+# results made with different inputs are not compared
+GENERATOR_VERSION = 1
+RESULTS_VERSION = 1
+DEFAULT_SEED = 42
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "subdivision-benchmark")
+
+
+def _count(value: float, scale: float) -> int:
+    return max(1, int(round(value * scale)))
+
+
+def _coastline_radii(rng: np.random.Generator, n: int, roughness: float) -> np.ndarray:
+    """Relative radii in [1 - roughness, 1 + roughness] that look like a coastline.
+
+    A random walk has the self-similar jaggedness of real coastlines. Its drift
+    is removed so the ring closes without a step.
+    """
+    walk = np.cumsum(rng.standard_normal(n))
+    walk -= walk[-1] * np.arange(n) / n
+    walk -= walk.mean()
+    walk /= max(np.abs(walk).max(), 1e-12)
+    return 1 + roughness * walk
+
+
+def _ring(rng, cx, cy, radius, n, roughness=0.35, z=None) -> List:
+    """Closed, non-self-intersecting ring of n + 1 coordinates around (cx, cy)."""
+    n = max(3, int(n))
+    theta = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    r = radius * _coastline_radii(rng, n, roughness)
+    columns = [cx + r * np.cos(theta), cy + r * np.sin(theta)]
+    if z is not None:
+        columns.append(rng.uniform(z[0], z[1], n))
+    coords = np.column_stack(columns)
+    return np.vstack([coords, coords[:1]]).tolist()
+
+
+def _wrap_lon(coords: List) -> List:
+    for coord in coords:
+        coord[0] = (coord[0] + 180) % 360 - 180
+    return coords
+
+
+def gen_coastlines(rng, scale) -> Iterator[Dict]:
+    """A few polygons with hundreds of thousands of vertices each."""
+    for _ in range(4):
+        cx, cy = rng.uniform(-150, 150), rng.uniform(-60, 60)
+        shell = _ring(rng, cx, cy, rng.uniform(3, 10), _count(250_000, scale))
+        hole = _ring(rng, cx, cy, 0.5, _count(5_000, scale), roughness=0.2)
+        yield {"type": "Polygon", "coordinates": [shell, hole]}
+
+
+def gen_tiny_polygons(rng, scale) -> Iterator[Dict]:
+    """Many small polygons of a handful of vertices, spread over the globe."""
+    for _ in range(_count(100_000, scale)):
+        cx, cy = rng.uniform(-179, 179), rng.uniform(-80, 80)
+        yield {
+            "type": "Polygon",
+            "coordinates": [_ring(rng, cx, cy, rng.uniform(0.001, 0.02), rng.integers(4, 9), 0.2)],
+        }
+
+
+def gen_pacific_eez(rng, scale) -> Iterator[Dict]:
+    """EEZ-sized polygons around the antimeridian, most of them crossing it.
+
+    Longitudes are wrapped to [-180, 180), so crossing rings jump between
+    180 and -180 the way they are stored in real datasets.
+    """
+    for i in range(_count(60, scale)):
+        cx, cy = rng.uniform(165, 195), rng.uniform(-35, 35)
+        shell = _wrap_lon(_ring(rng, cx, cy, rng.uniform(2, 8), rng.integers(500, 8_000)))
+        if i % 5 == 0:
+            island = _wrap_lon(_ring(rng, cx + 12, cy, 0.5, rng.integers(50, 500)))
+            yield {"type": "MultiPolygon", "coordinates": [[shell], [island]]}
+        else:
+            yield {"type": "Polygon", "coordinates": [shell]}
+
+
+def gen_invalid_rings(rng, scale) -> Iterator[Dict]:
+    """Self-intersecting rings: bowties, rings with a reversed run of
+    vertices, and holes that cross their shell."""
+    for i in range(_count(3_000, scale)):
+        cx, cy = rng.uniform(-170, 170), rng.uniform(-70, 70)
+        size = rng.uniform(0.05, 2)
+        kind = i % 3
+        if kind == 0:
+            x0, y0, x1, y1 = cx - size, cy - size, cx + size, cy + size
+            coords = [[x0, y0], [x1, y1], [x1, y0], [x0, y1], [x0, y0]]
+            yield {"type": "Polygon", "coordinates": [coords]}
+        elif kind == 1:
+            ring = _ring(rng, cx, cy, size, rng.integers(20, 2_000))
+            start = int(rng.integers(1, len(ring) // 2))
+            end = start + max(3, len(ring) // 4)
+            ring[start:end] = ring[start:end][::-1]
+            yield {"type": "Polygon", "coordinates": [ring]}
+        else:
+            shell = _ring(rng, cx, cy, size, rng.integers(20, 2_000))
+            hole = _ring(rng, cx + size, cy, size * 0.4, rng.integers(10, 200))
+            yield {"type": "Polygon", "coordinates": [shell, hole]}
+
+
+def gen_zm_polygons(rng, scale) -> Iterator[Dict]:
+    """Polygons with Z values (depth in meters)."""
+    for _ in range(_count(2_000, scale)):
+        cx, cy = rng.uniform(-170, 170), rng.uniform(-70, 70)
+        ring = _ring(rng, cx, cy, rng.uniform(0.1, 3), rng.integers(50, 3_000), z=(-200, 0))
+        yield {"type": "Polygon", "coordinates": [ring]}
+
+
+def _random_walk_line(rng, n, z=None) -> List:
+    n = max(2, int(n))
+    x0, y0 = rng.uniform(-180, 180), rng.uniform(-60, 60)
+    step = rng.uniform(0.001, 0.05)
+    angles = np.cumsum(rng.normal(0, 0.3, n)) + rng.uniform(0, 2 * np.pi)
+    x = x0 + np.cumsum(step * np.cos(angles))
+    y = np.clip(y0 + np.cumsum(step * np.sin(angles)), -89, 89)
+    columns = [(x + 180) % 360 - 180, y]
+    if z is not None:
+        columns.append(rng.uniform(z[0], z[1], n))
+    return np.column_stack(columns).tolist()
+
+
+def gen_long_lines(rng, scale) -> Iterator[Dict]:
+    """Long random-walk lines (tracks, cables), some crossing the antimeridian."""
+    for i in range(_count(400, scale)):
+        n = rng.choice([50, 1_000, 20_000])
+        if i % 10 == 0:
+            parts = [_random_walk_line(rng, n // 4) for _ in range(4)]
+            yield {"type": "MultiLineString", "coordinates": parts}
+        else:
+            yield {"type": "LineString", "coordinates": _random_walk_line(rng, n)}
+
+
+def gen_zm_lines(rng, scale) -> Iterator[Dict]:
+    """Lines with Z values."""
+    for _ in range(_count(1_000, scale)):
+        yield {
+            "type": "LineString",
+            "coordinates": _random_walk_line(rng, rng.integers(10, 5_000), z=(-100, 0)),
+        }
+
+
+def gen_dense_points(rng, scale) -> Iterator[Dict]:
+    """Clustered points, some MultiPoints, and some coordinates out of range
+    that have to be normalized."""
+    centers = np.column_stack([rng.uniform(-180, 180, 50), rng.uniform(-70, 70, 50)])
+    for i in range(_count(400_000, scale)):
+        cx, cy = centers[rng.integers(0, len(centers))]
+        if i % 10 == 0:
+            n = int(rng.integers(2, 20))
+            coords = np.column_stack([rng.normal(cx, 1, n), rng.normal(cy, 1, n)])
+            yield {"type": "MultiPoint", "coordinates": coords.tolist()}
+        elif i % 97 == 0:
+            yield {"type": "Point", "coordinates": [cx + 360, min(cy * 2, 95)]}
+        else:
+            yield {"type": "Point", "coordinates": [rng.normal(cx, 1), rng.normal(cy, 1)]}
+
+
+# name -> (schema geometry type, generator)
+DATASETS: Dict[str, Any] = {
+    "coastlines": ("Polygon", gen_coastlines),
+    "tiny_polygons": ("Polygon", gen_tiny_polygons),
+    "pacific_eez": ("Unknown", gen_pacific_eez),
+    "invalid_rings": ("Polygon", gen_invalid_rings),
+    # Fiona 1.9 cannot write M values, so the "zm" datasets carry Z only
+    "zm_polygons": ("3D Polygon", gen_zm_polygons),
+    "long_lines": ("Unknown", gen_long_lines),
+    "zm_lines": ("3D LineString", gen_zm_lines),
+    "dense_points": ("Unknown", gen_dense_points),
+}
+
+
+def dataset_path(name: str, data_dir: str, scale: float, seed: int) -> str:
+    """Path of a generated dataset, creating it if it is not cached yet."""
+    path = os.path.join(data_dir, f"{name}-scale{scale:g}-seed{seed}-v{GENERATOR_VERSION}.fgb")
+    if os.path.exists(path):
+        return path
+    os.makedirs(data_dir, exist_ok=True)
+    geometry_type, generator = DATASETS[name]
+    # Each dataset gets its own stream, so adding a dataset leaves the others unchanged
+    rng = np.random.default_rng([seed, sorted(DATASETS).index(name)])
+    schema = {"geometry": geometry_type, "properties": {"id": "int", "name": "str"}}
+    start = time.perf_counter()
+    # GDAL writes a directory of layers unless the name ends in .fgb
+    tmp_path = path[:-len(".fgb")] + ".tmp.fgb"
+    with fiona.open(tmp_path, "w", driver="FlatGeobuf", crs=CRS.from_epsg(4326), schema=schema) as dst:
+        batch = []
+        for i, geometry in enumerate(generator(rng, scale)):
+            batch.append({"geometry": geometry, "properties": {"id": i, "name": f"{name}-{i}"}})
+            if len(batch) >= 1000:
+                dst.writerecords(batch)
+                batch.clear()
+        if batch:
+            dst.writerecords(batch)
+    os.replace(tmp_path, path)
+    print(f"Generated {name} in {time.perf_counter() - start:.1f}s ({os.path.getsize(path) / 1e6:.1f} MB)")
+    return path
+
+
+def _run_process_file(input_file, output_file, metrics, **params):
+    from subdivide import process_file
+    process_file(input_file, output_file, params.pop("max_nodes", 256), metrics=metrics, **params)
+
+
+def _run_process_lines(input_file, output_file, metrics, **params):
+    from lines import process_lines
+    process_lines(input_file, output_file, params.pop("max_nodes", 256), metrics=metrics, **params)
+
+
+def _run_process_points(input_file, output_file, metrics, **params):
+    from points import process_points
+    process_points(input_file, output_file, metrics=metrics, **params)
+
+
+def _run_antimeridian_split(input_file, output_file, metrics, **params):
+    """Split every polygon of input_file; only the split itself is timed."""
+    from subdivide import antimeridian_split_to_non_crossing
+    with fiona.open(input_file) as src:
+        geometries = [dict(feature["geometry"]) for feature in src]
+    vertices = sum(int(shapely.get_num_coordinates(shape(g))) for g in geometries)
+    parts = 0
+    with metrics.phase("processing"):
+        for geometry in geometries:
+            result = antimeridian_split_to_non_crossing(geometry)
+            parts += len(result["coordinates"]) if result["type"] == "MultiPolygon" else 1
+    metrics.count("input_features", len(geometries))
+    metrics.count("input_vertices", vertices)
+    metrics.count("output_features", parts)
+
+
+# Processors that write an output file
+_WRITES_OUTPUT = {"process_file", "process_lines", "process_points"}
+
+PROCESSORS: Dict[str, Callable] = {
+    "process_file": _run_process_file,
+    "process_lines": _run_process_lines,
+    "process_points": _run_process_points,
+    "antimeridian_split": _run_antimeridian_split,
+}
+
+# name -> (dataset, processor, processor params)
+CASES: Dict[str, Any] = {
+    "coastlines": ("coastlines", "process_file", {}),
+    "tiny_polygons": ("tiny_polygons", "process_file", {}),
+    "pacific_eez": ("pacific_eez", "process_file", {}),
+    "pacific_eez_auto": ("pacific_eez", "process_file", {"max_nodes": "auto"}),
+    "invalid_rings": ("invalid_rings", "process_file", {"repair_invalid": True}),
+    "zm_polygons": ("zm_polygons", "process_file", {}),
+    "coastlines_quadtree": ("coastlines", "process_file", {"strategy": "quadtree"}),
+    "zm_polygons_quadtree": ("zm_polygons", "process_file", {"strategy": "quadtree"}),
+    "pacific_eez_split": ("pacific_eez", "antimeridian_split", {}),
+    "long_lines": ("long_lines", "process_lines", {}),
+    "zm_lines": ("zm_lines", "process_lines", {}),
+    "dense_points": ("dense_points", "process_points", {}),
+}
+
+
+def run_case(name: str, input_file: str, repeat: int = 1, verbose: bool = False) -> Dict[str, Any]:
+    """Run one case repeat times and return its result record.
+
+    Meant to run in a fresh process (see run_cases); the peak memory it
+    reports is that of the whole process.
+    """
+    dataset, processor, params = CASES[name]
+    timings = []
+    metrics = None
+    output_features = None
+    output_bytes = None
+    with tempfile.TemporaryDirectory() as tmp:
+        output_file = os.path.join(tmp, "output.fgb")
+        for _ in range(repeat):
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            metrics = JobMetrics()
+            start = time.perf_counter()
+            with contextlib.ExitStack() as stack:
+                if not verbose:
+                    # Processor logs and progress bars
+                    stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+                    stack.enter_context(contextlib.redirect_stderr(io.StringIO()))
+                PROCESSORS[processor](input_file, output_file, metrics, **dict(params))
+            timings.append(time.perf_counter() - start)
+        if processor in _WRITES_OUTPUT:
+            with fiona.open(output_file) as src:
+                output_features = len(src)
+            output_bytes = os.path.getsize(output_file)
+        else:
+            output_features = metrics.counters.get("output_features")
+
+    seconds = min(timings)
+    input_features = metrics.counters.get("input_features")
+    input_vertices = metrics.counters.get("input_vertices")
+    return {
+        "case": name,
+        "dataset": dataset,
+        "processor": processor,
+        "params": params,
+        "seconds": round(seconds, 4),
+        "seconds_median": round(statistics.median(timings), 4),
+        "repeat": repeat,
+        "input_bytes": os.path.getsize(input_file),
+        "input_features": input_features,
+        "input_vertices": input_vertices,
+        "output_features": output_features,
+        "output_bytes": output_bytes,
+        "features_per_second": round(input_features / seconds, 1) if input_features else None,
+        "vertices_per_second": round(input_vertices / seconds, 1) if input_vertices else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "phases": {phase: round(value, 4) for phase, value in metrics.phases.items()},
+    }
+
+
+def run_cases(names: List[str], data_dir: str, scale: float, seed: int, repeat: int, verbose: bool) -> List[Dict]:
+    results = []
+    for name in names:
+        path = dataset_path(CASES[name][0], data_dir, scale, seed)
+        # A fresh interpreter per case keeps peak memory per case, not cumulative
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            result = executor.submit(run_case, name, path, repeat, verbose).result()
+        print(
+            f"{name}: {result['seconds']:.3f}s, "
+            f"{result['output_features']} output features, "
+            f"peak {result['peak_rss_mb']:.0f} MB"
+        )
+        results.append(result)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True,
+            check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.1) -> List[str]:
+    """Print a per-case comparison of two result files and return the cases
+    that got slower by more than threshold (a fraction) or changed output."""
+    for key in ("scale", "seed", "generator_version"):
+        if baseline.get(key) != current.get(key):
+            print(f"Warning: {key} differs ({baseline.get(key)} vs {current.get(key)}); "
+                  "results are not comparable")
+    base_cases = {result["case"]: result for result in baseline["results"]}
+    regressions = []
+    print(f"{'case':<20} {'base s':>9} {'new s':>9} {'change':>8} {'base MB':>8} {'new MB':>8}  output")
+    for result in current["results"]:
+        base = base_cases.get(result["case"])
+        if base is None:
+            print(f"{result['case']:<20} {'-':>9} {result['seconds']:>9.3f}  (new case)")
+            continue
+        change = result["seconds"] / base["seconds"] - 1 if base["seconds"] else 0.0
+        notes = []
+        if change > threshold:
+            notes.append("SLOWER")
+            regressions.append(result["case"])
+        elif change < -threshold:
+            notes.append("faster")
+        if result["output_features"] != base["output_features"]:
+            notes.append(f"output features {base['output_features']} -> {result['output_features']}")
+            if result["case"] not in regressions:
+                regressions.append(result["case"])
+        print(
+            f"{result['case']:<20} {base['seconds']:>9.3f} {result['seconds']:>9.3f} "
+            f"{change:>+8.1%} {base['peak_rss_mb']:>8.0f} {result['peak_rss_mb']:>8.0f}  "
+            + ", ".join(notes)
+        )
+    return regressions
+
+
+# Polygon datasets check-area subdivides with every strategy
+AREA_DATASETS = ["coastlines", "tiny_polygons", "pacific_eez", "invalid_rings", "zm_polygons"]
+
+
+def check_area(path: str, max_nodes: int, tolerance: float = 1e-7):
+    """Subdivide every polygon of the dataset at path with each strategy.
+
+    Returns the indices of features whose pieces do not add up to the area of
+    the bisected feature (within tolerance, relative), and the number of
+    pieces per strategy. Invalid features are repaired first, since the area
+    of an invalid polygon is not meaningful."""
+    from shapely.validation import make_valid
+    from subdivide import SUBDIVISION_STRATEGIES, _polygon_parts, subdivide_geometry
+
+    mismatched = []
+    pieces = dict.fromkeys(SUBDIVISION_STRATEGIES, 0)
+    with fiona.open(path) as src:
+        for i, feature in enumerate(src):
+            geom = shape(feature["geometry"])
+            if not geom.is_valid:
+                geom = shapely.multipolygons(_polygon_parts(make_valid(geom)))
+            if geom.is_empty:
+                continue
+            expected = sum(part.area for part, _ in subdivide_geometry(geom, max_nodes))
+            failed = False
+            for name, strategy in SUBDIVISION_STRATEGIES.items():
+                parts = strategy(geom, max_nodes)
+                pieces[name] += len(parts)
+                area = sum(part.area for part, _ in parts)
+                if not failed and abs(area - expected) > tolerance * max(expected, 1e-12):
+                    print(f"{os.path.basename(path)} feature {i}: {name} area {area!r}, bisect {expected!r}")
+                    mismatched.append(i)
+                    failed = True
+    return mismatched, pieces
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the subdivision processors on synthetic data.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run benchmark cases and write JSON results.")
+    run_parser.add_argument("--output", help="Write results to this JSON file (default: print them).")
+    run_parser.add_argument("--cases", help=f"Comma-separated cases (default: all of {', '.join(CASES)}).")
+    run_parser.add_argument("--scale", type=float, default=1.0,
+                            help="Multiply dataset sizes by this factor (default: 1).")
+    run_parser.add_argument("--seed", type=int, default=DEFAULT_SEED,
+                            help=f"Seed for the dataset generators (default: {DEFAULT_SEED}).")
+    run_parser.add_argument("--repeat", type=int, default=1,
+                            help="Run each case this many times and keep the fastest (default: 1).")
+    run_parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR,
+                            help=f"Where generated datasets are cached (default: {DEFAULT_DATA_DIR}).")
+    run_parser.add_argument("--verbose", action="store_true", help="Show the processors' output.")
+
+    compare_parser = commands.add_parser("compare", help="Compare two JSON result files.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="Slowdown (fraction) reported as a regression (default: 0.1).")
+    compare_parser.add_argument("--fail", action="store_true",
+                                help="Exit with status 1 if any case regressed or changed its output.")
+
+    area_parser = commands.add_parser(
+        "check-area", help="Check that every subdivision strategy conserves polygon area, "
+                           "and count the pieces each writes.")
+    area_parser.add_argument("--datasets", help=f"Comma-separated datasets (default: {', '.join(AREA_DATASETS)}).")
+    area_parser.add_argument("--scale", type=float, default=0.1,
+                             help="Multiply dataset sizes by this factor (default: 0.1).")
+    area_parser.add_argument("--seed", type=int, default=DEFAULT_SEED,
+                             help=f"Seed for the dataset generators (default: {DEFAULT_SEED}).")
+    area_parser.add_argument("--max-nodes", type=int, default=64,
+                             help="Maximum vertices per piece (default: 64).")
+    area_parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR,
+                             help=f"Where generated datasets are cached (default: {DEFAULT_DATA_DIR}).")
+
+    args = parser.parse_args()
+
+    if args.command == "check-area":
+        datasets = [name.strip() for name in args.datasets.split(",")] if args.datasets else AREA_DATASETS
+        failed = False
+        for name in datasets:
+            mismatched, pieces = check_area(dataset_path(name, args.data_dir, args.scale, args.seed), args.max_nodes)
+            print(
+                f"{name}: {len(mismatched)} features with area mismatches, pieces: "
+                + ", ".join(f"{strategy} {count}" for strategy, count in pieces.items())
+            )
+            failed = failed or bool(mismatched)
+        if failed:
+            sys.exit(1)
+        return
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions and args.fail:
+            sys.exit(1)
+        return
+
+    names = [name.strip() for name in args.cases.split(",")] if args.cases else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        print(f"Error: Unknown cases: {', '.join(unknown)}")
+        sys.exit(1)
+
+    report = {
+        "version": RESULTS_VERSION,
+        "commit": _git_commit(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "scale": args.scale,
+        "seed": args.seed,
+        "generator_version": GENERATOR_VERSION,
+        "results": run_cases(names, args.data_dir, args.scale, args.seed, max(1, args.repeat), args.verbose),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
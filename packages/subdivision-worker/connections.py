@@ -0,0 +1,115 @@
+"""HTTP session and AWS clients shared across warm Lambda invocations.
+
+Creating a client per call costs a TLS handshake (and for boto3 also endpoint
+and credential resolution) on every job. The session and clients here are
+created once per container and keep their connections alive between
+invocations. connection_stats reports how many requests each host served and
+how many connections had to be opened for them.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+import requests
+from botocore.config import Config as BotoConfig
+from requests.adapters import HTTPAdapter
+
+_HTTP_SESSION: Optional[requests.Session] = None
+_AWS_CLIENTS: Dict[Tuple, Any] = {}
+# boto3's default session is not thread-safe, and the SQS sender creates its
+# client from a background thread
+_AWS_CLIENTS_LOCK = threading.Lock()
+# connection_stats() totals at the previous log_connection_stats() call
+_last_stats: Dict[str, Dict[str, int]] = {}
+
+
+def default_region() -> str:
+    return os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "us-west-2"
+
+
+def get_http_session() -> requests.Session:
+    """Pooled requests session for downloads, reused across invocations."""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _HTTP_SESSION = session
+    return _HTTP_SESSION
+
+
+def get_aws_client(service: str, region_name: Optional[str] = None, max_pool_connections: int = 10, **kwargs):
+    """Cached boto3 client with TCP keep-alive.
+
+    Clients are keyed by service, region and any other client arguments
+    (endpoint_url, credentials), so differently configured clients for the
+    same service can coexist.
+    """
+    region_name = region_name or default_region()
+    key = (service, region_name, max_pool_connections, tuple(sorted(kwargs.items())))
+    with _AWS_CLIENTS_LOCK:
+        client = _AWS_CLIENTS.get(key)
+        if client is None:
+            client = boto3.client(
+                service,
+                region_name=region_name,
+                config=BotoConfig(tcp_keepalive=True, max_pool_connections=max_pool_connections),
+                **kwargs,
+            )
+            _AWS_CLIENTS[key] = client
+    return client
+
+
+def _pool_stats(pool_manager, stats: Dict[str, Dict[str, int]]):
+    # urllib3 keeps one pool per host, counting requests and opened connections
+    pools = pool_manager.pools
+    for pool_key in list(pools.keys()):
+        pool = pools.get(pool_key)
+        if pool is None:
+            continue
+        host_stats = stats.setdefault(pool.host, {"requests": 0, "connections": 0})
+        host_stats["requests"] += pool.num_requests
+        host_stats["connections"] += pool.num_connections
+
+
+def connection_stats() -> Dict[str, Dict[str, int]]:
+    """Requests served and connections opened per host since the container started."""
+    stats: Dict[str, Dict[str, int]] = {}
+    try:
+        if _HTTP_SESSION is not None:
+            # The same adapter is mounted for http:// and https://
+            adapters = {id(adapter): adapter for adapter in _HTTP_SESSION.adapters.values()}
+            for adapter in adapters.values():
+                _pool_stats(adapter.poolmanager, stats)
+        with _AWS_CLIENTS_LOCK:
+            clients = list(_AWS_CLIENTS.values())
+        for client in clients:
+            # botocore does not expose its pool manager publicly
+            _pool_stats(client._endpoint.http_session._manager, stats)
+    except Exception as e:
+        print(f"Could not collect connection stats: {e}")
+    return stats
+
+
+def log_connection_stats() -> Dict[str, Dict[str, int]]:
+    """Print and return requests and new connections per host since the last call."""
+    global _last_stats
+    totals = connection_stats()
+    delta = {}
+    for host, host_stats in totals.items():
+        previous = _last_stats.get(host, {"requests": 0, "connections": 0})
+        requests_made = host_stats["requests"] - previous["requests"]
+        if requests_made <= 0:
+            continue
+        new_connections = host_stats["connections"] - previous["connections"]
+        delta[host] = {"requests": requests_made, "connections": new_connections}
+        print(
+            f"Connections to {host}: {requests_made} requests, "
+            f"{new_connections} new connections, "
+            f"{max(0, requests_made - new_connections)} reused"
+        )
+    _last_stats = totals
+    return delta
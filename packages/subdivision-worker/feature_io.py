@@ -0,0 +1,292 @@
+"""Batched feature I/O: GDAL's Arrow stream interface, with Fiona as fallback.
+
+Reading and writing through Fiona materializes a Python dict per feature and
+per property. With pyogrio (built against GDAL >= 3.8) and pyarrow installed,
+open_layer reads a layer as batches of WKB geometries and Arrow attribute
+columns, and write_batches streams batches to a FlatGeobuf through a single
+Arrow stream, so processors can work on whole batches with shapely and NumPy.
+
+Without pyogrio or pyarrow, or with FEATURE_IO_BACKEND=fiona, the same
+interface is served by Fiona, converting geometries to and from WKB with
+shapely.
+
+    with open_layer(input_file) as layer:
+        batches = (process(batch) for batch in layer.batches(batch_size))
+        write_batches(output_file, batches, layer, "Point", {"__oidx": "int"})
+"""
+
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Sequence
+
+import fiona
+import numpy as np
+import shapely
+from shapely.geometry import mapping, shape
+
+try:
+    import pyarrow as pa
+    import pyogrio
+    from pyogrio.raw import open_arrow, write_arrow
+except ImportError:
+    pa = None
+    pyogrio = None
+
+ARROW = "arrow"
+FIONA = "fiona"
+
+# Arrow types of fields added by processors, by Fiona type name
+_ARROW_TYPES = {
+    "int": "int64",
+    "int64": "int64",
+    "int32": "int32",
+    "float": "float64",
+    "str": "string",
+    "bool": "bool",
+}
+
+
+def arrow_available() -> bool:
+    """True if pyogrio and pyarrow are installed and GDAL can write Arrow streams."""
+    return pyogrio is not None and pyogrio.__gdal_version__ >= (3, 8, 0)
+
+
+def backend_from_env() -> str:
+    """Backend from FEATURE_IO_BACKEND: "arrow", "fiona", or "auto" (default),
+    which uses Arrow when it is available."""
+    name = os.getenv("FEATURE_IO_BACKEND", "auto").strip().lower()
+    if name == FIONA:
+        return FIONA
+    if arrow_available():
+        return ARROW
+    if name == ARROW:
+        print("FEATURE_IO_BACKEND=arrow needs pyogrio (GDAL >= 3.8) and pyarrow, using fiona")
+    return FIONA
+
+
+def _take(column, indices: np.ndarray):
+    if pa is not None and isinstance(column, (pa.Array, pa.ChunkedArray)):
+        return column.take(pa.array(indices))
+    return np.asarray(column)[indices]
+
+
+class FeatureBatch:
+    """Features offset .. offset + len(batch) - 1 of a layer.
+
+    wkb is an object array of WKB geometries (None for null geometries).
+    columns maps attribute names to columns of the same length: pyarrow arrays
+    from the Arrow backend, NumPy arrays from Fiona or from processors.
+    """
+
+    def __init__(self, wkb: np.ndarray, columns: Dict[str, Sequence], offset: int = 0):
+        self.wkb = wkb
+        self.columns = columns
+        self.offset = offset
+
+    def __len__(self) -> int:
+        return len(self.wkb)
+
+    def geometries(self) -> np.ndarray:
+        """Shapely geometries of the batch (None for null geometries)."""
+        return shapely.from_wkb(self.wkb)
+
+    def take_columns(self, indices: np.ndarray) -> Dict[str, Sequence]:
+        """Attribute columns with rows selected (and repeated) by indices."""
+        return {name: _take(column, indices) for name, column in self.columns.items()}
+
+
+class _ArrowLayer:
+    backend = ARROW
+
+    def __init__(self, path: str):
+        self.path = path
+        info = pyogrio.read_info(path)
+        self.crs = info["crs"]
+        self.geometry_type = info["geometry_type"]
+        self.num_features = int(info["features"])
+        with open_arrow(path, max_features=0, use_pyarrow=True) as (meta, reader):
+            geometry_name = meta["geometry_name"] or "wkb_geometry"
+            self.fields = [field for field in reader.schema if field.name != geometry_name]
+
+    def batches(self, batch_size: int, columns: Optional[Sequence[str]] = None, start: int = 0) -> Iterator[FeatureBatch]:
+        offset = start
+        with open_arrow(
+            self.path, columns=columns, skip_features=start, batch_size=batch_size, use_pyarrow=True
+        ) as (meta, reader):
+            geometry_name = meta["geometry_name"] or "wkb_geometry"
+            for record_batch in reader:
+                if record_batch.num_rows == 0:
+                    continue
+                wkb = record_batch.column(geometry_name).to_numpy(zero_copy_only=False)
+                attributes = {
+                    name: record_batch.column(name)
+                    for name in record_batch.schema.names
+                    if name != geometry_name
+                }
+                yield FeatureBatch(wkb, attributes, offset)
+                offset += record_batch.num_rows
+
+    def close(self):
+        pass
+
+
+def _fiona_shape(geometry):
+    if geometry is None:
+        return None
+    if geometry.type == "GeometryCollection":
+        return shape(geometry)
+    # Going through the geometry's __geo_interface__ costs as much again
+    return shape({"type": geometry.type, "coordinates": geometry.coordinates})
+
+
+class _FionaLayer:
+    backend = FIONA
+
+    def __init__(self, path: str):
+        self.path = path
+        self._src = fiona.open(path, "r")
+        self.crs = self._src.crs
+        self.geometry_type = self._src.schema.get("geometry")
+        self.num_features = len(self._src)
+        self.fields = dict(self._src.schema.get("properties") or {})
+
+    def batches(self, batch_size: int, columns: Optional[Sequence[str]] = None, start: int = 0) -> Iterator[FeatureBatch]:
+        names = list(self.fields) if columns is None else list(columns)
+        offset = start
+        features = []
+        for feature in self._src.values(start, None):
+            features.append(feature)
+            if len(features) >= batch_size:
+                yield self._batch(features, names, offset)
+                offset += len(features)
+                features = []
+        if features:
+            yield self._batch(features, names, offset)
+
+    @staticmethod
+    def _batch(features, names, offset) -> FeatureBatch:
+        geometries = np.empty(len(features), dtype=object)
+        geometries[:] = [_fiona_shape(feature.geometry) for feature in features]
+        properties = [dict(feature.properties) for feature in features]
+        columns = {}
+        for name in names:
+            column = np.empty(len(features), dtype=object)
+            column[:] = [props.get(name) for props in properties]
+            columns[name] = column
+        return FeatureBatch(shapely.to_wkb(geometries), columns, offset)
+
+    def close(self):
+        self._src.close()
+
+
+@contextmanager
+def open_layer(path: str, backend: Optional[str] = None):
+    """Open the first layer of a file with backend (backend_from_env() by default).
+
+    The layer has crs, geometry_type, num_features, the backend's description
+    of the attribute fields, and batches(batch_size, columns=None, start=0),
+    which reads the layer as FeatureBatches from feature start on (features
+    before it are skipped without being parsed).
+    """
+    backend = backend or backend_from_env()
+    layer = _ArrowLayer(path) if backend == ARROW else _FionaLayer(path)
+    try:
+        yield layer
+    finally:
+        layer.close()
+
+
+def column_values(column) -> list:
+    """Values of a batch column as a Python list."""
+    if pa is not None and isinstance(column, (pa.Array, pa.ChunkedArray)):
+        return column.to_pylist()
+    return np.asarray(column).tolist()
+
+
+def _write_fiona(path, batches, like, geometry_type, extra_fields, layer_options):
+    schema = {
+        "geometry": geometry_type,
+        "properties": dict(like.fields, **extra_fields),
+    }
+    names = list(schema["properties"])
+    with fiona.open(path, "w", driver="FlatGeobuf", crs=like.crs, schema=schema, **layer_options) as dst:
+        for batch in batches:
+            geometries = [None if geom is None else mapping(geom) for geom in batch.geometries()]
+            values = [column_values(batch.columns[name]) for name in names]
+            dst.writerecords([
+                {"geometry": geom, "properties": dict(zip(names, row))}
+                for geom, row in zip(geometries, zip(*values))
+            ])
+
+
+def _arrow_column(column, type):
+    if isinstance(column, (pa.Array, pa.ChunkedArray)):
+        return column
+    return pa.array(column, type=type)
+
+
+def _write_arrow(path, batches, like, geometry_type, extra_fields, layer_options):
+    # Fields already in like keep their position, as with Fiona
+    fields = [
+        pa.field(field.name, _ARROW_TYPES[extra_fields[field.name]])
+        if field.name in extra_fields
+        else field
+        for field in like.fields
+    ]
+    names = {field.name for field in fields}
+    fields.extend(
+        pa.field(name, _ARROW_TYPES[type_name])
+        for name, type_name in extra_fields.items()
+        if name not in names
+    )
+    schema = pa.schema(fields + [pa.field("geometry", pa.binary())])
+    # GDAL reports an exception raised while producing a batch only as a
+    # stream error; keep it to re-raise instead
+    failure = []
+
+    def record_batches():
+        try:
+            for batch in batches:
+                arrays = [
+                    _arrow_column(batch.columns[field.name], field.type)
+                    for field in list(schema)[:-1]
+                ]
+                arrays.append(pa.array(batch.wkb, type=pa.binary()))
+                yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+        except BaseException as e:
+            failure.append(e)
+            raise
+
+    try:
+        write_arrow(
+            pa.RecordBatchReader.from_batches(schema, record_batches()),
+            path,
+            driver="FlatGeobuf",
+            geometry_name="geometry",
+            geometry_type=geometry_type,
+            crs=like.crs,
+            layer_options=layer_options or None,
+        )
+    except Exception:
+        if failure:
+            raise failure[0]
+        raise
+
+
+def write_batches(
+    path: str,
+    batches: Iterable[FeatureBatch],
+    like,
+    geometry_type: str,
+    extra_fields: Optional[Dict[str, str]] = None,
+    layer_options: Optional[Dict[str, str]] = None,
+):
+    """Write batches to a new FlatGeobuf with the backend of layer like.
+
+    The output has the CRS and attribute fields of like plus extra_fields
+    (name -> Fiona type name: int, float, str, bool), and every batch must
+    have a column for each of them. batches is consumed lazily, one batch at a
+    time, so it can be a generator that reports progress.
+    """
+    write = _write_arrow if like.backend == ARROW else _write_fiona
+    write(path, batches, like, geometry_type, dict(extra_fields or {}), dict(layer_options or {}))
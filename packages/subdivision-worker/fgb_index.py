@@ -0,0 +1,284 @@
+"""Packed Hilbert R-tree tuning for FlatGeobuf output.
+
+GDAL's FlatGeobuf writer already sorts features by the Hilbert value of their
+bbox centers when it builds the spatial index, but it always uses the default
+index node size (16) and does not expose it as an option. The node size decides
+how many levels the overlay engine walks, and so how many HTTP range requests a
+bbox query against R2 needs before it reaches features.
+
+Worker outputs always keep GDAL's index, since GDAL's FlatGeobuf driver
+assumes the default node size when it locates features (checked with GDAL 3.6
+in Fiona 1.9 and GDAL 3.8 in pyogrio 0.9): GDAL, OGR and everything built on
+them (Fiona, pyogrio, QGIS) cannot read files with any other node size.
+
+export_index_node_size writes a separate copy of a finished file with another
+node size, for experiments with readers that take the node size from the
+header (fgb-source and the flatgeobuf reference readers). The leaf level
+(feature bboxes and byte offsets, already in Hilbert order) is read from the
+existing index, so features are copied unchanged. It never modifies its input:
+
+    python fgb_index.py output.fgb output-node64.fgb --node-size 64
+
+See https://github.com/flatgeobuf/flatgeobuf/blob/master/src/fbs/header.fbs for
+the header layout and PackedRTree.cpp for the index layout.
+"""
+
+import argparse
+import os
+import shutil
+import struct
+import sys
+
+import numpy as np
+
+MAGIC_BYTES = b"fgb\x03fgb"
+DEFAULT_NODE_SIZE = 16
+
+NODE_ITEM = np.dtype(
+    [
+        ("min_x", "<f8"),
+        ("min_y", "<f8"),
+        ("max_x", "<f8"),
+        ("max_y", "<f8"),
+        ("offset", "<u8"),
+    ]
+)
+
+# Header table fields in schema order: (name, size in bytes, is_offset)
+_HEADER_FIELDS = (
+    ("name", 4, True),
+    ("envelope", 4, True),
+    ("geometry_type", 1, False),
+    ("has_z", 1, False),
+    ("has_m", 1, False),
+    ("has_t", 1, False),
+    ("has_tm", 1, False),
+    ("columns", 4, True),
+    ("features_count", 8, False),
+    ("index_node_size", 2, False),
+    ("crs", 4, True),
+    ("title", 4, True),
+    ("description", 4, True),
+    ("metadata", 4, True),
+)
+_FEATURES_COUNT = 8
+_INDEX_NODE_SIZE = 9
+_SCALAR_FORMATS = {1: "<B", 2: "<H", 8: "<Q"}
+
+
+def spatial_index_from_env() -> bool:
+    """False if FGB_SPATIAL_INDEX=NO asks for output without a spatial index."""
+    return os.getenv("FGB_SPATIAL_INDEX", "YES").strip().lower() not in ("no", "false", "0", "off")
+
+
+def output_layer_options() -> dict:
+    """FlatGeobuf layer creation options for output files.
+
+    Without a spatial index GDAL writes features straight to the output
+    instead of to a temporary file first, and only patches the header when it
+    closes the file, which lets the output be uploaded while it is written.
+    """
+    return {} if spatial_index_from_env() else {"SPATIAL_INDEX": "NO"}
+
+
+def _level_bounds(num_items: int, node_size: int):
+    """(start, end) node positions per level, leaves first, as PackedRTree does."""
+    level_num_nodes = [num_items]
+    n = num_items
+    while True:
+        n = (n + node_size - 1) // node_size
+        level_num_nodes.append(n)
+        if n == 1:
+            break
+    offset = sum(level_num_nodes)
+    bounds = []
+    for size in level_num_nodes:
+        offset -= size
+        bounds.append((offset, offset + size))
+    return bounds
+
+
+def packed_rtree_size(num_items: int, node_size: int) -> int:
+    """Size in bytes of the index for num_items features."""
+    if num_items == 0 or node_size == 0:
+        return 0
+    return _level_bounds(num_items, node_size)[0][1] * NODE_ITEM.itemsize
+
+
+def build_packed_rtree(leaves: np.ndarray, node_size: int) -> np.ndarray:
+    """Build all index nodes from leaf nodes that are already Hilbert sorted."""
+    bounds = _level_bounds(len(leaves), node_size)
+    nodes = np.empty(bounds[0][1], dtype=NODE_ITEM)
+    nodes[bounds[0][0]:] = leaves
+    for (pos, end), (new_pos, new_end) in zip(bounds, bounds[1:]):
+        children = nodes[pos:end]
+        starts = np.arange(0, end - pos, node_size)
+        parents = nodes[new_pos:new_end]
+        parents["min_x"] = np.minimum.reduceat(children["min_x"], starts)
+        parents["min_y"] = np.minimum.reduceat(children["min_y"], starts)
+        parents["max_x"] = np.maximum.reduceat(children["max_x"], starts)
+        parents["max_y"] = np.maximum.reduceat(children["max_y"], starts)
+        # Internal nodes point at the position of their first child
+        parents["offset"] = pos + starts
+    return nodes
+
+
+def _read_header_fields(header: bytes):
+    """Return {field index: absolute position of its value} for the header table."""
+    table = struct.unpack_from("<I", header, 0)[0]
+    vtable = table - struct.unpack_from("<i", header, table)[0]
+    vtable_len = struct.unpack_from("<H", header, vtable)[0]
+    num_fields = (vtable_len - 4) // 2
+    if num_fields > len(_HEADER_FIELDS):
+        raise ValueError("FlatGeobuf header has fields this module does not know")
+    field_offsets = struct.unpack_from(f"<{num_fields}H", header, vtable + 4)
+    return {i: table + off for i, off in enumerate(field_offsets) if off}
+
+
+def read_header(header: bytes) -> dict:
+    """Decode the scalar header fields needed to walk a FlatGeobuf file.
+
+    Returns geometry_type (the FlatGeobuf GeometryType code, 0 if features
+    have mixed types), has_z, has_m, has_t, has_tm, features_count and
+    index_node_size (0 if the file has no spatial index).
+    """
+    fields = _read_header_fields(header)
+    info = {}
+    for i, (name, size, is_offset) in enumerate(_HEADER_FIELDS):
+        if is_offset:
+            continue
+        if i in fields:
+            info[name] = struct.unpack_from(_SCALAR_FORMATS[size], header, fields[i])[0]
+        else:
+            info[name] = DEFAULT_NODE_SIZE if i == _INDEX_NODE_SIZE else 0
+    for name in ("has_z", "has_m", "has_t", "has_tm"):
+        info[name] = bool(info[name])
+    return info
+
+
+def _header_with_index_node_size(header: bytes, node_size: int) -> bytes:
+    """Return header bytes with index_node_size set.
+
+    GDAL leaves index_node_size at its default, which FlatBuffers omits, so a
+    new root table with the field is written in front of the old buffer. Its
+    offset fields point forward into the old buffer, which is kept as is.
+    """
+    fields = _read_header_fields(header)
+    if _INDEX_NODE_SIZE in fields:
+        patched = bytearray(header)
+        struct.pack_into("<H", patched, fields[_INDEX_NODE_SIZE], node_size)
+        return bytes(patched)
+
+    values = {}
+    for i, position in fields.items():
+        size = _HEADER_FIELDS[i][1]
+        values[i] = header[position:position + size]
+    values[_INDEX_NODE_SIZE] = struct.pack("<H", node_size)
+
+    num_fields = max(values) + 1
+    vtable_pos = 4
+    vtable_len = 4 + 2 * num_fields
+    # The table starts with a 4-byte soffset; starting it at 4 mod 8 makes
+    # the first (8-byte) field 8-aligned.
+    table_pos = vtable_pos + vtable_len
+    table_pos += (4 - table_pos % 8) % 8
+    # Lay out fields largest first so every field is naturally aligned
+    order = sorted(values, key=lambda i: -_HEADER_FIELDS[i][1])
+    field_offsets = [0] * num_fields
+    table_len = 4
+    for i in order:
+        field_offsets[i] = table_len
+        table_len += _HEADER_FIELDS[i][1]
+    prefix_len = table_pos + table_len
+    prefix_len += (8 - prefix_len % 8) % 8
+
+    prefix = bytearray(prefix_len)
+    struct.pack_into("<I", prefix, 0, table_pos)
+    struct.pack_into(f"<HH{num_fields}H", prefix, vtable_pos, vtable_len, table_len, *field_offsets)
+    struct.pack_into("<i", prefix, table_pos, table_pos - vtable_pos)
+    for i in order:
+        position = table_pos + field_offsets[i]
+        if _HEADER_FIELDS[i][2]:
+            target = fields[i] + struct.unpack("<I", values[i])[0]
+            struct.pack_into("<I", prefix, position, prefix_len + target - position)
+        else:
+            prefix[position:position + len(values[i])] = values[i]
+    return bytes(prefix) + header
+
+
+def export_index_node_size(path: str, export_path: str, node_size: int) -> bool:
+    """Write a copy of the FlatGeobuf file at path with a spatial index of
+    node_size to export_path. path itself is never modified.
+
+    Returns True if the copy was written, False if path has no index or
+    already uses node_size (nothing is written then).
+    """
+    if node_size < 2 or node_size > 65535:
+        raise ValueError(f"Invalid FlatGeobuf index node size: {node_size}")
+    if os.path.exists(export_path) and os.path.samefile(path, export_path):
+        raise ValueError("The export must not overwrite its input")
+    with open(path, "rb") as src:
+        magic = src.read(8)
+        if magic[:7] != MAGIC_BYTES:
+            raise ValueError(f"{path} is not a FlatGeobuf file")
+        header_len = struct.unpack("<I", src.read(4))[0]
+        header = src.read(header_len)
+        fields = _read_header_fields(header)
+        num_items = (
+            struct.unpack_from("<Q", header, fields[_FEATURES_COUNT])[0]
+            if _FEATURES_COUNT in fields
+            else 0
+        )
+        current = (
+            struct.unpack_from("<H", header, fields[_INDEX_NODE_SIZE])[0]
+            if _INDEX_NODE_SIZE in fields
+            else DEFAULT_NODE_SIZE
+        )
+        if num_items == 0 or current == 0 or current == node_size:
+            return False
+
+        index_len = packed_rtree_size(num_items, current)
+        leaves_len = num_items * NODE_ITEM.itemsize
+        src.seek(index_len - leaves_len, os.SEEK_CUR)
+        leaves = np.frombuffer(src.read(leaves_len), dtype=NODE_ITEM)
+        nodes = build_packed_rtree(leaves, node_size)
+        new_header = _header_with_index_node_size(header, node_size)
+
+        try:
+            with open(export_path, "wb") as dst:
+                dst.write(magic)
+                dst.write(struct.pack("<I", len(new_header)))
+                dst.write(new_header)
+                dst.write(nodes.tobytes())
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        except BaseException:
+            try:
+                os.remove(export_path)
+            except OSError:
+                pass
+            raise
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Copy a FlatGeobuf file with a spatial index of another node size. "
+                    "GDAL, OGR and pyogrio cannot read the copy unless the node size is 16."
+    )
+    parser.add_argument("input", help="FlatGeobuf file (not modified).")
+    parser.add_argument("output", help="Where to write the copy.")
+    parser.add_argument("--node-size", type=int, required=True, help="Node size of the copy's index.")
+    args = parser.parse_args()
+    try:
+        written = export_index_node_size(args.input, args.output, args.node_size)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if written:
+        print(f"Wrote {args.output} with index node size {args.node_size}")
+    else:
+        print(f"{args.input} has no spatial index or already uses node size {args.node_size}; nothing written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Incremental FlatGeobuf reading for files that are still being downloaded.
+
+FlatGeobuf is laid out as magic bytes, header, optional spatial index and then
+size-prefixed features in order, so features can be decoded as soon as their
+bytes arrive. The handler uses this to run the scan pass of process_file while
+the download is still in progress. Only the scan overlaps with the download:
+subdivision needs feature properties, which are not decoded here, so it reads
+the finished file with Fiona once the download is complete.
+
+Only what the scan pass needs is decoded: polygonal geometries (2D), not
+properties. See https://github.com/flatgeobuf/flatgeobuf/blob/master/src/fbs
+for the header and feature schemas.
+"""
+
+import struct
+import threading
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from fgb_index import MAGIC_BYTES, packed_rtree_size, read_header
+
+# FlatGeobuf GeometryType codes
+GEOMETRY_TYPES = {
+    0: "Unknown",
+    1: "Point",
+    2: "LineString",
+    3: "Polygon",
+    4: "MultiPoint",
+    5: "MultiLineString",
+    6: "MultiPolygon",
+    7: "GeometryCollection",
+}
+
+# Geometry table fields
+_ENDS = 0
+_XY = 1
+_TYPE = 6
+_PARTS = 7
+
+
+class FeatureStreamParser:
+    """Split a FlatGeobuf byte stream into feature buffers.
+
+    feed() takes the next bytes of the file and returns the features that are
+    now complete. header is set once the header has been read.
+    """
+
+    def __init__(self):
+        self.header: Optional[dict] = None
+        self._buffer = bytearray()
+        self._index_remaining = 0
+
+    def feed(self, data: bytes) -> List[bytes]:
+        self._buffer += data
+        buffer = self._buffer
+        pos = 0
+        features = []
+        if self.header is None:
+            if len(buffer) < 12:
+                return features
+            if bytes(buffer[:7]) != MAGIC_BYTES[:7]:
+                raise ValueError("Not a FlatGeobuf file")
+            header_len = struct.unpack_from("<I", buffer, 8)[0]
+            if len(buffer) < 12 + header_len:
+                return features
+            self.header = read_header(bytes(buffer[12:12 + header_len]))
+            self._index_remaining = packed_rtree_size(
+                self.header["features_count"], self.header["index_node_size"]
+            )
+            pos = 12 + header_len
+        if self._index_remaining:
+            skip = min(self._index_remaining, len(buffer) - pos)
+            self._index_remaining -= skip
+            pos += skip
+        if not self._index_remaining:
+            while len(buffer) - pos >= 4:
+                size = struct.unpack_from("<I", buffer, pos)[0]
+                if len(buffer) - pos - 4 < size:
+                    break
+                features.append(bytes(buffer[pos + 4:pos + 4 + size]))
+                pos += 4 + size
+        del buffer[:pos]
+        return features
+
+
+def _table_fields(buf: bytes, table: int):
+    """Return a function mapping a field index to its absolute position (or None)."""
+    vtable = table - struct.unpack_from("<i", buf, table)[0]
+    vtable_len = struct.unpack_from("<H", buf, vtable)[0]
+
+    def field(i):
+        entry = 4 + 2 * i
+        if entry >= vtable_len:
+            return None
+        offset = struct.unpack_from("<H", buf, vtable + entry)[0]
+        return table + offset if offset else None
+
+    return field
+
+
+def _vector(buf: bytes, position: int):
+    """(start of data, length) of the vector referenced at position."""
+    vector = position + struct.unpack_from("<I", buf, position)[0]
+    return vector + 4, struct.unpack_from("<I", buf, vector)[0]
+
+
+def _polygon_coordinates(buf: bytes, field):
+    xy_position = field(_XY)
+    if xy_position is None:
+        return []
+    start, length = _vector(buf, xy_position)
+    xy = np.frombuffer(buf, dtype="<f8", count=length, offset=start).reshape(-1, 2)
+    ends_position = field(_ENDS)
+    if ends_position is None:
+        ends = [len(xy)]
+    else:
+        start, length = _vector(buf, ends_position)
+        ends = np.frombuffer(buf, dtype="<u4", count=length, offset=start).tolist()
+    rings = []
+    ring_start = 0
+    for end in ends:
+        rings.append(xy[ring_start:end].tolist())
+        ring_start = end
+    return rings
+
+
+def decode_polygonal_geometry(feature: bytes, geometry_type: int = 0) -> Optional[dict]:
+    """Decode the geometry of a feature buffer as a GeoJSON-like dict.
+
+    Only Polygon and MultiPolygon are supported; other types and features
+    without geometry return None. Z/M values are dropped, as
+    strip_extra_dimensions would. geometry_type is the header's type, used
+    when the feature does not carry its own.
+    """
+    root = struct.unpack_from("<I", feature, 0)[0]
+    geometry_position = _table_fields(feature, root)(0)
+    if geometry_position is None:
+        return None
+    geometry = geometry_position + struct.unpack_from("<I", feature, geometry_position)[0]
+    field = _table_fields(feature, geometry)
+    type_position = field(_TYPE)
+    if type_position is not None:
+        geometry_type = feature[type_position]
+    geometry_type = GEOMETRY_TYPES.get(geometry_type)
+
+    if geometry_type == "Polygon":
+        return {"type": "Polygon", "coordinates": _polygon_coordinates(feature, field)}
+    if geometry_type == "MultiPolygon":
+        polygons = []
+        parts_position = field(_PARTS)
+        if parts_position is not None:
+            start, length = _vector(feature, parts_position)
+            for i in range(length):
+                offset = start + 4 * i
+                part = offset + struct.unpack_from("<I", feature, offset)[0]
+                polygons.append(_polygon_coordinates(feature, _table_fields(feature, part)))
+        return {"type": "MultiPolygon", "coordinates": polygons}
+    return None
+
+
+class GrowingFile:
+    """Byte count of a file another thread is writing, for readers that follow it."""
+
+    def __init__(self):
+        self.bytes_written = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+    def wrote(self, num_bytes: int):
+        with self._cond:
+            self.bytes_written += num_bytes
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def wait(self, position: int) -> int:
+        """Block until more than position bytes were written or the writer is done."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.bytes_written > position or self.done)
+            return self.bytes_written
+
+    def chunks(self, path: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Yield the contents of path as it is written, until the writer is done."""
+        position = 0
+        with open(path, "rb") as f:
+            while True:
+                available = self.wait(position)
+                if available <= position:
+                    return
+                f.seek(position)
+                data = f.read(min(available - position, chunk_size))
+                position += len(data)
+                yield data
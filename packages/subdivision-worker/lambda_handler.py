@@ -1,20 +1,30 @@
 import os
 import json
+import hashlib
 import tempfile
 from urllib.parse import urlparse
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from datetime import datetime, timezone
 import math
+import threading
+from collections import deque
 
-import boto3
-import requests
 import traceback
 import time
 
-from subdivide import process_file, detect_overlapping_features
+from subdivide import PolygonScan, process_file, scan_polygon_stream
 from points import process_points
 from raster import process_raster
 from lines import process_lines
+from parallel import default_worker_count
+from connections import get_aws_client, get_http_session, log_connection_stats
+from fgb_index import spatial_index_from_env
+from fgb_stream import GrowingFile
+from r2_upload import StreamingUpload, copy_object, transfer_settings_from_env, upload_file
+import result_cache
+from metrics import JobMetrics
+from progress import ProgressLog
+from auto_max_nodes import DEFAULT_MAX_NODES, model_settings_from_env, parse_max_nodes
 from geometry_utils import geometry_type_has_extra_dimensions, normalize_geometry_type
 from overlay_engine_access_token import (
     bust_overlay_engine_access_token_cache,
@@ -22,8 +32,6 @@ from overlay_engine_access_token import (
 )
 import fiona
 
-# Cached AWS clients (reused across messages and invocations)
-_SQS_CLIENTS: Dict[str, Any] = {}
 
 
 def _get_env(name: str, *, required: bool = False, default: Optional[str] = None) -> str:
@@ -33,29 +41,28 @@ def _get_env(name: str, *, required: bool = False, default: Optional[str] = None
     return value or ""
 
 
-def _create_r2_client():
-    print(f"Creating R2 client with endpoint {_get_env('R2_ENDPOINT', required=True)}")
-    print(f"Creating R2 client with access key {_get_env('R2_ACCESS_KEY_ID', required=True)}")
-    print(f"Creating R2 client with secret key {_get_env('R2_SECRET_ACCESS_KEY', required=True)}")
-    return boto3.client(
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _get_r2_client():
+    max_concurrency = transfer_settings_from_env()["max_concurrency"]
+    # One connection per concurrent part upload
+    return get_aws_client(
         "s3",
+        region_name=os.getenv("R2_REGION", "auto"),
+        max_pool_connections=max(10, max_concurrency),
         endpoint_url=_get_env("R2_ENDPOINT", required=True),
         aws_access_key_id=_get_env("R2_ACCESS_KEY_ID", required=True),
         aws_secret_access_key=_get_env("R2_SECRET_ACCESS_KEY", required=True),
-        region_name=os.getenv("R2_REGION", "auto"),
     )
 
 
 def _get_sqs_client(region: Optional[str] = None):
-    region_name = (
-        region
-        or os.getenv("AWS_REGION")
-        or os.getenv("AWS_DEFAULT_REGION")
-        or "us-west-2"
-    )
-    if region_name not in _SQS_CLIENTS:
-        _SQS_CLIENTS[region_name] = boto3.client("sqs", region_name=region_name)
-    return _SQS_CLIENTS[region_name]
+    return get_aws_client("sqs", region_name=region)
 
 
 def _extract_region_from_sqs_url(queue_url: str) -> Optional[str]:
@@ -80,10 +87,124 @@ def _send_sqs_message(queue_url: str, message: Dict[str, Any]):
         raise
 
 
+# send_message_batch accepts at most 10 entries
+_SQS_BATCH_SIZE = 10
+
+
+class _SqsSender:
+    """Send SQS messages from a background thread.
+
+    send() only appends to a bounded queue, so callers never wait on the
+    network. A progress message replaces the previous one if that one has not
+    been sent yet, so only the latest progress value goes out. The thread
+    drains the queue in send_message_batch calls of up to 10 messages.
+    """
+
+    def __init__(self, queue_url: str, max_pending: int = 100):
+        self.queue_url = queue_url
+        self.max_pending = max_pending
+        self._pending: deque = deque()
+        # Entry of the progress message still waiting in _pending, if any
+        self._pending_progress: Optional[list] = None
+        self._in_flight = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="sqs-sender", daemon=True)
+        self._thread.start()
+
+    def send(self, message: Dict[str, Any], coalesce: bool = False):
+        """Queue a message. With coalesce, replace a queued coalescable message."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("SQS sender is closed")
+            if coalesce and self._pending_progress is not None:
+                self._pending_progress[0] = message
+                return
+            # Only non-coalescable messages can fill the queue; wait for room
+            while len(self._pending) >= self.max_pending:
+                self._cond.wait()
+            entry = [message]
+            self._pending.append(entry)
+            if coalesce:
+                self._pending_progress = entry
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = 10.0) -> bool:
+        """Wait until every queued message was sent. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._pending and not self._in_flight, timeout
+            )
+
+    def close(self, timeout: Optional[float] = 10.0) -> bool:
+        """Flush queued messages and stop the thread."""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return flushed
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                batch = []
+                while self._pending and len(batch) < _SQS_BATCH_SIZE:
+                    entry = self._pending.popleft()
+                    if entry is self._pending_progress:
+                        self._pending_progress = None
+                    batch.append(entry[0])
+                self._in_flight = len(batch)
+                self._cond.notify_all()
+            try:
+                _send_sqs_batch(self.queue_url, batch)
+            except Exception:
+                pass
+            finally:
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+
+
+def _send_sqs_batch(queue_url: str, messages):
+    """Send up to 10 messages with one send_message_batch call.
+
+    Failed entries are retried once with send_message.
+    """
+    region = _extract_region_from_sqs_url(queue_url)
+    sqs = _get_sqs_client(region)
+    entries = [
+        {"Id": str(i), "MessageBody": json.dumps(message)}
+        for i, message in enumerate(messages)
+    ]
+    try:
+        response = sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        failed = [int(f["Id"]) for f in response.get("Failed", [])]
+    except Exception as e:
+        print(f"Failed to send SQS message batch to {queue_url}: {e}")
+        failed = list(range(len(messages)))
+    for i in failed:
+        try:
+            _send_sqs_message(queue_url, messages[i])
+        except Exception:
+            pass
+
+
 class ProgressNotifier:
+    """Job status messages for the job's SQS queue.
+
+    Messages are sent by a background _SqsSender; result() and error() wait
+    for everything queued so far to be sent. Call close() before the handler
+    returns.
+    """
+
     def __init__(self, job_key: str, queue_url: str, max_wait_ms: int = 1000):
         self.job_key = job_key
         self.queue_url = queue_url
+        self._sender = _SqsSender(queue_url)
         self.max_wait_ms = max_wait_ms
         self.progress = 0
         self.last_notified_progress = 0
@@ -136,11 +257,10 @@ class ProgressNotifier:
                 # Serialize ETA as ISO 8601 UTC string (e.g., 2025-01-01T00:00:00.000Z)
                 eta_iso = self._eta.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
                 payload["eta"] = eta_iso
-            _send_sqs_message(self.queue_url, payload)
+            self._sender.send(payload, coalesce=True)
 
     def begin(self, logfile_url: Optional[str] = None, logs_expires_at: Optional[str] = None):
-        _send_sqs_message(
-            self.queue_url,
+        self._sender.send(
             {
                 "type": "begin",
                 "logfileUrl": logfile_url,
@@ -152,8 +272,7 @@ class ProgressNotifier:
         )
 
     def error(self, error_message: str):
-        _send_sqs_message(
-            self.queue_url,
+        self._sender.send(
             {
                 "type": "error",
                 "error": error_message,
@@ -162,10 +281,10 @@ class ProgressNotifier:
                 "origin": "subdivision",
             },
         )
+        self._sender.flush()
 
     def result(self, result: Dict[str, Any]):
-        _send_sqs_message(
-            self.queue_url,
+        self._sender.send(
             {
                 "type": "result",
                 "result": result,
@@ -174,6 +293,12 @@ class ProgressNotifier:
                 "origin": "subdivision",
             },
         )
+        self._sender.flush()
+
+    def close(self):
+        """Send anything still queued and stop the sender thread."""
+        if not self._sender.close():
+            print(f"Timed out sending SQS messages for job {self.job_key}")
 
 
 class EtaEstimator:
@@ -275,12 +400,21 @@ class EtaEstimator:
         }
 
 
-def _download_with_progress(url: str, dest_path: str, progress_cb):
-    """Stream download from uploads; attaches overlay-engine Bearer, retries once on 401/403."""
+def _download_with_progress(url: str, dest_path: str, progress_cb, on_write=None) -> str:
+    """Stream download from uploads; attaches overlay-engine Bearer, retries once on 401/403.
+
+    on_write(num_bytes), if given, is called after each chunk is flushed to
+    dest_path, so another thread can read the file as it grows.
+
+    Returns the SHA-256 hex digest of the downloaded bytes, computed as they
+    arrive (the result cache key).
+    """
+    digest = None
 
     def _stream(auth_token: str):
+        nonlocal digest
         headers = {"Authorization": f"Bearer {auth_token}"}
-        with requests.get(url, stream=True, timeout=60, headers=headers) as resp:
+        with get_http_session().get(url, stream=True, timeout=60, headers=headers) as resp:
             if resp.status_code in (401, 403):
                 return resp.status_code
             resp.raise_for_status()
@@ -290,16 +424,22 @@ def _download_with_progress(url: str, dest_path: str, progress_cb):
             except Exception:
                 total_bytes = None
             bytes_read = 0
+            sha256 = hashlib.sha256()
             with open(dest_path, "wb") as f:
                 for chunk in resp.iter_content(chunk_size=1024 * 1024):
                     if not chunk:
                         continue
                     f.write(chunk)
+                    sha256.update(chunk)
                     bytes_read += len(chunk)
+                    if on_write is not None:
+                        f.flush()
+                        on_write(len(chunk))
                     try:
                         progress_cb("download", bytes_read, total_bytes)
                     except Exception:
                         pass
+            digest = sha256.hexdigest()
             return None
 
     token = get_overlay_engine_access_token()
@@ -312,41 +452,96 @@ def _download_with_progress(url: str, dest_path: str, progress_cb):
             raise RuntimeError(
                 f"HTTP {status} (uploads authentication failed) downloading {url}"
             )
+    return digest
+
+
+def _download_and_scan(
+    url: str, dest_path: str, progress_cb, histogram: bool = False
+) -> Tuple[Optional[PolygonScan], str]:
+    """Download a FlatGeobuf while running the polygon scan pass on it.
+
+    The download runs in a background thread and this thread parses features
+    from the file as they are written (see scan_polygon_stream), so the scan
+    overlaps with the network transfer instead of following it. Subdivision
+    itself still starts after the download.
+
+    Returns the PolygonScan for process_file (None if the input is not
+    polygonal or could not be scanned; the file is fully downloaded either
+    way) and the SHA-256 of the input. histogram adds the vertex histogram
+    that max_nodes "auto" mode needs.
+    """
+    growing = GrowingFile()
+    digest = None
+    # The reader opens the file before the first chunk arrives
+    open(dest_path, "wb").close()
+
+    def _download():
+        nonlocal digest
+        try:
+            digest = _download_with_progress(url, dest_path, progress_cb, on_write=growing.wrote)
+        except BaseException as e:
+            growing.finish(e)
+        else:
+            growing.finish()
+
+    thread = threading.Thread(target=_download, name="download", daemon=True)
+    thread.start()
+    scan = None
+    try:
+        scan = scan_polygon_stream(growing.chunks(dest_path), histogram=histogram)
+    except Exception as e:
+        print(f"Could not scan input during download: {e}")
+    thread.join()
+    if growing.error is not None:
+        raise growing.error
+    return scan, digest
 
 
 def _upload_to_r2(local_path: str, object_key: str, progress_cb=None) -> Dict[str, Any]:
     bucket = _get_env("R2_BUCKET", required=True)
     print(f"Uploading to {bucket}/{object_key}")
-    s3 = _create_r2_client()
+    s3 = _get_r2_client()
     if not os.path.exists(local_path):
         raise FileNotFoundError(f"Upload file not found: {local_path}")
-    
-    # Get file size for progress tracking
-    file_size = os.path.getsize(local_path)
-    
-    # Upload with progress tracking
-    if progress_cb:
-        def upload_progress_callback(bytes_transferred):
-            progress_cb("upload", bytes_transferred, file_size)
-        
-        s3.upload_file(
-            local_path, 
-            bucket, 
-            object_key, 
-            ExtraArgs={"ContentType": "application/octet-stream"},
-            Callback=upload_progress_callback
-        )
-    else:
-        s3.upload_file(local_path, bucket, object_key, ExtraArgs={"ContentType": "application/octet-stream"})
-    
-    # fetch size for downstream consumers
-    head = s3.head_object(Bucket=bucket, Key=object_key)
-    size = int(head.get("ContentLength") or 0)
+
+    # Size and ETag come from the upload itself, no head_object needed
+    uploaded = upload_file(
+        s3,
+        local_path,
+        bucket,
+        object_key,
+        progress_cb=progress_cb,
+        **transfer_settings_from_env(),
+    )
+    return _r2_object_result(bucket, object_key, uploaded)
+
+
+def _start_streaming_upload(local_path: str, object_key: str) -> StreamingUpload:
+    """Start uploading local_path to R2 while a processor is still writing it."""
+    bucket = _get_env("R2_BUCKET", required=True)
+    print(f"Streaming upload to {bucket}/{object_key} while writing")
+    settings = transfer_settings_from_env()
+    return StreamingUpload(
+        _get_r2_client(),
+        local_path,
+        bucket,
+        object_key,
+        multipart_chunksize=settings["multipart_chunksize"],
+        max_concurrency=settings["max_concurrency"],
+    )
+
+
+def _finish_streaming_upload(upload: StreamingUpload, progress_cb=None) -> Dict[str, Any]:
+    return _r2_object_result(upload.bucket, upload.key, upload.finish(progress_cb))
+
+
+def _r2_object_result(bucket: str, object_key: str, uploaded: Dict[str, Any]) -> Dict[str, Any]:
     result: Dict[str, Any] = {
         "bucket": bucket,
         "key": object_key,
         "r2Path": f"r2://{bucket}/{object_key}",
-        "size": size,
+        "size": uploaded["size"],
+        "etag": uploaded["etag"],
         "filename": os.path.basename(object_key),
     }
     public_base = os.getenv("R2_PUBLIC_BASE_URL")
@@ -355,16 +550,101 @@ def _upload_to_r2(local_path: str, object_key: str, progress_cb=None) -> Dict[st
     return result
 
 
+def _max_nodes_model_payload(model: Dict[str, Any]) -> Dict[str, Any]:
+    """camelCase version of process_file's max_nodes_model for the result message."""
+    if "candidates" not in model:
+        return dict(model)
+    return {
+        "featureCost": model["feature_cost"],
+        "queryExtent": model["query_extent"],
+        "numFeatures": model["num_features"],
+        "vertexHistogram": model["vertex_histogram"],
+        "extentHistogram": model["extent_histogram"],
+        "candidates": [
+            {
+                "maxNodes": candidate["max_nodes"],
+                "estimatedFeatures": candidate["estimated_features"],
+                "relativeCost": candidate["relative_cost"],
+            }
+            for candidate in model["candidates"]
+        ],
+    }
+
+
+def _result_stats(processing_stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Result message fields (other than object and metrics) for process_file stats."""
+    stats: Dict[str, Any] = {}
+    if processing_stats:
+        num_invalid = processing_stats.get("num_invalid_features")
+        num_features = processing_stats.get("num_features")
+        num_repaired = processing_stats.get("num_repaired_features")
+        was_repaired = processing_stats.get("was_repaired")
+        if num_invalid is not None and num_invalid > 0:
+            stats["numInvalidFeatures"] = num_invalid
+        if num_features is not None:
+            stats["numFeatures"] = num_features
+        stats["maxNodes"] = processing_stats.get("max_nodes")
+        model = processing_stats.get("max_nodes_model")
+        if model is not None:
+            stats["maxNodesModel"] = _max_nodes_model_payload(model)
+        if num_repaired is not None:
+            stats["numRepairedFeatures"] = num_repaired
+        if was_repaired:
+            stats["wasRepaired"] = True
+        contains_overlapping = processing_stats.get("contains_overlapping_features")
+        if contains_overlapping is not None:
+            stats["containsOverlappingFeatures"] = contains_overlapping
+        overlap_stats_result = processing_stats.get("overlap_stats")
+        if overlap_stats_result is not None:
+            stats["overlapStats"] = {
+                "numOverlappingFeaturePairs": overlap_stats_result["num_overlapping_feature_pairs"],
+                "numOverlappingPiecePairs": overlap_stats_result["num_overlapping_piece_pairs"],
+                "overlapAreaSqKm": overlap_stats_result["overlap_area_sqkm"],
+                "numFailedPiecePairs": overlap_stats_result["num_failed_piece_pairs"],
+            }
+    return stats
+
+
+def _lookup_cached_result(content_hash: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    bucket = _get_env("R2_BUCKET", required=True)
+    return result_cache.lookup(_get_r2_client(), bucket, content_hash, params)
+
+
+def _copy_cached_output(cached: Dict[str, Any], object_key: str, progress_cb=None) -> Dict[str, Any]:
+    """Copy a cached output to object_key (unless it is already there)."""
+    bucket = _get_env("R2_BUCKET", required=True)
+    cached_object = cached["object"]
+    if cached_object["key"] == object_key:
+        copied = {"size": cached_object["size"], "etag": cached_object["etag"]}
+    else:
+        print(f"Copying cached output {cached_object['key']} to {object_key}")
+        copied = copy_object(
+            _get_r2_client(),
+            bucket,
+            cached_object["key"],
+            object_key,
+            cached_object["size"],
+            max_concurrency=transfer_settings_from_env()["max_concurrency"],
+        )
+    try:
+        progress_cb("upload", copied["size"], copied["size"])
+    except Exception:
+        pass
+    return _r2_object_result(bucket, object_key, copied)
+
+
 def _parse_event(event: Dict[str, Any]) -> Dict[str, Any]:
     # Direct invocation
     if "url" in event:
         return {
             "url": event.get("url"),
             "key": event.get("key"),
-            "max_nodes": event.get("max_nodes"),
+            "max_nodes": parse_max_nodes(event.get("max_nodes")),
             "jobKey": event.get("jobKey"),
             "queueUrl": event.get("queueUrl"),
             "repair_invalid": bool(event.get("repair_invalid", False)),
+            "strategy": event.get("strategy"),
+            "overlap_stats": bool(event.get("overlap_stats", False)),
         }
 
     # API Gateway / Lambda Function URL
@@ -382,11 +662,10 @@ def _parse_event(event: Dict[str, Any]) -> Dict[str, Any]:
     job_key = q.get("jobKey") or body_obj.get("jobKey")
     queue_url = q.get("queueUrl") or body_obj.get("queueUrl")
     repair_invalid = q.get("repair_invalid") or body_obj.get("repair_invalid")
-    try:
-        max_nodes = int(max_nodes) if max_nodes is not None else None
-    except Exception:
-        max_nodes = None
-    return {"url": url, "key": key, "max_nodes": max_nodes, "jobKey": job_key, "queueUrl": queue_url, "repair_invalid": bool(repair_invalid)}
+    strategy = q.get("strategy") or body_obj.get("strategy")
+    overlap_stats = q.get("overlap_stats") or body_obj.get("overlap_stats")
+    max_nodes = parse_max_nodes(max_nodes)
+    return {"url": url, "key": key, "max_nodes": max_nodes, "jobKey": job_key, "queueUrl": queue_url, "repair_invalid": bool(repair_invalid), "strategy": strategy, "overlap_stats": bool(overlap_stats)}
 
 
 def handler(event, context):
@@ -400,12 +679,19 @@ def handler(event, context):
         return err
         
     is_raster = source_url.endswith(".tif") or source_url.endswith(".tiff") or source_url.endswith(".TIF") or source_url.endswith(".TIFF")
-    max_nodes = params.get("max_nodes") or int(os.getenv("MAX_NODES", "256"))
+    # A number, or "auto" to choose it per polygon dataset (see auto_max_nodes)
+    max_nodes = params.get("max_nodes") or parse_max_nodes(os.getenv("MAX_NODES")) or DEFAULT_MAX_NODES
     provided_key = params.get("key")
     object_key = provided_key if provided_key else None
     job_key = params.get("jobKey")
     queue_url = params.get("queueUrl")
     repair_invalid = params.get("repair_invalid", False)
+    strategy = params.get("strategy") or os.getenv("SUBDIVIDE_STRATEGY", "bisect")
+    overlap_stats = params.get("overlap_stats") or _env_flag("SUBDIVIDE_OVERLAP_STATS")
+
+    metrics = JobMetrics()
+    # Dimension of the job's metrics record: raster, or the input geometry type
+    metrics_dimensions = {"GeometryType": "Raster" if is_raster else None}
 
     notifier: Optional[ProgressNotifier] = None
     if job_key and queue_url:
@@ -415,6 +701,7 @@ def handler(event, context):
         except Exception:
             pass
     last_value = 0.0
+    progress_log = ProgressLog()
 
     def _overall_progress(phase: str, current: int, total: Optional[int]):
         nonlocal last_value
@@ -463,8 +750,8 @@ def handler(event, context):
         else:
             pct = last_value
         
-        # Debug logging
-        print(f"Progress: phase={phase}, current={current}, total={total}, calculated_pct={pct:.2f}")
+        # Debug logging, coalesced to about one line per percent
+        progress_log.log(phase, current, total, pct)
         
         # Clamp to valid range
         pct = max(0.0, min(100.0, pct))
@@ -480,6 +767,7 @@ def handler(event, context):
 
     upload_result = None
     processing_stats = None
+    streaming_upload: Optional[StreamingUpload] = None
     try:
         with tempfile.TemporaryDirectory() as tmpdir:
             if is_raster:
@@ -489,12 +777,54 @@ def handler(event, context):
                 input_path = os.path.join(tmpdir, "input.fgb")
                 output_path = os.path.join(tmpdir, "output.fgb")
 
-            _download_with_progress(source_url, input_path, _overall_progress)
-            
-            if is_raster:
+            single_pass = _env_flag("SUBDIVIDE_SINGLE_PASS")
+            scan = None
+            with metrics.phase("download"):
+                if not is_raster and not single_pass and _env_flag("SUBDIVIDE_STREAMING_SCAN", True):
+                    scan, content_hash = _download_and_scan(
+                        source_url, input_path, _overall_progress, histogram=max_nodes == "auto"
+                    )
+                else:
+                    content_hash = _download_with_progress(source_url, input_path, _overall_progress)
+            metrics.count("input_bytes", os.path.getsize(input_path))
+
+            # Identical input and parameters produce identical output, so a
+            # previous run's output can be copied instead (see result_cache)
+            cache_params = None
+            cached = None
+            if object_key and content_hash and _env_flag("RESULT_CACHE", True):
+                if is_raster:
+                    cache_params = result_cache.cache_params(raster=True)
+                else:
+                    # Everything the output depends on: in "auto" mode the
+                    # chosen max_nodes also depends on the scan pass (single-pass
+                    # mode uses the default) and on the cost model settings
+                    key_params = dict(
+                        max_nodes=max_nodes,
+                        single_pass=single_pass,
+                        repair_invalid=bool(repair_invalid),
+                        strategy=strategy,
+                        overlap_stats=bool(overlap_stats),
+                        spatial_index=spatial_index_from_env(),
+                    )
+                    if max_nodes == "auto":
+                        key_params["max_nodes_model"] = model_settings_from_env()
+                    cache_params = result_cache.cache_params(**key_params)
+                with metrics.phase("cache_lookup"):
+                    cached = _lookup_cached_result(content_hash, cache_params)
+
+            if cached is not None:
+                print(f"Input {content_hash} was processed before, reusing {cached['object']['key']}")
+                metrics.count("cache_hits")
+                source_epsg = cached["object"].get("epsg")
+                if not is_raster:
+                    metrics_dimensions["GeometryType"] = cached.get("geometryType")
+            elif is_raster:
                 # Route to raster processor for GeoTIFF -> COG conversion
                 print("Detected raster file, routing to raster processor")
-                source_epsg = process_raster(input_path, output_path, progress_callback=_overall_progress)
+                source_epsg = process_raster(
+                    input_path, output_path, progress_callback=_overall_progress, metrics=metrics
+                )
             else:
                 # Open file to detect geometry type
                 with fiona.open(input_path, "r") as src:
@@ -527,7 +857,14 @@ def handler(event, context):
                     
                     if not geom_type:
                         raise ValueError("Could not determine geometry type from file")
+                    metrics_dimensions["GeometryType"] = geom_type
                 
+                # Unindexed output is written front to back (GDAL only
+                # patches the header on close), so it can be uploaded while
+                # it is written instead of after
+                if object_key and not spatial_index_from_env() and _env_flag("FGB_STREAMING_UPLOAD"):
+                    streaming_upload = _start_streaming_upload(output_path, object_key)
+
                 # Route to appropriate processor based on geometry type (processors will open/close file themselves)
                 if geom_type in ('Point', 'MultiPoint'):
                     print(f"Detected geometry type: {geom_type}, routing to points processor")
@@ -536,6 +873,7 @@ def handler(event, context):
                         output_path,
                         progress_callback=_overall_progress,
                         strip_dimensions=strip_dimensions,
+                        metrics=metrics,
                     )
                 elif geom_type in ('Polygon', 'MultiPolygon'):
                     print(f"Detected geometry type: {geom_type}, routing to subdivision processor")
@@ -546,20 +884,26 @@ def handler(event, context):
                         progress_callback=_overall_progress,
                         repair_invalid=repair_invalid,
                         strip_dimensions=strip_dimensions,
+                        single_pass=single_pass,
+                        workers=default_worker_count(),
+                        strategy=strategy,
+                        detect_overlaps=True,
+                        overlap_stats=overlap_stats,
+                        scan=scan,
+                        metrics=metrics,
                     )
-                    contains_overlapping = detect_overlapping_features(output_path)
+                    contains_overlapping = processing_stats.get("contains_overlapping_features")
                     print(f"Contains overlapping features: {contains_overlapping}")
-                    if processing_stats is None:
-                        processing_stats = {}
-                    processing_stats["contains_overlapping_features"] = contains_overlapping
                 elif geom_type in ('LineString', 'MultiLineString'):
                     print(f"Detected geometry type: {geom_type}, routing to line subdivision processor")
                     process_lines(
                         input_path,
                         output_path,
-                        max_nodes,
+                        # The auto max_nodes model is for polygons
+                        DEFAULT_MAX_NODES if max_nodes == "auto" else max_nodes,
                         progress_callback=_overall_progress,
                         strip_dimensions=strip_dimensions,
+                        metrics=metrics,
                     )
                 else:
                     raise ValueError(
@@ -567,39 +911,55 @@ def handler(event, context):
                         "Supported types: Point, MultiPoint, LineString, MultiLineString, Polygon, MultiPolygon"
                     )
 
-            if object_key:
-                print(f"Uploading to {object_key}")
-                upload_result = _upload_to_r2(output_path, object_key, _overall_progress)
-                print(f"Uploaded to {upload_result}")
+            if cached is None:
+                metrics.count("output_bytes", os.path.getsize(output_path))
+            with metrics.phase("upload"):
+                if cached is not None:
+                    upload_result = _copy_cached_output(cached, object_key, _overall_progress)
+                    print(f"Uploaded to {upload_result}")
+                elif streaming_upload is not None:
+                    print(f"Finishing upload to {object_key}")
+                    upload_result = _finish_streaming_upload(streaming_upload, _overall_progress)
+                    streaming_upload = None
+                    print(f"Uploaded to {upload_result}")
+                elif object_key:
+                    print(f"Uploading to {object_key}")
+                    upload_result = _upload_to_r2(output_path, object_key, _overall_progress)
+                    print(f"Uploaded to {upload_result}")
+            if is_raster and upload_result is not None:
+                upload_result["epsg"] = source_epsg
+            if cached is not None:
+                result_stats = dict(cached.get("result") or {}, cacheHit=True)
+            else:
+                result_stats = _result_stats(processing_stats)
+                if cache_params is not None and upload_result is not None:
+                    result_cache.store(
+                        _get_r2_client(),
+                        upload_result["bucket"],
+                        content_hash,
+                        cache_params,
+                        upload_result,
+                        result_stats,
+                        geometry_type=metrics_dimensions.get("GeometryType"),
+                    )
+            metrics_summary = metrics.emit(metrics_dimensions)
             if notifier is not None and upload_result is not None:
                 try:
                     notifier.notify(100, "Complete")
-                    if is_raster:
-                        upload_result["epsg"] = source_epsg
 
                     result_payload: Dict[str, Any] = {"object": upload_result}
-                    if processing_stats:
-                        num_invalid = processing_stats.get("num_invalid_features")
-                        num_features = processing_stats.get("num_features")
-                        num_repaired = processing_stats.get("num_repaired_features")
-                        was_repaired = processing_stats.get("was_repaired")
-                        if num_invalid is not None and num_invalid > 0:
-                            result_payload["numInvalidFeatures"] = num_invalid
-                        if num_features is not None:
-                            result_payload["numFeatures"] = num_features
-                        if num_repaired is not None:
-                            result_payload["numRepairedFeatures"] = num_repaired
-                        if was_repaired:
-                            result_payload["wasRepaired"] = True
-                        contains_overlapping = processing_stats.get("contains_overlapping_features")
-                        if contains_overlapping is not None:
-                            result_payload["containsOverlappingFeatures"] = contains_overlapping
+                    result_payload.update(result_stats)
+                    result_payload["metrics"] = metrics_summary
                     notifier.result(result_payload)
                 except Exception:
                     pass
     except Exception as e:
         print(f"Subdivision worker failed: {e}")
         traceback.print_exc()
+        if streaming_upload is not None:
+            streaming_upload.abort()
+        metrics.count("failed_jobs")
+        metrics.emit(metrics_dimensions)
         if notifier is not None:
             try:
                 notifier.error(str(e))
@@ -609,6 +969,15 @@ def handler(event, context):
             err_obj = {"ok": False, "error": str(e)}
             return {"statusCode": 500, "headers": {"content-type": "application/json"}, "body": json.dumps(err_obj)}
         raise
+    finally:
+        # Lambda freezes the process after the handler returns, so queued
+        # messages must be sent before that
+        if notifier is not None:
+            try:
+                notifier.close()
+            except Exception:
+                pass
+        log_connection_stats()
 
     response_obj = {"ok": True, "uploaded": bool(object_key), "object": upload_result}
     if isinstance(event, dict) and "queryStringParameters" in event:
@@ -1,20 +1,22 @@
-import math
 import os
-from typing import Callable, Iterable, List, Optional
+import time
+from typing import Callable, List, Optional
 
-import fiona
+import numpy as np
+import shapely
 from pyproj import Geod
 from shapely.geometry import (
     GeometryCollection,
     LineString,
     MultiLineString,
-    mapping,
-    shape,
 )
-from shapely.ops import split, transform
 from tqdm import tqdm
 
-from geometry_utils import geometry_type_has_extra_dimensions, strip_extra_dimensions
+from feature_io import FeatureBatch, open_layer, write_batches
+from geometry_utils import geometry_type_has_extra_dimensions
+from fgb_index import output_layer_options
+from metrics import JobMetrics
+from progress import flush_progress, throttle_progress
 
 
 ProgressCallback = Optional[Callable[[str, int, Optional[int]], None]]
@@ -34,85 +36,70 @@ def count_line_nodes(geom):
     return 0
 
 
-def _crosses_antimeridian_coords(coords: Iterable):
-    coords = list(coords)
-    if not coords:
+def _crosses_antimeridian_coords(coords) -> bool:
+    coords = np.asarray(coords, dtype=float)
+    if len(coords) < 2:
         return False
-    prev_x = coords[0][0]
-    for pt in coords[1:]:
-        x = pt[0]
-        if abs(x - prev_x) > 180:
-            return True
-        prev_x = x
-    return False
-
+    return bool(np.any(np.abs(np.diff(coords[:, 0])) > 180))
 
-def _line_crosses_antimeridian(line: LineString) -> bool:
-    return _crosses_antimeridian_coords(list(line.coords))
 
-
-def _unwrap_line_coords(coords: List):
-    if not coords:
+def _unwrap_line_coords(coords) -> np.ndarray:
+    """Copy of an (n, 2 or 3) coordinate array with longitudes shifted by
+    multiples of 360 so that no segment spans more than 180 degrees."""
+    coords = np.array(coords, dtype=float)
+    if len(coords) < 2:
         return coords
-    unwrapped = [coords[0]]
-    prev_x = coords[0][0]
-    prev_y = coords[0][1]
-    for x, y in coords[1:]:
-        dx = x - prev_x
-        if dx > 180:
-            while x - prev_x > 180:
-                x -= 360
-        elif dx < -180:
-            while x - prev_x < -180:
-                x += 360
-        unwrapped.append((x, y))
-        prev_x, prev_y = x, y
-    return unwrapped
-
-
-def _split_line_antimeridian(line: LineString) -> List[LineString]:
-    coords = list(line.coords)
-    if len(coords) < 2 or not _line_crosses_antimeridian(line):
-        return [line]
-
+    dx = np.diff(coords[:, 0])
+    turns = np.where(
+        dx > 180,
+        -np.ceil((dx - 180) / 360),
+        np.where(dx < -180, np.ceil((-dx - 180) / 360), 0),
+    )
+    coords[1:, 0] += 360 * np.cumsum(turns)
+    return coords
+
+
+def _drop_repeated_coords(coords: np.ndarray) -> np.ndarray:
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+    return coords[keep]
+
+
+def _split_coords_antimeridian(coords) -> List[np.ndarray]:
+    """Split line coordinates where the line crosses the antimeridian.
+
+    The longitudes are unwrapped and the line is cut at every 180 + 360k it
+    crosses; the interpolated crossing point ends one piece and starts the
+    next. Each piece is then shifted back into [-180, 180], so pieces east of
+    a crossing start at -180 and pieces west of it end at 180.
+    """
     unwrapped = _unwrap_line_coords(coords)
-    unwrapped_line = LineString(unwrapped)
-    if unwrapped_line.is_empty or len(unwrapped_line.coords) < 2:
-        return []
-
-    minx, _, maxx, _ = unwrapped_line.bounds
-    dateline_segments: List[LineString] = []
-    start = math.floor((minx - 180) / 360) * 360 + 180
-    x = start
-    while x <= maxx + 1e-9:
-        dateline_segments.append(LineString([(x, -90), (x, 90)]))
-        x += 360
-
-    pieces = [unwrapped_line]
-    if dateline_segments:
-        splitter = (
-            MultiLineString(dateline_segments)
-            if len(dateline_segments) > 1
-            else dateline_segments[0]
-        )
-        try:
-            pieces = list(split(unwrapped_line, splitter).geoms)
-        except Exception:
-            pieces = [unwrapped_line]
-
-    results: List[LineString] = []
-    for piece in pieces:
-        if piece.is_empty or len(piece.coords) < 2:
+    # Cell k spans [180 + 360k, 540 + 360k) in unwrapped longitude
+    cells = np.floor((unwrapped[:, 0] - 180) / 360)
+    cuts = np.flatnonzero(cells[1:] != cells[:-1])
+    boundaries = 180 + 360 * np.maximum(cells[cuts], cells[cuts + 1])
+    p0 = unwrapped[cuts]
+    p1 = unwrapped[cuts + 1]
+    t = (boundaries - p0[:, 0]) / (p1[:, 0] - p0[:, 0])
+    crossings = p0 + t[:, None] * (p1 - p0)
+    crossings[:, 0] = boundaries
+
+    starts = np.concatenate([[0], cuts + 1])
+    ends = np.concatenate([cuts + 1, [len(unwrapped)]])
+    pieces: List[np.ndarray] = []
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        piece = [unwrapped[start:end]]
+        if i > 0:
+            piece.insert(0, crossings[i - 1:i])
+        if i < len(cuts):
+            piece.append(crossings[i:i + 1])
+        # A vertex on the antimeridian is its own crossing point
+        piece = _drop_repeated_coords(np.concatenate(piece))
+        if len(piece) < 2:
             continue
-        cx = piece.centroid.x
-        shift = -360 * math.floor((cx + 180.0) / 360.0)
-        if abs(shift) > 1e-9:
-            def _shift_func(x_val, y_val, z_val=None):
-                return (x_val + shift, y_val)
-
-            piece = transform(_shift_func, piece)
-        results.append(LineString(piece.coords))
-    return results or [line]
+        piece[:, 0] -= 360 * (cells[start] + 1)
+        pieces.append(piece)
+    return pieces
 
 
 def _flatten_lines(geometry) -> List[LineString]:
@@ -121,7 +108,7 @@ def _flatten_lines(geometry) -> List[LineString]:
     if isinstance(geometry, LineString):
         return [geometry]
     if isinstance(geometry, MultiLineString):
-        return [LineString(g.coords) for g in geometry.geoms if len(g.coords) >= 2]
+        return [g for g in geometry.geoms if shapely.get_num_coordinates(g) >= 2]
     if isinstance(geometry, GeometryCollection):
         parts: List[LineString] = []
         for geom in geometry.geoms:
@@ -130,41 +117,85 @@ def _flatten_lines(geometry) -> List[LineString]:
     raise ValueError(f"Unsupported geometry type for lines: {geometry.geom_type}")
 
 
-def _subdivide_line_by_nodes(line: LineString, max_nodes: int) -> List[LineString]:
-    coords = list(line.coords)
-    if len(coords) <= max_nodes:
-        return [line]
-    mid = max(1, len(coords) // 2)
-    first_coords = coords[: mid + 1]
-    second_coords = coords[mid:]
+def _chunk_bounds(num_coords: int, max_nodes: int):
+    """First and last coordinate index of each piece a line of num_coords
+    coordinates is cut into so no piece has more than max_nodes.
+
+    Lines over max_nodes are halved (the middle coordinate is shared by both
+    halves) until every piece fits. All pieces at one level are split at
+    once, so there are only log2(num_coords / max_nodes) steps.
+    """
+    starts = np.array([0])
+    ends = np.array([num_coords - 1])
+    while True:
+        counts = ends - starts + 1
+        big = counts > max_nodes
+        if not big.any():
+            return starts, ends
+        mids = starts[big] + counts[big] // 2
+        repeats = np.where(big, 2, 1)
+        first = (np.cumsum(repeats) - repeats)[big]
+        starts = np.repeat(starts, repeats)
+        ends = np.repeat(ends, repeats)
+        ends[first] = mids
+        starts[first + 1] = mids
+
+
+def _linestrings(coord_arrays: List[np.ndarray], max_nodes: int) -> List[LineString]:
+    """Cut each coordinate array into pieces of at most max_nodes coordinates
+    (see _chunk_bounds) and build all pieces with one shapely call."""
+    ndim = min(coords.shape[1] for coords in coord_arrays)
+    coords_out = []
+    indices_out = []
+    num_pieces = 0
+    for coords in coord_arrays:
+        starts, ends = _chunk_bounds(len(coords), max_nodes)
+        lengths = ends - starts + 1
+        # Index of every output coordinate into coords, piece after piece
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        coords_out.append(coords[np.arange(lengths.sum()) + offsets, :ndim])
+        indices_out.append(np.repeat(np.arange(num_pieces, num_pieces + len(starts)), lengths))
+        num_pieces += len(starts)
+    return list(
+        shapely.linestrings(np.concatenate(coords_out), indices=np.concatenate(indices_out))
+    )
+
+
+def _line_pieces(geometry, max_nodes: int) -> List[LineString]:
+    """Parts of a line geometry split at the antimeridian and cut to at most
+    max_nodes coordinates, in order."""
+    coord_arrays: List[np.ndarray] = []
+    for part in _flatten_lines(geometry):
+        coords = shapely.get_coordinates(part, include_z=part.has_z)
+        if len(coords) < 2:
+            continue
+        if _crosses_antimeridian_coords(coords):
+            coord_arrays.extend(_split_coords_antimeridian(coords) or [coords])
+        else:
+            coord_arrays.append(coords)
+    if not coord_arrays:
+        return []
+    return _linestrings(coord_arrays, max(2, int(max_nodes)))
 
-    result: List[LineString] = []
-    if len(first_coords) >= 2:
-        result.extend(_subdivide_line_by_nodes(LineString(first_coords), max_nodes))
-    if len(second_coords) >= 2:
-        result.extend(_subdivide_line_by_nodes(LineString(second_coords), max_nodes))
-    return result
 
+def geodesic_lengths_km(lines, geod: Geod) -> np.ndarray:
+    """Geodesic lengths in km of an array of LineStrings.
 
-def _geodesic_length_km(line: LineString, geod: Geod) -> float:
-    coords = list(line.coords)
+    The coordinates of all lines are packed into one array, every segment
+    (but not the gaps between consecutive lines) is measured with a single
+    Geod.inv call, and the segment lengths are summed per line.
+    """
+    lines = np.asarray(lines, dtype=object)
+    coords = shapely.get_coordinates(lines)
     if len(coords) < 2:
-        return 0.0
-    lons = [pt[0] for pt in coords]
-    lats = [pt[1] for pt in coords]
-    length_m = geod.line_length(lons, lats)
-    return max(length_m, 0.0) / 1000.0
-
-
-def _ensure_max_nodes(line: LineString, max_nodes: int) -> List[LineString]:
-    safe_max = max(2, int(max_nodes))
-    return _subdivide_line_by_nodes(line, safe_max)
-
-
-def _ensure_no_antimeridian_crossing(line: LineString) -> List[LineString]:
-    if _line_crosses_antimeridian(line):
-        return _split_line_antimeridian(line)
-    return [line]
+        return np.zeros(len(lines), dtype=np.float64)
+    line_idx = np.repeat(np.arange(len(lines)), shapely.get_num_coordinates(lines))
+    segment = line_idx[1:] == line_idx[:-1]
+    start = coords[:-1][segment]
+    end = coords[1:][segment]
+    _, _, distances = geod.inv(start[:, 0], start[:, 1], end[:, 0], end[:, 1])
+    lengths_m = np.bincount(line_idx[1:][segment], weights=distances, minlength=len(lines))
+    return np.maximum(lengths_m, 0.0) / 1000.0
 
 
 def process_lines(
@@ -173,81 +204,105 @@ def process_lines(
     max_nodes: int,
     progress_callback: ProgressCallback = None,
     strip_dimensions: Optional[bool] = None,
+    metrics: Optional[JobMetrics] = None,
 ):
-    """Process linear features, splitting/exploding as needed and writing FlatGeobuf."""
+    """Process linear features, splitting/exploding as needed and writing FlatGeobuf.
+
+    Features are read and written in batches of SUBDIVIDE_BATCH_SIZE through
+    feature_io; the pieces of a batch repeat the attribute rows of their
+    feature.
+
+    metrics, if given, receives the scanning and processing phase times and
+    input/output counts.
+    """
+    progress_callback = throttle_progress(progress_callback)
+    metrics = metrics if metrics is not None else JobMetrics()
     geod = Geod(ellps="WGS84")
-    batch: List[dict] = []
 
-    with fiona.open(input_file, "r") as src:
-        schema = src.schema.copy()
+    try:
+        batch_size = int(os.getenv("SUBDIVIDE_BATCH_SIZE", "10000"))
+    except Exception:
+        batch_size = 10000
+    batch_size = max(1, batch_size)
+
+    scan_start = time.perf_counter()
+    with open_layer(input_file) as layer:
         if strip_dimensions is None:
-            strip_dimensions = geometry_type_has_extra_dimensions(src.schema.get("geometry"))
-        schema["geometry"] = "LineString"
-        if "properties" in schema and isinstance(schema["properties"], dict):
-            schema["properties"]["__lengthKm"] = "float"
-            schema["properties"]["__oidx"] = "int"
-        total_features = len(src)
+            strip_dimensions = geometry_type_has_extra_dimensions(layer.geometry_type)
+        total_features = layer.num_features
 
         total_nodes_in_dataset = 0
-        scanned_features = 0
         if progress_callback is not None:
             try:
                 progress_callback("scanning", 0, total_features)
             except Exception:
                 pass
-        for feature in src:
-            feature_geom = (
-                strip_extra_dimensions(feature.get("geometry"))
-                if strip_dimensions
-                else feature.get("geometry")
+        for batch in layer.batches(batch_size, columns=[]):
+            geometries = batch.geometries()
+            type_ids = shapely.get_type_id(geometries)
+            is_line = (type_ids == shapely.GeometryType.LINESTRING) | (
+                type_ids == shapely.GeometryType.MULTILINESTRING
             )
-            total_nodes_in_dataset += count_line_nodes(feature_geom)
-            scanned_features += 1
+            total_nodes_in_dataset += int(shapely.get_num_coordinates(geometries[is_line]).sum())
             if progress_callback is not None:
                 try:
-                    progress_callback("scanning", scanned_features, total_features)
+                    progress_callback("scanning", batch.offset + len(batch), total_features)
                 except Exception:
                     pass
 
+    metrics.add_time("scanning", time.perf_counter() - scan_start)
     cumulative_processed_nodes = 0
+    output_feature_count = 0
+    feature_index = 0
+
+    processing_start = time.perf_counter()
+    with open_layer(input_file) as layer:
+        pbar = (
+            None
+            if progress_callback is not None
+            else tqdm(total=layer.num_features, desc="Processing lines")
+        )
 
-    with fiona.open(input_file, "r") as src:
-        with fiona.open(
-            output_file, "w", driver="FlatGeobuf", crs=src.crs, schema=schema
-        ) as dst:
-            pbar = (
-                None
-                if progress_callback is not None
-                else tqdm(total=len(src), desc="Processing lines")
-            )
-
-            if progress_callback is not None:
-                try:
-                    progress_callback(
-                        "processing_start", 0, max(total_nodes_in_dataset, 1)
-                    )
-                except Exception:
-                    pass
-
+        if progress_callback is not None:
             try:
-                batch_size = int(os.getenv("SUBDIVIDE_BATCH_SIZE", "10000"))
+                progress_callback(
+                    "processing_start", 0, max(total_nodes_in_dataset, 1)
+                )
             except Exception:
-                batch_size = 10000
-
-            def flush_batch():
-                if batch:
-                    dst.writerecords(batch)
-                    batch.clear()
-
-            def write_line(line_geom: LineString, props: dict):
-                nonlocal cumulative_processed_nodes
-                if line_geom.is_empty or len(line_geom.coords) < 2:
-                    return
-                geom_geojson = mapping(line_geom)
-                out_props = dict(props)
-                out_props["__lengthKm"] = _geodesic_length_km(line_geom, geod)
-                batch.append({"geometry": geom_geojson, "properties": out_props})
-                cumulative_processed_nodes += len(line_geom.coords)
+                pass
+
+        def line_batches():
+            nonlocal cumulative_processed_nodes, output_feature_count, feature_index
+            for batch in layer.batches(batch_size):
+                geometries = batch.geometries()
+                if strip_dimensions:
+                    geometries = shapely.force_2d(geometries)
+                pieces: List[LineString] = []
+                owner: List[int] = []
+                for i, geom in enumerate(geometries):
+                    if geom is None:
+                        continue
+                    feature_pieces = _line_pieces(geom, max_nodes)
+                    pieces.extend(feature_pieces)
+                    owner.extend([i] * len(feature_pieces))
+                feature_index += len(batch)
+                if pbar is not None:
+                    try:
+                        pbar.update(len(batch))
+                    except Exception:
+                        pass
+                if not pieces:
+                    continue
+
+                pieces = np.asarray(pieces, dtype=object)
+                owner = np.asarray(owner, dtype=np.int64)
+                columns = batch.take_columns(owner)
+                columns["__lengthKm"] = geodesic_lengths_km(pieces, geod)
+                columns["__oidx"] = batch.offset + owner
+                yield FeatureBatch(shapely.to_wkb(pieces), columns)
+
+                output_feature_count += len(pieces)
+                cumulative_processed_nodes += int(shapely.get_num_coordinates(pieces).sum())
                 if progress_callback is not None:
                     try:
                         progress_callback(
@@ -257,44 +312,28 @@ def process_lines(
                         )
                     except Exception:
                         pass
-                if len(batch) >= batch_size:
-                    flush_batch()
-
-            feature_index = 0
-            for feature in src:
-                feature_geom = (
-                    strip_extra_dimensions(feature["geometry"])
-                    if strip_dimensions
-                    else feature["geometry"]
-                )
-                geom = shape(feature_geom)
-                base_props = dict(feature.get("properties") or {})
-                base_props["__oidx"] = feature_index
-
-                line_parts = _flatten_lines(geom)
-                for part in line_parts:
-                    for safe_part in _ensure_no_antimeridian_crossing(part):
-                        for limited_part in _ensure_max_nodes(
-                            safe_part, max_nodes
-                        ):
-                            write_line(limited_part, base_props)
-
-                feature_index += 1
-                if pbar is not None:
-                    try:
-                        pbar.update(1)
-                    except Exception:
-                        pass
 
-            if pbar is not None:
-                try:
-                    pbar.close()
-                except Exception:
-                    pass
+        write_batches(
+            output_file,
+            line_batches(),
+            layer,
+            "LineString",
+            {"__lengthKm": "float", "__oidx": "int"},
+            output_layer_options(),
+        )
+
+        if pbar is not None:
+            try:
+                pbar.close()
+            except Exception:
+                pass
 
-            flush_batch()
+        flush_progress(progress_callback)
+
+    metrics.add_time("processing", time.perf_counter() - processing_start)
+    metrics.count("input_features", total_features)
+    metrics.count("input_vertices", total_nodes_in_dataset)
+    metrics.count("output_features", output_feature_count)
 
     print(f"Total features processed: {feature_index}")
     print(f"Total line nodes processed: {cumulative_processed_nodes}")
-
-
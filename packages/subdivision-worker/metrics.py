@@ -0,0 +1,119 @@
+"""Per-job phase timings and resource counters.
+
+The handler creates one JobMetrics per job and passes it to the processors,
+which time their phases and count what they read and wrote. At the end of the
+job the handler prints one record in CloudWatch Embedded Metric Format (EMF),
+which CloudWatch Logs turns into metrics, and adds the same values to the
+result message.
+"""
+
+import json
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+NAMESPACE = "SeaSketch/SubdivisionWorker"
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process and its (finished) worker processes."""
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / scale
+
+
+class JobMetrics:
+    """Phase durations (seconds) and counters for one job.
+
+    Phases that run more than once (or are entered by both the handler and a
+    processor under different names) accumulate; counters are summed.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as phase name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict[str, Any]:
+        """Flat metric name -> value dict.
+
+        Phases become <Phase>Seconds. Throughput is derived from the
+        processing phase: VerticesPerSecond from InputVertices and
+        PiecesPerSecond from OutputFeatures.
+        """
+        values: Dict[str, Any] = {
+            f"{_camel(name)}Seconds": round(seconds, 3) for name, seconds in self.phases.items()
+        }
+        values["TotalSeconds"] = round(time.perf_counter() - self._start, 3)
+        for name, value in self.counters.items():
+            values[_camel(name)] = value
+        processing = self.phases.get("processing")
+        if processing:
+            if "input_vertices" in self.counters:
+                values["VerticesPerSecond"] = round(self.counters["input_vertices"] / processing, 1)
+            if "output_features" in self.counters:
+                values["PiecesPerSecond"] = round(self.counters["output_features"] / processing, 1)
+        values["PeakRssMb"] = round(peak_rss_mb(), 1)
+        return values
+
+    def emf_record(self, values: Dict[str, Any], dimensions: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """values (a summary) as one CloudWatch Embedded Metric Format record."""
+        dimensions = {key: value for key, value in (dimensions or {}).items() if value}
+        record: Dict[str, Any] = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": NAMESPACE,
+                        "Dimensions": [sorted(dimensions)],
+                        "Metrics": [
+                            {"Name": name, "Unit": _unit(name)} for name in sorted(values)
+                        ],
+                    }
+                ],
+            },
+        }
+        record.update(dimensions)
+        record.update(values)
+        return record
+
+    def emit(self, dimensions: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Print the summary as a single EMF log line and return it."""
+        values = self.summary()
+        print(json.dumps(self.emf_record(values, dimensions)))
+        return values
+
+
+def _camel(name: str) -> str:
+    return "".join(part[:1].upper() + part[1:] for part in name.split("_"))
+
+
+def _unit(name: str) -> str:
+    if name.endswith("Seconds"):
+        return "Seconds"
+    if name.endswith("PerSecond"):
+        return "Count/Second"
+    if name.endswith("Mb"):
+        return "Megabytes"
+    if name.endswith("Bytes"):
+        return "Bytes"
+    return "Count"
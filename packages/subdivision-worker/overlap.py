@@ -0,0 +1,319 @@
+"""Overlap detection between output pieces of different original features.
+
+Pieces produced from the same input feature (same __oidx) tile that feature and
+never count as overlapping each other.
+"""
+
+import itertools
+import os
+import random
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from feature_io import column_values, open_layer
+
+
+# Rough peak memory per collected coordinate: its WKB (about 18 bytes) plus
+# the Shapely geometry decoded from it for the checks (about 34 bytes), plus
+# the STRtree
+OVERLAP_BYTES_PER_COORD = 64
+
+
+def overlap_max_coords_from_env() -> int:
+    """Coordinate budget for keeping pieces in memory (SUBDIVIDE_OVERLAP_MAX_COORDS).
+
+    Defaults to a quarter of the Lambda function's memory
+    (AWS_LAMBDA_FUNCTION_MEMORY_SIZE, in MB) at OVERLAP_BYTES_PER_COORD, so
+    the pieces do not compete with processing for most of it, and to
+    10,000,000 coordinates outside Lambda.
+    """
+    default = 10000000
+    try:
+        memory_mb = int(os.getenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "0"))
+        if memory_mb > 0:
+            default = memory_mb * 1024 * 1024 // 4 // OVERLAP_BYTES_PER_COORD
+    except Exception:
+        pass
+    try:
+        return int(os.getenv("SUBDIVIDE_OVERLAP_MAX_COORDS", str(default)))
+    except Exception:
+        return default
+
+
+def overlap_chunk_size_from_env() -> int:
+    """Pieces per STRtree query in exact_overlap_stats (SUBDIVIDE_OVERLAP_CHUNK_SIZE)."""
+    try:
+        return max(1, int(os.getenv("SUBDIVIDE_OVERLAP_CHUNK_SIZE", "10000")))
+    except Exception:
+        return 10000
+
+
+def sample_overlaps(geometries, oidx, sample_size=500, seed=None):
+    """True if a sampled piece's representative point lies inside a piece of
+    another original feature.
+
+    Representative points of up to sample_size random pieces go into an
+    STRtree, and every piece is tested against them in one vectorized
+    query(predicate="contains") call. This is the same test
+    detect_overlapping_features does with one bbox query per point.
+
+    Args:
+        geometries: Array of polygonal Shapely geometries (None entries are skipped)
+        oidx: __oidx of each geometry
+        sample_size: Number of pieces whose representative points are tested
+        seed: Optional seed for the sample
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    oidx = np.asarray(oidx)
+    present = np.flatnonzero(~shapely.is_missing(geometries))
+    if len(present) < 2:
+        return False
+    if len(present) > sample_size:
+        sample = np.sort(random.Random(seed).sample(list(present), sample_size))
+    else:
+        sample = present
+    points = shapely.point_on_surface(geometries[sample])
+    tree = STRtree(points)
+    piece_idx, point_idx = tree.query(geometries, predicate="contains")
+    return bool(np.any(oidx[piece_idx] != oidx[sample[point_idx]]))
+
+
+class OverlapCollector:
+    """Keep output pieces in memory for overlap checks, up to max_coords coordinates.
+
+    Pieces are kept as WKB, about half the size of Shapely geometries, and
+    only decoded by arrays(). Once the budget is exceeded the collected
+    pieces are released and available is False; callers then fall back to
+    reading the output file.
+    """
+
+    def __init__(self, max_coords=None):
+        self.max_coords = overlap_max_coords_from_env() if max_coords is None else max_coords
+        self.num_coords = 0
+        self.available = True
+        self._wkb = []
+        self._oidx = []
+
+    def add(self, wkb, num_coords, oidx):
+        """Add pieces as WKB, with the coordinate count of each and their __oidx."""
+        if not self.available or len(wkb) == 0:
+            return
+        self.num_coords += int(np.sum(num_coords))
+        if self.num_coords > self.max_coords:
+            print(
+                f"Output has more than {self.max_coords} coordinates; "
+                "overlap detection will read the output file"
+            )
+            self.available = False
+            self._wkb = []
+            self._oidx = []
+            return
+        self._wkb.extend(wkb)
+        self._oidx.extend(oidx)
+
+    def arrays(self):
+        """(geometries, oidx) arrays of everything collected."""
+        wkb = np.empty(len(self._wkb), dtype=object)
+        wkb[:] = self._wkb
+        return shapely.from_wkb(wkb), np.asarray(self._oidx)
+
+
+def array_chunks(geometries, oidx, chunk_size=None):
+    """Chunk source for exact_overlap_stats over in-memory arrays."""
+    chunk_size = overlap_chunk_size_from_env() if chunk_size is None else chunk_size
+
+    def chunks(start):
+        for offset in range(start, len(geometries), chunk_size):
+            yield offset, geometries[offset:offset + chunk_size], oidx[offset:offset + chunk_size]
+
+    return chunks
+
+
+def file_chunks(path, chunk_size=None):
+    """Chunk source for exact_overlap_stats that streams a FlatGeobuf file.
+
+    Each call re-reads the file from start; features before it are skipped
+    without being parsed, but their bytes are still read. exact_overlap_stats
+    calls it once per block, so each pass costs a read of the rest of the
+    file.
+    """
+    chunk_size = overlap_chunk_size_from_env() if chunk_size is None else chunk_size
+
+    def chunks(start):
+        with open_layer(path) as layer:
+            for batch in layer.batches(chunk_size, columns=['__oidx'], start=start):
+                oidx = np.asarray(
+                    [-1 if value is None else value for value in column_values(batch.columns['__oidx'])],
+                    dtype=np.int64,
+                )
+                yield batch.offset, batch.geometries(), oidx
+
+    return chunks
+
+
+def _intersection_areas(a, b, area_fn):
+    """area_fn of the pairwise intersections of a and b, and a mask of the
+    pairs whose intersection GEOS could not compute (their area is 0).
+
+    The whole arrays are intersected at once; if GEOS fails (e.g. a side
+    location conflict between pieces of invalid features), pairs are
+    intersected one by one, retrying failures with both pieces repaired by
+    make_valid.
+    """
+    try:
+        return area_fn(shapely.intersection(a, b)), np.zeros(len(a), dtype=bool)
+    except shapely.errors.GEOSException:
+        pass
+    intersections = np.empty(len(a), dtype=object)
+    failed = np.zeros(len(a), dtype=bool)
+    for i in range(len(a)):
+        try:
+            intersections[i] = shapely.intersection(a[i], b[i])
+            continue
+        except shapely.errors.GEOSException:
+            pass
+        try:
+            intersections[i] = shapely.intersection(shapely.make_valid(a[i]), shapely.make_valid(b[i]))
+        except shapely.errors.GEOSException:
+            failed[i] = True
+    areas = np.zeros(len(a))
+    if not failed.all():
+        areas[~failed] = area_fn(intersections[~failed])
+    return areas, failed
+
+
+def _pair_codes(a, b):
+    """Encode unordered pairs of __oidx values as int64 (min << 32 | max).
+
+    Values are taken as 32-bit, so any pair of int32 values (including the
+    -1 used for a missing __oidx) has its own code.
+    """
+    lo = np.minimum(a, b).astype(np.int64)
+    hi = np.maximum(a, b).astype(np.int64)
+    return (lo << 32) | (hi & 0xFFFFFFFF)
+
+
+class _PairSet:
+    """Distinct int64 pair codes as a sorted array, 8 bytes per pair.
+
+    Each chunk's codes are de-duplicated on their own and merged into the
+    sorted array once the pending chunks are as large as it, so merging
+    stays linear overall.
+    """
+
+    def __init__(self):
+        self._merged = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._pending_size = 0
+
+    def add(self, codes):
+        codes = np.unique(codes)
+        self._pending.append(codes)
+        self._pending_size += len(codes)
+        if self._pending_size >= len(self._merged):
+            self._merge()
+
+    def _merge(self):
+        if self._pending:
+            self._merged = np.unique(np.concatenate([self._merged] + self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+    def __len__(self):
+        self._merge()
+        return len(self._merged)
+
+
+def exact_overlap_stats(chunks, area_fn=shapely.area, max_coords=None):
+    """Exhaustive overlap statistics between pieces of different original features.
+
+    Every pair of pieces with different __oidx whose intersection has positive
+    area is found with an STRtree join. Pieces are indexed in blocks of at most
+    max_coords coordinates (all at once if None), and each block is joined
+    against the pieces from its own start onward, queried chunk by chunk, so
+    memory stays bounded by one block plus one chunk of candidate pairs. Each
+    piece pair is counted once, when the later piece is queried. Distinct
+    feature pairs are kept as a sorted int64 array, 8 bytes per overlapping
+    pair of original features. Pairs whose
+    intersection GEOS cannot compute even after make_valid are skipped and
+    counted instead of failing the whole check.
+
+    Every block restarts chunks at its own start, so with file_chunks each
+    pass re-reads the output from the block on: the I/O grows with the
+    square of the number of passes. Keep max_coords large enough that few
+    passes are needed.
+
+    Args:
+        chunks: Callable taking a start position and yielding
+            (offset, geometries, oidx) chunks of pieces from that position on,
+            such as array_chunks or file_chunks
+        area_fn: Vectorized area function for intersection geometries
+            (e.g. geodesic_areas_sqkm); planar shapely.area by default
+        max_coords: Coordinate budget for one indexed block
+
+    Returns:
+        dict with keys:
+            num_overlapping_feature_pairs: distinct pairs of original features
+                (__oidx) with overlapping pieces
+            num_overlapping_piece_pairs: overlapping pairs of output pieces
+            overlap_area: summed intersection area of overlapping piece pairs,
+                in area_fn units (area covered by three or more features is
+                counted once per pair)
+            num_failed_piece_pairs: candidate piece pairs skipped because
+                their intersection could not be computed
+            num_passes: how many blocks were indexed
+    """
+    feature_pairs = _PairSet()
+    piece_pairs = 0
+    failed_pairs = 0
+    total_area = 0.0
+    block_start = 0
+    passes = 0
+    while True:
+        # The chunks read to fill the block are queried first, then the
+        # same stream continues with the pieces after the block.
+        stream = chunks(block_start)
+        block_chunks = []
+        block_coords = 0
+        for chunk in stream:
+            block_chunks.append(chunk)
+            block_coords += int(shapely.get_num_coordinates(chunk[1]).sum())
+            if max_coords is not None and block_coords >= max_coords:
+                break
+        if not block_chunks:
+            break
+        block_geometries = np.concatenate([geometries for _, geometries, _ in block_chunks])
+        block_oidx = np.concatenate([oidx for _, _, oidx in block_chunks])
+        tree = STRtree(block_geometries)
+        passes += 1
+
+        for offset, geometries, oidx in itertools.chain(block_chunks, stream):
+            query_idx, tree_idx = tree.query(geometries, predicate="intersects")
+            keep = (offset + query_idx > block_start + tree_idx) & (
+                oidx[query_idx] != block_oidx[tree_idx]
+            )
+            query_idx, tree_idx = query_idx[keep], tree_idx[keep]
+            if len(query_idx) == 0:
+                continue
+            areas, failed = _intersection_areas(geometries[query_idx], block_geometries[tree_idx], area_fn)
+            failed_pairs += int(failed.sum())
+            positive = areas > 0
+            if not positive.any():
+                continue
+            piece_pairs += int(positive.sum())
+            total_area += float(areas[positive].sum())
+            a = oidx[query_idx][positive]
+            b = block_oidx[tree_idx][positive]
+            feature_pairs.add(_pair_codes(a, b))
+
+        block_start += len(block_geometries)
+
+    return {
+        "num_overlapping_feature_pairs": len(feature_pairs),
+        "num_overlapping_piece_pairs": piece_pairs,
+        "overlap_area": total_area,
+        "num_failed_piece_pairs": failed_pairs,
+        "num_passes": passes,
+    }
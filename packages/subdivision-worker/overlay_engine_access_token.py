@@ -7,7 +7,7 @@ import os
 import time
 from typing import Any, Dict, Optional
 
-import boto3
+from connections import get_aws_client
 
 DEFAULT_SECRET_NAME = "seasketch/overlay-engine/access-token"
 REFRESH_WHEN_REMAINING_S = 24 * 60 * 60
@@ -60,12 +60,7 @@ def get_overlay_engine_access_token() -> str:
     if _cache and not _is_expired(_cache) and not _needs_refresh(_cache):
         return _cache["token"]
 
-    region = (
-        os.getenv("AWS_REGION")
-        or os.getenv("AWS_DEFAULT_REGION")
-        or "us-west-2"
-    )
-    client = boto3.client("secretsmanager", region_name=region)
+    client = get_aws_client("secretsmanager")
     try:
         response = client.get_secret_value(SecretId=_secret_id())
     except Exception as e:
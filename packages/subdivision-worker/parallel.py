@@ -0,0 +1,203 @@
+"""Ordered process pool for CPU-bound per-feature work.
+
+Lambda does not provide /dev/shm, so multiprocessing.Pool and Queue (which rely
+on POSIX semaphores) fail there. This pool only uses Process and Pipe, which
+work in Lambda, and yields results in input order so output is deterministic.
+"""
+
+import itertools
+import multiprocessing
+import os
+import threading
+import traceback
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+def available_cpus() -> int:
+    """Number of CPUs this process may run on (the vCPU count in Lambda)."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def default_worker_count() -> int:
+    """Worker count from SUBDIVIDE_WORKERS, falling back to available CPUs."""
+    try:
+        workers = int(os.getenv("SUBDIVIDE_WORKERS", "0"))
+    except Exception:
+        workers = 0
+    return workers if workers > 0 else available_cpus()
+
+
+def _worker_main(func: Callable[[Any], Any], tasks, results) -> None:
+    while True:
+        try:
+            message = tasks.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        seq, chunk = message
+        try:
+            results.send((seq, "ok", [func(item) for item in chunk]))
+        except Exception:
+            results.send((seq, "error", traceback.format_exc()))
+    results.close()
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+class OrderedProcessPool:
+    """Map a function over items in worker processes, yielding results in order.
+
+    Items are sent to workers in chunks. At most ``workers * max_pending_chunks``
+    chunks are in flight, which bounds memory regardless of input size. Each
+    chunk goes to the worker with the fewest unfinished chunks, so a single
+    expensive feature does not hold up the other workers.
+
+    Workers are started from a fork server rather than forked from the
+    caller: the caller usually runs background threads (SQS progress, uploads,
+    heartbeats), and a forked child would inherit any lock one of them held.
+    The fork server is single-threaded and outlives the pool, so later pools
+    (e.g. in a warm Lambda) start quickly. ``func`` must therefore be picklable
+    (a module-level function or a partial of one), as must items and results.
+    Modules in ``preload`` are imported once by the fork server when it
+    starts, so workers do not each import them.
+
+    As with the spawn start method, workers import the ``__main__`` script
+    (as ``__mp_main__``), so scripts that create a pool must guard their entry
+    point with ``if __name__ == "__main__"`` (as ``subdivide.py`` does).
+    """
+
+    def __init__(
+        self,
+        func: Callable[[Any], Any],
+        workers: int,
+        max_pending_chunks: int = 4,
+        preload: Sequence[str] = (),
+    ):
+        ctx = multiprocessing.get_context("forkserver")
+        if preload:
+            # Only takes effect if the fork server is not running yet
+            ctx.set_forkserver_preload(list(preload))
+        self.workers = max(1, int(workers))
+        self.max_pending_chunks = max(1, int(max_pending_chunks))
+        self._processes = []
+        self._task_conns = []
+        self._result_conns = []
+        for _ in range(self.workers):
+            task_recv, task_send = ctx.Pipe(duplex=False)
+            result_recv, result_send = ctx.Pipe(duplex=False)
+            process = ctx.Process(
+                target=_worker_main,
+                args=(func, task_recv, result_send),
+                daemon=True,
+            )
+            process.start()
+            task_recv.close()
+            result_send.close()
+            self._processes.append(process)
+            self._task_conns.append(task_send)
+            self._result_conns.append(result_recv)
+
+        self._lock = threading.Condition()
+        self._results: Dict[int, Tuple[str, Any]] = {}
+        self._unfinished = [0] * self.workers
+        self._failure: Optional[str] = None
+        self._closing = False
+        # A reader thread drains result pipes while the main thread is blocked
+        # sending the next chunk. Without it a worker writing a large result
+        # and the parent writing a large chunk can deadlock on full pipes.
+        self._reader = threading.Thread(target=self._read_results, daemon=True)
+        self._reader.start()
+
+    def _read_results(self) -> None:
+        conns = {conn: idx for idx, conn in enumerate(self._result_conns)}
+        while conns:
+            for conn in wait(list(conns.keys())):
+                idx = conns[conn]
+                try:
+                    seq, status, payload = conn.recv()
+                except (EOFError, OSError):
+                    del conns[conn]
+                    with self._lock:
+                        if not self._closing and self._failure is None:
+                            self._failure = (
+                                f"Worker process {idx} exited unexpectedly "
+                                f"(exit code {self._processes[idx].exitcode})"
+                            )
+                        self._lock.notify_all()
+                    continue
+                with self._lock:
+                    self._results[seq] = (status, payload)
+                    self._unfinished[idx] -= 1
+                    self._lock.notify_all()
+
+    def _wait_for(self, seq: int) -> Tuple[str, Any]:
+        with self._lock:
+            while seq not in self._results:
+                if self._failure is not None:
+                    raise WorkerError(self._failure)
+                self._lock.wait()
+            return self._results.pop(seq)
+
+    def imap(self, items: Iterable[Any], chunk_size: int = 64) -> Iterator[Any]:
+        """Yield func(item) for every item, in the order items were given."""
+        iterator = iter(items)
+        chunk_size = max(1, int(chunk_size))
+        max_in_flight = self.workers * self.max_pending_chunks
+        next_send = 0
+        next_yield = 0
+        exhausted = False
+        while True:
+            while not exhausted and next_send - next_yield < max_in_flight:
+                chunk: List[Any] = list(itertools.islice(iterator, chunk_size))
+                if not chunk:
+                    exhausted = True
+                    break
+                with self._lock:
+                    if self._failure is not None:
+                        raise WorkerError(self._failure)
+                    idx = min(range(self.workers), key=self._unfinished.__getitem__)
+                    self._unfinished[idx] += 1
+                self._task_conns[idx].send((next_send, chunk))
+                next_send += 1
+            if next_yield == next_send:
+                return
+            status, payload = self._wait_for(next_yield)
+            next_yield += 1
+            if status == "error":
+                raise WorkerError(f"Worker task failed:\n{payload}")
+            for result in payload:
+                yield result
+
+    def close(self) -> None:
+        with self._lock:
+            self._closing = True
+        for conn in self._task_conns:
+            try:
+                conn.send(None)
+                conn.close()
+            except Exception:
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=1)
+        self._reader.join(timeout=1)
+        for conn in self._result_conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def __enter__(self) -> "OrderedProcessPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -1,34 +1,52 @@
-import fiona
+import numpy as np
+import shapely
 from tqdm import tqdm
 import os
+import time
 from typing import Optional, Callable
 
-from geometry_utils import geometry_type_has_extra_dimensions, strip_extra_dimensions
+from feature_io import FeatureBatch, open_layer, write_batches
+from fgb_index import output_layer_options
+from metrics import JobMetrics
+from progress import flush_progress, throttle_progress
 
 
 def normalize_lon(x):
-    """Normalize longitude to [-180, 180] range."""
-    while x > 180:
-        x -= 360
-    while x < -180:
-        x += 360
+    """Normalize longitudes to the [-180, 180] range.
+
+    Values above 180 are shifted down and values below -180 up by whole turns,
+    so exactly ±180 are kept as-is.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    over = x > 180
+    under = x < -180
+    if not (over.any() or under.any()):
+        return x
+    x = x.copy()
+    x[over] -= 360.0 * np.ceil((x[over] - 180.0) / 360.0)
+    x[under] += 360.0 * np.ceil((-180.0 - x[under]) / 360.0)
     return x
 
 
 def normalize_lat(y):
-    """Normalize latitude to [-90, 90] range."""
-    # Clamp latitude to valid range
-    if y > 90:
-        return 90
-    if y < -90:
-        return -90
-    return y
+    """Clamp latitudes to the [-90, 90] range."""
+    return np.clip(np.asarray(y, dtype=np.float64), -90.0, 90.0)
 
 
-def normalize_coords(coords):
-    """Normalize a coordinate [lon, lat, ...] to 2D valid WGS84 bounds."""
-    lon, lat = coords[0], coords[1]
-    return [normalize_lon(lon), normalize_lat(lat)]
+def _point_parts(geometries):
+    """Points and MultiPoint members of geometries, exploded.
+
+    Returns:
+        (points, owner) where owner[i] is the position in geometries of the
+        geometry points[i] came from. Null and empty geometries and other
+        geometry types contribute no points.
+    """
+    type_ids = shapely.get_type_id(geometries)
+    keep = (type_ids == shapely.GeometryType.POINT) | (type_ids == shapely.GeometryType.MULTIPOINT)
+    parts, owner = shapely.get_parts(geometries[keep], return_index=True)
+    owner = np.flatnonzero(keep)[owner]
+    nonempty = ~shapely.is_empty(parts)
+    return parts[nonempty], owner[nonempty]
 
 
 def process_points(
@@ -36,6 +54,7 @@ def process_points(
     output_file: str,
     progress_callback: Optional[Callable] = None,
     strip_dimensions: Optional[bool] = None,
+    metrics: Optional[JobMetrics] = None,
 ):
     """
     Process Point and MultiPoint geometries from a fiona source.
@@ -44,33 +63,35 @@ def process_points(
     - Sets __oidx property to track parent feature index (for MultiPoints) or sequential counter (for Points)
     - Writes output as FlatGeobuf
     
+    Features are read and written in batches of SUBDIVIDE_BATCH_SIZE through
+    feature_io. The coordinates of a batch are normalized together, and
+    MultiPoints are exploded by repeating the attribute rows of their feature.
+    
     Args:
         input_file: Path to input file (any format supported by Fiona)
         output_file: Path to output FlatGeobuf file
         progress_callback: Optional callback function(phase, current, total) for progress updates
+        strip_dimensions: Accepted for symmetry with the other processors;
+            output points are always 2D
+        metrics: Optional JobMetrics that receives the scanning and processing
+            phase times and input/output counts
     """
-    batch = []
+    progress_callback = throttle_progress(progress_callback)
+    metrics = metrics if metrics is not None else JobMetrics()
     
     # Allow overriding batch size via env var
     try:
         BATCH_SIZE = int(os.getenv("SUBDIVIDE_BATCH_SIZE", "10000"))
     except Exception:
         BATCH_SIZE = 10000
+    BATCH_SIZE = max(1, BATCH_SIZE)
     
     # First pass: count features and points
-    with fiona.open(input_file, "r") as src:
-        schema = src.schema.copy()
-        if strip_dimensions is None:
-            strip_dimensions = geometry_type_has_extra_dimensions(src.schema.get('geometry'))
-        schema['geometry'] = 'Point'
-        # Ensure output schema has __oidx property
-        if 'properties' in schema and isinstance(schema['properties'], dict):
-            schema['properties']['__oidx'] = 'int'
-        
-        total_features = len(src)
+    scan_start = time.perf_counter()
+    with open_layer(input_file) as layer:
+        total_features = layer.num_features
         
         # Report scanning progress
-        scanned_features = 0
         if progress_callback is not None:
             try:
                 progress_callback('scanning', 0, total_features)
@@ -79,92 +100,67 @@ def process_points(
         
         # Count total points for progress tracking
         total_points = 0
-        for feature in src:
-            geom = (
-                strip_extra_dimensions(feature['geometry'])
-                if strip_dimensions
-                else feature['geometry']
-            )
-            if geom['type'] == 'MultiPoint':
-                total_points += len(geom['coordinates'])
-            elif geom['type'] == 'Point':
-                total_points += 1
-            scanned_features += 1
+        for batch in layer.batches(BATCH_SIZE, columns=[]):
+            points, _ = _point_parts(batch.geometries())
+            total_points += len(points)
             if progress_callback is not None:
                 try:
-                    progress_callback('scanning', scanned_features, total_features)
+                    progress_callback('scanning', batch.offset + len(batch), total_features)
                 except Exception:
                     pass
     
+    metrics.add_time('scanning', time.perf_counter() - scan_start)
+
     # Second pass: process and write
-    with fiona.open(input_file, "r") as src:
-        with fiona.open(output_file, "w", driver="FlatGeobuf", crs=src.crs, schema=schema) as dst:
-            def write(feature):
-                nonlocal processed_points
-                batch.append(feature)
-                processed_points += 1
+    processing_start = time.perf_counter()
+    with open_layer(input_file) as layer:
+        # Initialize local progress bar only if no external callback is provided
+        pbar = None if progress_callback is not None else tqdm(total=total_points, desc="Processing points")
+        
+        if progress_callback is not None:
+            try:
+                progress_callback('processing_start', 0, total_points)
+            except Exception:
+                pass
+        
+        feature_index = 0
+        processed_points = 0
+        
+        def point_batches():
+            nonlocal feature_index, processed_points
+            for batch in layer.batches(BATCH_SIZE):
+                points, owner = _point_parts(batch.geometries())
+                coords = shapely.get_coordinates(points)
+                # Normalize coordinates to valid WGS84 bounds
+                points = shapely.points(normalize_lon(coords[:, 0]), normalize_lat(coords[:, 1]))
+                # All points from the same MultiPoint get the same __oidx (parent feature index)
+                columns = batch.take_columns(owner)
+                columns['__oidx'] = batch.offset + owner
+                yield FeatureBatch(shapely.to_wkb(points), columns)
+                feature_index += len(batch)
+                processed_points += len(points)
+                if pbar is not None:
+                    pbar.update(len(points))
                 if progress_callback is not None:
                     try:
                         progress_callback('processing', processed_points, total_points)
                     except Exception:
                         pass
-                if len(batch) >= BATCH_SIZE:
-                    dst.writerecords(batch)
-                    batch.clear()
-            
-            # Initialize local progress bar only if no external callback is provided
-            pbar = None if progress_callback is not None else tqdm(total=total_points, desc="Processing points")
-            
-            if progress_callback is not None:
-                try:
-                    progress_callback('processing_start', 0, total_points)
-                except Exception:
-                    pass
-            
-            feature_index = 0
-            processed_points = 0
-            for feature in src:
-                geom = (
-                    strip_extra_dimensions(feature['geometry'])
-                    if strip_dimensions
-                    else feature['geometry']
-                )
-                props = dict(feature['properties'])
-                
-                if geom['type'] == 'MultiPoint':
-                    # Split MultiPoint into individual Points
-                    # All points from the same MultiPoint get the same __oidx (parent feature index)
-                    props['__oidx'] = feature_index
-                    for coords in geom['coordinates']:
-                        normalized_coords = normalize_coords(coords)
-                        point_geom = {'type': 'Point', 'coordinates': normalized_coords}
-                        write({'geometry': point_geom, 'properties': props})
-                        if pbar is not None:
-                            pbar.update(1)
-                elif geom['type'] == 'Point':
-                    # Single Point - use sequential counter as __oidx
-                    props['__oidx'] = feature_index
-                    # Normalize coordinates to valid WGS84 bounds
-                    normalized_coords = normalize_coords(geom['coordinates'])
-                    normalized_geom = {'type': 'Point', 'coordinates': normalized_coords}
-                    write({'geometry': normalized_geom, 'properties': props})
-                    if pbar is not None:
-                        pbar.update(1)
-                # Skip other geometry types (shouldn't happen if routing is correct)
-                
-                feature_index += 1
-            
-            if pbar is not None:
-                try:
-                    pbar.close()
-                except Exception:
-                    pass
-            
-            # Write any remaining batched features
-            if batch:
-                dst.writerecords(batch)
-                batch.clear()
-            
-            print(f"Total features processed: {feature_index}")
-            print(f"Total points written: {processed_points}")
+        
+        write_batches(output_file, point_batches(), layer, 'Point', {'__oidx': 'int'}, output_layer_options())
+        
+        if pbar is not None:
+            try:
+                pbar.close()
+            except Exception:
+                pass
+        
+        flush_progress(progress_callback)
+        
+        print(f"Total features processed: {feature_index}")
+        print(f"Total points written: {processed_points}")
 
+    metrics.add_time('processing', time.perf_counter() - processing_start)
+    metrics.count('input_features', total_features)
+    metrics.count('input_vertices', total_points)
+    metrics.count('output_features', processed_points)
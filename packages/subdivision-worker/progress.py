@@ -0,0 +1,107 @@
+"""Progress callback throttling shared by the processors and the Lambda handler.
+
+Processors report progress as progress_callback(phase, current, total), often
+once per output feature. ThrottledProgress sits between a processor and the
+handler's callback and only forwards updates that matter: phase changes, the
+final update of a phase, and otherwise at most one update per min_interval
+unless progress jumped by min_fraction of the total.
+"""
+
+import time
+from typing import Callable, Optional
+
+ProgressCallback = Optional[Callable[[str, int, Optional[int]], None]]
+
+
+class ThrottledProgress:
+    """Coalesce progress updates by time and percentage delta.
+
+    Dropped updates are remembered, and flush() forwards the latest one, so
+    the last reported value is never lost.
+    """
+
+    def __init__(self, callback, min_interval: float = 0.25, min_fraction: float = 0.01):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.min_fraction = min_fraction
+        self.received = 0
+        self.forwarded = 0
+        self._phase = None
+        self._current = None
+        self._step = 0
+        self._last_time = 0.0
+        self._pending = None
+
+    def __call__(self, phase: str, current: int, total: Optional[int]) -> None:
+        self.received += 1
+        if phase == self._phase and not (total and current >= total):
+            if current == self._current:
+                return
+            if (
+                current - self._current < self._step
+                and time.monotonic() - self._last_time < self.min_interval
+            ):
+                self._pending = (phase, current, total)
+                return
+        self._forward(phase, current, total)
+
+    def _forward(self, phase: str, current: int, total: Optional[int]) -> None:
+        self._pending = None
+        self._phase = phase
+        self._current = current
+        self._step = (total or 0) * self.min_fraction
+        self._last_time = time.monotonic()
+        self.forwarded += 1
+        self.callback(phase, current, total)
+
+    def flush(self) -> None:
+        """Forward the latest dropped update, if any."""
+        if self._pending is not None:
+            self._forward(*self._pending)
+
+
+def throttle_progress(progress_callback: ProgressCallback, **kwargs) -> ProgressCallback:
+    """Wrap a progress callback in ThrottledProgress (None stays None)."""
+    if progress_callback is None or isinstance(progress_callback, ThrottledProgress):
+        return progress_callback
+    return ThrottledProgress(progress_callback, **kwargs)
+
+
+def flush_progress(progress_callback: ProgressCallback) -> None:
+    """Forward the latest update held back by a ThrottledProgress callback."""
+    if isinstance(progress_callback, ThrottledProgress):
+        progress_callback.flush()
+
+
+class ProgressLog:
+    """Log progress at a coarse granularity.
+
+    A line is printed when the phase changes, when the percentage moved by at
+    least min_delta, or after max_interval seconds. Each line says how many
+    updates were folded into it, so one line replaces a run of near-identical
+    ones.
+    """
+
+    def __init__(self, min_delta: float = 1.0, max_interval: float = 10.0):
+        self.min_delta = min_delta
+        self.max_interval = max_interval
+        self._phase = None
+        self._pct = None
+        self._last_time = 0.0
+        self._skipped = 0
+
+    def log(self, phase: str, current: int, total: Optional[int], pct: float) -> None:
+        now = time.monotonic()
+        if (
+            phase == self._phase
+            and abs(pct - self._pct) < self.min_delta
+            and now - self._last_time < self.max_interval
+        ):
+            self._skipped += 1
+            return
+        suffix = f" ({self._skipped} updates since last line)" if self._skipped else ""
+        print(f"Progress: phase={phase}, current={current}, total={total}, calculated_pct={pct:.2f}{suffix}")
+        self._phase = phase
+        self._pct = pct
+        self._last_time = now
+        self._skipped = 0
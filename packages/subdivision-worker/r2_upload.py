@@ -0,0 +1,349 @@
+"""Multipart uploads of worker output to R2.
+
+boto3's upload_file does not return the PutObject/CompleteMultipartUpload
+response, so the object's ETag needed an extra head_object call. upload_file
+here drives the S3 API directly: small files are sent with one put_object,
+larger ones as a multipart upload whose parts are sent concurrently. Both
+responses carry the ETag, and the size is known locally.
+
+copy_object copies an existing object (such as a cached result) within the
+bucket without downloading it.
+
+Settings mirror boto3's TransferConfig and can be tuned with environment
+variables (see transfer_settings_from_env).
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+MB = 1024 * 1024
+# S3 and R2 reject multipart parts smaller than this (except the last one)
+MIN_PART_SIZE = 5 * MB
+MAX_PARTS = 10000
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def transfer_settings_from_env() -> Dict[str, int]:
+    """Multipart settings from the environment.
+
+    R2_MULTIPART_CHUNK_MB: part size (default 16)
+    R2_MULTIPART_THRESHOLD_MB: files at least this large use multipart
+        (default 16)
+    R2_MAX_CONCURRENCY: parts uploaded at once (default 8)
+    """
+    return {
+        "multipart_chunksize": max(MIN_PART_SIZE, _env_int("R2_MULTIPART_CHUNK_MB", 16) * MB),
+        "multipart_threshold": max(MIN_PART_SIZE, _env_int("R2_MULTIPART_THRESHOLD_MB", 16) * MB),
+        "max_concurrency": max(1, _env_int("R2_MAX_CONCURRENCY", 8)),
+    }
+
+
+class _ProgressCounter:
+    """Sum bytes sent by concurrent part uploads and report the running total."""
+
+    def __init__(self, total: int, progress_cb: Optional[Callable]):
+        self.total = total
+        self.progress_cb = progress_cb
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def add(self, num_bytes: int):
+        if self.progress_cb is None:
+            return
+        # Held while calling back so the callback never runs concurrently
+        with self._lock:
+            self.sent += num_bytes
+            try:
+                self.progress_cb("upload", self.sent, self.total)
+            except Exception:
+                pass
+
+
+def _read_part(path: str, offset: int, size: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def upload_file(
+    s3,
+    local_path: str,
+    bucket: str,
+    key: str,
+    content_type: str = "application/octet-stream",
+    progress_cb: Optional[Callable] = None,
+    multipart_chunksize: int = 16 * MB,
+    multipart_threshold: int = 16 * MB,
+    max_concurrency: int = 8,
+) -> Dict[str, Any]:
+    """Upload local_path to bucket/key.
+
+    Args:
+        s3: boto3 S3 client; its connection pool should allow max_concurrency
+            connections
+        progress_cb: Optional callback(phase, current, total), called with
+            phase "upload" and the bytes sent so far
+        multipart_chunksize: Part size in bytes, raised if the file would need
+            more than 10000 parts
+        multipart_threshold: Files smaller than this are sent with put_object
+        max_concurrency: Number of parts uploaded at once
+
+    Returns:
+        dict with size (bytes) and etag (without quotes)
+    """
+    size = os.path.getsize(local_path)
+    progress = _ProgressCounter(size, progress_cb)
+
+    if size < multipart_threshold:
+        with open(local_path, "rb") as f:
+            response = s3.put_object(Bucket=bucket, Key=key, Body=f, ContentType=content_type)
+        progress.add(size)
+        return {"size": size, "etag": response["ETag"].strip('"')}
+
+    part_size = max(multipart_chunksize, -(-size // MAX_PARTS))
+    upload_id = s3.create_multipart_upload(
+        Bucket=bucket, Key=key, ContentType=content_type
+    )["UploadId"]
+    try:
+        parts = _upload_parts(
+            s3, bucket, key, upload_id, local_path, part_size,
+            range(1, -(-size // part_size) + 1), max_concurrency, progress,
+        )
+        response = _complete(s3, bucket, key, upload_id, parts)
+    except BaseException:
+        _abort(s3, bucket, key, upload_id)
+        raise
+    return {"size": size, "etag": response["ETag"].strip('"')}
+
+
+def _upload_part(s3, bucket, key, upload_id, local_path, part_size, part_number, progress):
+    body = _read_part(local_path, (part_number - 1) * part_size, part_size)
+    response = s3.upload_part(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        Body=body,
+    )
+    progress.add(len(body))
+    return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+
+def _upload_parts(s3, bucket, key, upload_id, local_path, part_size, part_numbers, max_concurrency, progress):
+    """Upload the given parts of local_path concurrently, in part_size pieces."""
+    part_numbers = list(part_numbers)
+    if not part_numbers:
+        return []
+    executor = ThreadPoolExecutor(max_workers=min(max_concurrency, len(part_numbers)))
+    try:
+        futures = [
+            executor.submit(
+                _upload_part, s3, bucket, key, upload_id, local_path, part_size, part_number, progress
+            )
+            for part_number in part_numbers
+        ]
+        return [future.result() for future in futures]
+    finally:
+        # After a failed part, parts that have not started are dropped
+        executor.shutdown(cancel_futures=True)
+
+
+def _complete(s3, bucket, key, upload_id, parts):
+    return s3.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": sorted(parts, key=lambda part: part["PartNumber"])},
+    )
+
+
+def _abort(s3, bucket, key, upload_id):
+    try:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+    except Exception as e:
+        print(f"Failed to abort multipart upload of {key}: {e}")
+
+
+class StreamingUpload:
+    """Multipart upload of a file while another component is still writing it.
+
+    A background thread polls the file size and uploads each part once the
+    file has grown past it, so most of the upload overlaps with writing.
+    finish() uploads the remaining tail and then the first part, which is
+    held back because writers such as GDAL's unindexed FlatGeobuf driver
+    patch the header in place when they close the file. Everything after
+    the first part must be append-only.
+
+    All parts but the last have the same size, as R2 requires.
+    """
+
+    def __init__(
+        self,
+        s3,
+        local_path: str,
+        bucket: str,
+        key: str,
+        content_type: str = "application/octet-stream",
+        multipart_chunksize: int = 16 * MB,
+        max_concurrency: int = 8,
+        poll_interval: float = 0.5,
+    ):
+        self.s3 = s3
+        self.local_path = local_path
+        self.bucket = bucket
+        self.key = key
+        self.part_size = multipart_chunksize
+        self.max_concurrency = max_concurrency
+        self.poll_interval = poll_interval
+        self.parts = []
+        # Next part the background thread uploads; part 1 waits for finish()
+        self._next_part = 2
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._progress = _ProgressCounter(0, None)
+        self._closed = False
+        self.upload_id = s3.create_multipart_upload(
+            Bucket=bucket, Key=key, ContentType=content_type
+        )["UploadId"]
+        self._thread = threading.Thread(target=self._run, name="streaming-upload", daemon=True)
+        self._thread.start()
+
+    def _written(self) -> int:
+        try:
+            return os.path.getsize(self.local_path)
+        except OSError:
+            return 0
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                # Only parts followed by more data are complete
+                while self._written() > self._next_part * self.part_size:
+                    if self._next_part > MAX_PARTS:
+                        raise ValueError("Output needs more than 10000 parts; raise R2_MULTIPART_CHUNK_MB")
+                    self.parts.append(
+                        _upload_part(
+                            self.s3, self.bucket, self.key, self.upload_id,
+                            self.local_path, self.part_size, self._next_part, self._progress,
+                        )
+                    )
+                    self._next_part += 1
+                    if self._stop.is_set():
+                        return
+                self._stop.wait(self.poll_interval)
+        except BaseException as e:
+            self._error = e
+
+    def _stop_thread(self):
+        self._stop.set()
+        self._thread.join()
+
+    def finish(self, progress_cb: Optional[Callable] = None) -> Dict[str, Any]:
+        """Upload the rest once the file is closed and complete the upload.
+
+        progress_cb(phase, current, total) reports the bytes of the whole file
+        that are uploaded, counting parts already sent while writing.
+
+        Returns:
+            dict with size (bytes) and etag (without quotes)
+        """
+        self._stop_thread()
+        self._closed = True
+        try:
+            if self._error is not None:
+                raise self._error
+            size = os.path.getsize(self.local_path)
+            num_parts = max(1, -(-size // self.part_size))
+            if num_parts > MAX_PARTS:
+                raise ValueError("Output needs more than 10000 parts; raise R2_MULTIPART_CHUNK_MB")
+            # Parts uploaded while writing can't have been cut short by the
+            # end of the file, since they were only sent once it grew past them
+            progress = _ProgressCounter(size, progress_cb)
+            progress.add(min(size, len(self.parts) * self.part_size))
+            self.parts += _upload_parts(
+                self.s3, self.bucket, self.key, self.upload_id, self.local_path, self.part_size,
+                [1] + list(range(self._next_part, num_parts + 1)), self.max_concurrency, progress,
+            )
+            response = _complete(self.s3, self.bucket, self.key, self.upload_id, self.parts)
+        except BaseException:
+            _abort(self.s3, self.bucket, self.key, self.upload_id)
+            raise
+        return {"size": size, "etag": response["ETag"].strip('"')}
+
+    def abort(self):
+        """Stop uploading and discard the parts sent so far."""
+        self._stop_thread()
+        if self._closed:
+            return
+        self._closed = True
+        _abort(self.s3, self.bucket, self.key, self.upload_id)
+
+
+# CopyObject only accepts sources up to this size; larger ones are copied
+# part by part with UploadPartCopy
+MAX_COPY_OBJECT_SIZE = 5 * 1024 * MB
+
+
+def _copy_part(s3, bucket, key, upload_id, source, size, part_size, part_number):
+    start = (part_number - 1) * part_size
+    end = min(size, start + part_size) - 1
+    response = s3.upload_part_copy(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        CopySource=source,
+        CopySourceRange=f"bytes={start}-{end}",
+    )
+    return {"PartNumber": part_number, "ETag": response["CopyPartResult"]["ETag"]}
+
+
+def copy_object(
+    s3,
+    bucket: str,
+    source_key: str,
+    key: str,
+    size: int,
+    content_type: str = "application/octet-stream",
+    multipart_chunksize: int = 64 * MB,
+    max_concurrency: int = 8,
+) -> Dict[str, Any]:
+    """Copy bucket/source_key (size bytes) to bucket/key without downloading it.
+
+    content_type is only needed for sources over 5GB, which are copied as a
+    new multipart upload; smaller copies keep the source's metadata.
+
+    Returns:
+        dict with size (bytes) and etag (without quotes) of the copy
+    """
+    source = {"Bucket": bucket, "Key": source_key}
+    if size <= MAX_COPY_OBJECT_SIZE:
+        response = s3.copy_object(Bucket=bucket, Key=key, CopySource=source)
+        return {"size": size, "etag": response["CopyObjectResult"]["ETag"].strip('"')}
+
+    part_size = max(multipart_chunksize, -(-size // MAX_PARTS))
+    upload_id = s3.create_multipart_upload(
+        Bucket=bucket, Key=key, ContentType=content_type
+    )["UploadId"]
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    try:
+        futures = [
+            executor.submit(_copy_part, s3, bucket, key, upload_id, source, size, part_size, part_number)
+            for part_number in range(1, -(-size // part_size) + 1)
+        ]
+        parts = [future.result() for future in futures]
+        response = _complete(s3, bucket, key, upload_id, parts)
+    except BaseException:
+        executor.shutdown(cancel_futures=True)
+        _abort(s3, bucket, key, upload_id)
+        raise
+    executor.shutdown()
+    return {"size": size, "etag": response["ETag"].strip('"')}
@@ -6,6 +6,9 @@ import os
 import time
 import threading
 
+from metrics import JobMetrics
+from raster_stats import compute_band_statistics, write_statistics_tags
+
 
 def _get_source_epsg(crs) -> int:
     """
@@ -43,6 +46,7 @@ def process_raster(
     input_file: str,
     output_file: str,
     progress_callback: Optional[Callable] = None,
+    metrics: Optional[JobMetrics] = None,
 ) -> int:
     """
     Validate the raster projection and convert it to a Cloud-Optimized GeoTIFF
@@ -52,6 +56,8 @@ def process_raster(
         input_file: Path to the input GeoTIFF file.
         output_file: Path where the COG will be written.
         progress_callback: Optional callback(phase, current, total).
+        metrics: Optional JobMetrics that receives the statistics and
+            processing (COG creation) phase times and the pixel count.
 
     Returns:
         The source EPSG code as an integer.
@@ -59,21 +65,22 @@ def process_raster(
     Raises:
         ValueError: If the raster CRS cannot be identified as a supported EPSG code.
     """
+    metrics = metrics if metrics is not None else JobMetrics()
     cog_profile = cog_profiles.get("deflate")
 
     with rasterio.Env(CHECK_DISK_FREE_SPACE=False):
         temp_output = output_file + ".tmp"
         print(f"[raster] Starting processing. input={input_file}, temp_output={temp_output}")
 
-        # Open the input in update mode so we can pre-compute exact band
-        # statistics and persist them as band tags on the source. rio-cogeo's
-        # default behaviour is to write approximate statistics (derived from
-        # overview levels) into the output COG, which is badly wrong for
-        # sparse rasters where rare extreme values disappear during
-        # downsampling. By writing exact stats to the source first and then
-        # asking cog_translate to forward band tags, the output COG gets the
-        # correct values without any post-write modification (which would
-        # break the output COG layout).
+        # Pre-compute exact band statistics (raster_stats) and persist them as
+        # band tags on the source, opened in update mode. rio-cogeo's default
+        # behaviour is to write approximate statistics (derived from overview
+        # levels) into the output COG, which is badly wrong for sparse rasters
+        # where rare extreme values disappear during downsampling. By writing
+        # exact stats to the source first and then asking cog_translate to
+        # forward band tags, the output COG gets the correct values without
+        # any post-write modification (which would break the output COG
+        # layout).
         #
         # IGNORE_COG_LAYOUT_BREAK=YES is needed in case the input is itself a
         # COG (GDAL refuses in-place metadata updates on COGs by default).
@@ -99,8 +106,15 @@ def process_raster(
                 pass
 
             print("[raster] Computing exact band statistics on source...")
-            for bidx in range(1, num_bands + 1):
-                src.statistics(bidx, approx=False, clear_cache=True)
+
+            def _stats_progress(done: int, total: int) -> None:
+                if progress_callback is not None:
+                    progress_callback("scanning", done, total)
+
+            with metrics.phase("statistics"):
+                stats = compute_band_statistics(input_file, progress_callback=_stats_progress)
+                write_statistics_tags(src, stats)
+            metrics.count("input_pixels", width * height * num_bands)
 
         # Report scanning complete.
         if progress_callback is not None:
@@ -153,16 +167,17 @@ def process_raster(
             cog_hb_thread.start()
 
         try:
-            cog_translate(
-                input_file,
-                temp_output,
-                cog_profile,
-                in_memory=False,
-                quiet=True,
-                # Copy band tags (including the exact STATISTICS_* we just
-                # wrote to the source) into the output COG.
-                forward_band_tags=True,
-            )
+            with metrics.phase("processing"):
+                cog_translate(
+                    input_file,
+                    temp_output,
+                    cog_profile,
+                    in_memory=False,
+                    quiet=True,
+                    # Copy band tags (including the exact STATISTICS_* we just
+                    # wrote to the source) into the output COG.
+                    forward_band_tags=True,
+                )
         finally:
             if cog_hb_thread is not None:
                 stop_cog_heartbeat.set()
@@ -0,0 +1,187 @@
+"""Exact per-band raster statistics, computed block by block in threads.
+
+GDAL's exact statistics (statistics(bidx, approx=False)) read the whole raster
+once per band on a single thread. compute_band_statistics reads all bands of
+a window at once, in windows aligned to the raster's native blocks, on a
+thread pool (GDAL releases the GIL while reading and decompressing, NumPy
+while reducing). Each window's per-band count, mean, sum of squared
+deviations from the mean, minimum and maximum are merged with the pairwise
+form of Welford's algorithm (Chan et al.), which stays exact and numerically
+stable regardless of the order windows finish in.
+
+Like GDAL, statistics skip masked pixels (nodata) and NaN. write_statistics_tags
+stores the result as the STATISTICS_* band tags GDAL would write, which
+cog_translate forwards to the output COG.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from parallel import available_cpus
+
+# Windows cover whole blocks and at least this many pixels, so striped
+# rasters (one row per block) are not read a row at a time
+MIN_WINDOW_PIXELS = 1 << 20
+
+
+def stats_workers_from_env() -> int:
+    """Thread count from RASTER_STATS_WORKERS, falling back to available CPUs."""
+    try:
+        workers = int(os.getenv("RASTER_STATS_WORKERS", "0"))
+    except Exception:
+        workers = 0
+    return workers if workers > 0 else available_cpus()
+
+
+class BandStatistics:
+    """Running count, mean, M2 (sum of squared deviations), min and max per band."""
+
+    def __init__(self, count, mean, m2, minimum, maximum):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @classmethod
+    def empty(cls, num_bands: int) -> "BandStatistics":
+        return cls(
+            np.zeros(num_bands),
+            np.zeros(num_bands),
+            np.zeros(num_bands),
+            np.full(num_bands, np.inf),
+            np.full(num_bands, -np.inf),
+        )
+
+    @classmethod
+    def from_array(cls, data: np.ma.MaskedArray) -> "BandStatistics":
+        """Statistics of a (bands, rows, cols) masked array, skipping NaN."""
+        stats = cls.empty(data.shape[0])
+        values = np.ma.getdata(data)
+        mask = np.ma.getmask(data)
+        floating = np.issubdtype(values.dtype, np.floating)
+        for band in range(values.shape[0]):
+            band_values = values[band] if mask is np.ma.nomask else values[band][~mask[band]]
+            if floating:
+                band_values = band_values[~np.isnan(band_values)]
+            band_values = band_values.ravel()
+            if band_values.size == 0:
+                continue
+            count = band_values.size
+            mean = band_values.sum(dtype=np.float64) / count
+            deviations = band_values.astype(np.float64) - mean
+            stats.count[band] = count
+            stats.mean[band] = mean
+            stats.m2[band] = np.dot(deviations, deviations)
+            stats.minimum[band] = band_values.min()
+            stats.maximum[band] = band_values.max()
+        return stats
+
+    def merge(self, other: "BandStatistics") -> "BandStatistics":
+        count = self.count + other.count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = np.where(count > 0, other.count / count, 0.0)
+        delta = other.mean - self.mean
+        return BandStatistics(
+            count,
+            self.mean + delta * weight,
+            self.m2 + other.m2 + np.square(delta) * self.count * weight,
+            np.minimum(self.minimum, other.minimum),
+            np.maximum(self.maximum, other.maximum),
+        )
+
+    def stddev(self) -> np.ndarray:
+        """Population standard deviation, as GDAL reports it."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(np.where(self.count > 0, self.m2 / self.count, 0.0))
+
+
+def stats_windows(width: int, height: int, block_shape, min_pixels: int = MIN_WINDOW_PIXELS) -> List[Window]:
+    """Windows covering the raster, aligned to blocks of block_shape (rows, cols).
+
+    Blocks are stacked vertically until a window has at least min_pixels.
+    """
+    block_rows, block_cols = block_shape
+    block_rows *= max(1, min_pixels // max(1, block_rows * block_cols))
+    return [
+        Window(col, row, min(block_cols, width - col), min(block_rows, height - row))
+        for row in range(0, height, block_rows)
+        for col in range(0, width, block_cols)
+    ]
+
+
+def compute_band_statistics(
+    path: str,
+    workers: Optional[int] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+) -> BandStatistics:
+    """Exact statistics of every band of the raster at path.
+
+    Each thread opens its own dataset handle, since rasterio datasets must not
+    be shared between threads. progress_callback(done, total) is called as
+    windows complete.
+    """
+    workers = stats_workers_from_env() if workers is None else max(1, workers)
+    with rasterio.open(path) as src:
+        num_bands = src.count
+        windows = stats_windows(src.width, src.height, src.block_shapes[0])
+
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def window_stats(window: Window) -> BandStatistics:
+        src = getattr(local, "src", None)
+        if src is None:
+            src = local.src = rasterio.open(path)
+            with handles_lock:
+                handles.append(src)
+        return BandStatistics.from_array(src.read(window=window, masked=True))
+
+    stats = BandStatistics.empty(num_bands)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for done, window_result in enumerate(executor.map(window_stats, windows), start=1):
+                stats = stats.merge(window_result)
+                if progress_callback is not None:
+                    try:
+                        progress_callback(done, len(windows))
+                    except Exception:
+                        pass
+    finally:
+        for src in handles:
+            src.close()
+    return stats
+
+
+def _format(value: float, precision: int = 14) -> str:
+    # GDAL writes statistics with %.14g and the valid percentage with %.4g
+    return "%.*g" % (precision, value)
+
+
+def write_statistics_tags(dst, stats: BandStatistics) -> None:
+    """Store stats as STATISTICS_* tags on the bands of dataset dst (opened r+).
+
+    Bands without any valid pixel get no tags, as GDAL cannot compute
+    statistics for them either.
+    """
+    num_pixels = dst.width * dst.height
+    stddev = stats.stddev()
+    for i in range(len(stats.count)):
+        if stats.count[i] == 0:
+            print(f"[raster] Band {i + 1} has no valid pixels, not writing statistics")
+            continue
+        dst.update_tags(
+            i + 1,
+            STATISTICS_MINIMUM=_format(stats.minimum[i]),
+            STATISTICS_MAXIMUM=_format(stats.maximum[i]),
+            STATISTICS_MEAN=_format(stats.mean[i]),
+            STATISTICS_STDDEV=_format(stddev[i]),
+            STATISTICS_VALID_PERCENT=_format(100.0 * stats.count[i] / num_pixels, 4),
+        )
@@ -0,0 +1,105 @@
+"""Content-addressed cache of job results in R2.
+
+Admins often re-run the same layers. The handler hashes the input while
+downloading it, and a manifest stored under the hash of the input bytes and
+the processing parameters points at the output of the last run with those
+inputs and the stats that were reported for it. On a hit the handler copies
+that output to the requested key instead of processing the input again.
+
+Manifests are small JSON objects at
+<RESULT_CACHE_PREFIX>/<input sha256>/<parameters sha256>.json.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+# Bump when processing changes what is written for the same input and
+# parameters, so results of older workers are not reused
+CACHE_VERSION = 2
+
+
+def cache_prefix() -> str:
+    return os.getenv("RESULT_CACHE_PREFIX", "cache/subdivision").strip("/")
+
+
+def cache_params(**params) -> Dict[str, Any]:
+    """Parameters a cached result must match, including the cache version.
+
+    RESULT_CACHE_VERSION (e.g. the image tag) is added when set, for
+    deployments that want to invalidate the cache on every release.
+    """
+    params = dict(params, version=CACHE_VERSION)
+    release = os.getenv("RESULT_CACHE_VERSION")
+    if release:
+        params["release"] = release
+    return params
+
+
+def manifest_key(content_hash: str, params: Dict[str, Any]) -> str:
+    params_hash = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f"{cache_prefix()}/{content_hash}/{params_hash}.json"
+
+
+def _is_not_found(e: ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+
+def lookup(s3, bucket: str, content_hash: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The manifest for content_hash and params, or None on a miss.
+
+    A manifest whose output object was deleted or overwritten since is a miss.
+    """
+    key = manifest_key(content_hash, params)
+    try:
+        manifest = json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+        head = s3.head_object(Bucket=bucket, Key=manifest["object"]["key"])
+    except ClientError as e:
+        if not _is_not_found(e):
+            print(f"Result cache lookup of {key} failed: {e}")
+        return None
+    except Exception as e:
+        print(f"Result cache lookup of {key} failed: {e}")
+        return None
+    if head["ETag"].strip('"') != manifest["object"]["etag"]:
+        print(f"Cached output {manifest['object']['key']} changed since it was cached")
+        return None
+    return manifest
+
+
+def store(
+    s3,
+    bucket: str,
+    content_hash: str,
+    params: Dict[str, Any],
+    output: Dict[str, Any],
+    result: Dict[str, Any],
+    geometry_type: Optional[str] = None,
+) -> None:
+    """Record output (key, size and etag of the uploaded object, plus epsg for
+    rasters) and the result stats of a finished job. Failures are logged, not
+    raised; the job itself succeeded."""
+    key = manifest_key(content_hash, params)
+    manifest = {
+        "contentHash": content_hash,
+        "params": params,
+        "object": {
+            name: output[name] for name in ("key", "size", "etag", "epsg") if name in output
+        },
+        "geometryType": geometry_type,
+        "result": result,
+        "created": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        s3.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=json.dumps(manifest).encode(),
+            ContentType="application/json",
+        )
+    except Exception as e:
+        print(f"Could not store result cache manifest {key}: {e}")
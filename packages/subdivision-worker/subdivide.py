@@ -1,10 +1,15 @@
 import argparse
+import itertools
 import math
+from functools import partial
 from shapely.geometry import shape, mapping, LineString, GeometryCollection, MultiLineString, Polygon, MultiPolygon
-from shapely.ops import split, transform
+from shapely.ops import split
+import shapely
 from shapely import get_num_coordinates, prepare, is_valid
+from shapely.geometry.base import BaseGeometry
 from shapely.validation import make_valid
 import fiona
+import numpy as np
 from tqdm import tqdm
 import os
 import sys
@@ -12,6 +17,26 @@ import time
 from pyproj import Geod
 
 from geometry_utils import geometry_type_has_extra_dimensions, strip_extra_dimensions
+from parallel import OrderedProcessPool
+from progress import flush_progress, throttle_progress
+from fgb_index import output_layer_options
+from fgb_stream import FeatureStreamParser, decode_polygonal_geometry
+from metrics import JobMetrics
+from auto_max_nodes import (
+    DEFAULT_MAX_NODES,
+    VertexHistogram,
+    choose_max_nodes,
+    geometry_extent,
+    model_settings_from_env,
+    parse_max_nodes,
+)
+from overlap import (
+    OverlapCollector,
+    array_chunks,
+    exact_overlap_stats,
+    file_chunks,
+    sample_overlaps,
+)
 
 def count_nodes(geom):
     """Count the number of nodes in a Fiona geometry (geojson-like dict)."""
@@ -23,16 +48,26 @@ def count_nodes(geom):
         return 0
     
     
-def subdivide_and_write_feature(feature, write, max_nodes):
-    """Recursively subdivide a geometry into smaller parts and update stats."""
-    geom = shape(feature['geometry'])
+def is_invalid_geometry(geom_geojson):
+    """True if a GeoJSON-like geometry is invalid or cannot be parsed by Shapely."""
+    try:
+        return not is_valid(shape(geom_geojson))
+    except Exception:
+        return True
+
+
+def subdivide_geometry(geom, max_nodes):
+    """Recursively bisect a Shapely polygon until every part has at most max_nodes.
+
+    Returns a list of (part, num_coords) tuples.
+    """
+    parts = []
     stack = multipart_to_singlepart(geom)
     while stack:
       geom = stack.pop()
       num_coords_geom = get_num_coordinates(geom)
       if num_coords_geom <= max_nodes:
-          f = fiona.Feature(geometry=fiona.Geometry.from_dict(mapping(geom)), properties=feature['properties'])
-          write(f, num_coords_geom)
+          parts.append((geom, num_coords_geom))
           continue
 
       bounds = geom.bounds
@@ -50,61 +85,166 @@ def subdivide_and_write_feature(feature, write, max_nodes):
       for part in split_parts.geoms:
         num_coords = get_num_coordinates(part)
         if num_coords <= max_nodes:
-            f = fiona.Feature(geometry=fiona.Geometry.from_dict(mapping(part)), properties=feature['properties'])
-            write(f, num_coords)
+            parts.append((part, num_coords))
         else:
             stack.append(part)
+    return parts
 
 
-def _unwrap_ring_longitudes(coords):
-    unwrapped = []
-    if not coords:
-        return coords
-    prev_x = coords[0][0]
-    prev_y = coords[0][1]
-    unwrapped.append((prev_x, prev_y))
-    for i in range(1, len(coords)):
-        x, y = coords[i][0], coords[i][1]
-        dx = x - prev_x
-        if dx > 180:
-            while x - prev_x > 180:
-                x -= 360
-        elif dx < -180:
-            while x - prev_x < -180:
-                x += 360
-        unwrapped.append((x, y))
-        prev_x, prev_y = x, y
-    return unwrapped
-
-
-def _crosses_antimeridian_coords(coords):
-    if not coords:
-        return False
-    prev_x = coords[0][0]
-    for i in range(1, len(coords)):
-        x = coords[i][0]
-        if abs(x - prev_x) > 180:
-            return True
-        prev_x = x
-    return False
+def _polygon_parts(geom):
+    """Non-empty Polygon parts of a clip or repair result.
 
+    Multi-part geometries and collections are flattened recursively, since
+    make_valid can return a GeometryCollection that holds a MultiPolygon.
+    """
+    parts = []
+    for part in shapely.get_parts(geom):
+        if part.is_empty:
+            continue
+        if part.geom_type == 'Polygon':
+            parts.append(part)
+        elif part.geom_type in ('MultiPolygon', 'GeometryCollection'):
+            parts.extend(_polygon_parts(part))
+    return parts
 
-def crosses_antimeridian(geom):
-    if geom.geom_type == "Polygon":
-        rings = [geom.exterior] + list(geom.interiors)
-        return any(_crosses_antimeridian_coords(list(r.coords)) for r in rings)
-    elif geom.geom_type == "MultiPolygon":
-        return any(crosses_antimeridian(p) for p in geom.geoms)
-    return False
 
-def geojson_crosses_antimeridian(geom):
-    if geom['type'] == 'Polygon':
-        rings = [geom['coordinates'][0]] + geom['coordinates'][1:]
-        return any(_crosses_antimeridian_coords(r) for r in rings)
-    elif geom['type'] == 'MultiPolygon':
-        return any(geojson_crosses_antimeridian({'type':'Polygon','coordinates':coords})
-                   for coords in geom['coordinates'])
-    return False
+# Relative difference between a piece's area and the summed area of its
+# cells above which the cells are recomputed with a topological intersection
+_CELL_AREA_TOLERANCE = 1e-7
+
+
+def _clip_cells(piece, rects, checked):
+    """Polygon parts of piece within each of rects.
+
+    Cells are cut with clip_by_rect. For valid pieces (checked), a cell that
+    comes out invalid is recomputed with intersection, and if the cells still
+    do not add up to the area of the piece (clip_by_rect occasionally returns
+    a nearly empty piece for a cell) all of them are. Returns None if even
+    the intersections lose area.
+    """
+    cells = np.array([shapely.clip_by_rect(piece, *rect) for rect in rects], dtype=object)
+    if checked:
+        boxes = shapely.box(*np.asarray(rects, dtype=float).T)
+        invalid = ~is_valid(cells)
+        if invalid.any():
+            cells[invalid] = shapely.intersection(piece, boxes[invalid])
+        area = piece.area
+        if abs(shapely.area(cells).sum() - area) > _CELL_AREA_TOLERANCE * area:
+            cells = shapely.intersection(piece, boxes)
+            if abs(shapely.area(cells).sum() - area) > _CELL_AREA_TOLERANCE * area:
+                return None
+    children = []
+    for cell in cells:
+        children.extend(_polygon_parts(cell))
+    return children
+
+
+def subdivide_geometry_quadtree(geom, max_nodes, max_depth=32):
+    """Subdivide a Shapely polygon with a vertex-density quadtree.
+
+    Each piece with more than max_nodes coordinates is cut into four quadrants
+    if it has many times max_nodes, otherwise into two halves across the longer
+    axis. Two cut points are tried: the median of its vertices, which adapts to
+    where vertices are dense, and the middle of its bbox, as bisection uses. A
+    cut through a dense stretch of coastline also crosses the boundary more
+    often and leaves many small fragments, so the cut that gives fewer pieces
+    is kept. Cells are cut with clip_by_rect,
+    which is a single linear pass over the piece rather than a topological
+    split. For valid input, cells that clip_by_rect gets wrong (invalid, or
+    losing area) are recomputed with intersection, and pieces whose cells
+    still lose area fall back to bisection, so the area of the input is
+    conserved. Pieces that do not get smaller (e.g. many repeated vertices)
+    fall back to bisection too.
+
+    Returns a list of (part, num_coords) tuples, like subdivide_geometry.
+    """
+    parts = []
+    geom_valid = None
+    level = multipart_to_singlepart(geom)
+    depth = 0
+    while level:
+      counts = get_num_coordinates(level)
+      if geom_valid is None and (counts > max_nodes).any():
+          geom_valid = bool(is_valid(geom))
+      next_level = []
+      for piece, num_coords in zip(level, counts):
+        num_coords = int(num_coords)
+        if num_coords <= max_nodes:
+            parts.append((piece, num_coords))
+            continue
+        if depth >= max_depth:
+            parts.extend(subdivide_geometry(piece, max_nodes))
+            continue
+
+        minx, miny, maxx, maxy = piece.bounds
+        cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+        mx, my = np.median(shapely.get_coordinates(piece), axis=0)
+        # A median on the boundary would leave one side empty
+        cuts = [(cx, cy)]
+        if minx < mx < maxx and miny < my < maxy and (mx, my) != (cx, cy):
+            cuts.insert(0, (mx, my))
+
+        children = None
+        for x, y in cuts:
+            if num_coords > 4 * max_nodes:
+                rects = ((minx, miny, x, y), (x, miny, maxx, y),
+                         (minx, y, x, maxy), (x, y, maxx, maxy))
+            elif maxx - minx > maxy - miny:
+                rects = ((minx, miny, x, maxy), (x, miny, maxx, maxy))
+            else:
+                rects = ((minx, miny, maxx, y), (minx, y, maxx, maxy))
+            cut = _clip_cells(piece, rects, geom_valid)
+            if cut is not None and (children is None or len(cut) < len(children)):
+                children = cut
+        if children is None:
+            parts.extend(subdivide_geometry(piece, max_nodes))
+            continue
+        if len(children) == 1 and get_num_coordinates(children[0]) >= num_coords:
+            parts.extend(subdivide_geometry(piece, max_nodes))
+            continue
+        next_level.extend(children)
+      level = next_level
+      depth += 1
+
+    # clip_by_rect can join two lobes that meet on a cell edge into one
+    # self-touching ring, which split would have returned as two polygons.
+    # Repair those pieces, unless the input was already invalid (geom_valid
+    # is None if nothing was cut).
+    invalid = ~is_valid([part for part, _ in parts]) if parts and geom_valid else None
+    if invalid is not None and invalid.any():
+        repaired = []
+        for (part, num_coords), bad in zip(parts, invalid):
+            if not bad:
+                repaired.append((part, num_coords))
+                continue
+            for fixed in _polygon_parts(make_valid(part)):
+                repaired.extend(subdivide_geometry(fixed, max_nodes))
+        parts = repaired
+    return parts
+
+
+SUBDIVISION_STRATEGIES = {
+    'bisect': subdivide_geometry,
+    'quadtree': subdivide_geometry_quadtree,
+}
+
+
+def get_subdivision_strategy(name):
+    """Look up a subdivision function by name ('bisect' or 'quadtree')."""
+    try:
+        return SUBDIVISION_STRATEGIES[name or 'bisect']
+    except KeyError:
+        raise ValueError(
+            f"Unknown subdivision strategy: {name}. "
+            f"Supported strategies: {', '.join(SUBDIVISION_STRATEGIES)}"
+        )
+
+
+def subdivide_and_write_feature(feature, write, max_nodes):
+    """Recursively subdivide a geometry into smaller parts and update stats."""
+    for part, num_coords in subdivide_geometry(shape(feature['geometry']), max_nodes):
+        f = {'geometry': mapping(part), 'properties': feature['properties']}
+        write(f, num_coords)
 
 
 def _bbox_prime_meridian_antimeridian_strip(minx: float, maxx: float, lat_h: float, lon_w: float) -> bool:
@@ -195,90 +335,650 @@ def filter_antimeridian_artifacts(geom_geojson):
     return geom_geojson
 
 
-def antimeridian_split_to_non_crossing(geom_geojson):
-    """Return a GeoJSON geometry with no parts crossing the antimeridian.
-    Input is assumed to be EPSG:4326.
+def antimeridian_artifact_mask(geometries):
+    """Vectorized is_antimeridian_box_artifact over an array of Shapely geometries.
+
+    Only non-empty Polygons can be artifacts; other entries (including None) are False.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    candidate = (shapely.get_type_id(geometries) == 3) & ~shapely.is_empty(geometries)
+    minx, miny, maxx, maxy = shapely.bounds(geometries).T
+    lon_w = maxx - minx
+    lat_h = maxy - miny
+    with np.errstate(invalid='ignore'):
+        # (1) Bbox wraps most of the world but is thin in latitude.
+        wraps = ((lon_w >= 300.0) & (lat_h <= 35.0)) | ((lon_w >= 250.0) & (lat_h <= 8.0))
+        # (1b) Long-way strip tying 0° to ±180° (see _bbox_prime_meridian_antimeridian_strip).
+        near_pm = ((minx >= -12.0) & (minx <= 12.0)) | ((maxx >= -12.0) & (maxx <= 12.0))
+        near_anti = (minx <= -165.0) | (maxx <= -165.0) | (minx >= 165.0) | (maxx >= 165.0)
+        strip = (lat_h <= 5.0) & (lon_w >= 165.0) & near_pm & near_anti
+        mask = candidate & (wraps | strip)
+        # (2) Simple quadrilaterals with every corner on/near ±180°. Rare, so checked one by one.
+        exterior = shapely.get_exterior_ring(geometries)
+        num_coords = shapely.get_num_coordinates(exterior)
+        quads = candidate & ~mask & (lon_w >= 300.0) & ((num_coords == 4) | (num_coords == 5))
+    for idx in np.flatnonzero(quads):
+        xs = shapely.get_coordinates(exterior[idx])[:4, 0]
+        if np.all(np.abs(xs) >= 179.5):
+            mask[idx] = True
+    return mask
+
+
+def filter_antimeridian_artifacts_array(geometries):
+    """Array version of filter_antimeridian_artifacts.
+
+    Returns a copy of geometries where artifact parts are removed and geometries
+    with nothing left are None.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    result = geometries.copy()
+    type_ids = shapely.get_type_id(geometries)
+    result[antimeridian_artifact_mask(geometries)] = None
+
+    multi_idx = np.flatnonzero(type_ids == 6)
+    if len(multi_idx):
+        parts, owner = shapely.get_parts(geometries[multi_idx], return_index=True)
+        artifact = antimeridian_artifact_mask(parts)
+        for k in np.unique(owner[artifact]):
+            kept = parts[(owner == k) & ~artifact]
+            if len(kept) == 0:
+                result[multi_idx[k]] = None
+            elif len(kept) == 1:
+                result[multi_idx[k]] = kept[0]
+            else:
+                result[multi_idx[k]] = shapely.multipolygons(kept)
+    return result
+
+
+def normalize_longitudes(x):
+    """Vectorized longitude normalization into [-180, 180].
+
+    Values above 180 are shifted down and values below -180 up by whole turns,
+    so exactly ±180 are kept as-is.
     """
-    def normalize_lon(x):
-        while x > 180:
-            x -= 360
-        while x < -180:
-            x += 360
+    x = np.asarray(x, dtype=np.float64)
+    over = x > 180
+    under = x < -180
+    if not (over.any() or under.any()):
         return x
+    x = x.copy()
+    x[over] -= 360.0 * np.ceil((x[over] - 180.0) / 360.0)
+    x[under] += 360.0 * np.ceil((-180.0 - x[under]) / 360.0)
+    return x
 
-    def normalize_geojson_longitudes(g):
-        gtype = g.get('type')
-        if gtype == 'Polygon':
-            coords = []
-            for ring in g.get('coordinates', []):
-                coords.append([(normalize_lon(pt[0]), pt[1]) for pt in ring])
-            return {'type': 'Polygon', 'coordinates': coords}
-        elif gtype == 'MultiPolygon':
-            polys = []
-            for poly in g.get('coordinates', []):
-                coords = []
-                for ring in poly:
-                    coords.append([(normalize_lon(pt[0]), pt[1]) for pt in ring])
-                polys.append(coords)
-            return {'type': 'MultiPolygon', 'coordinates': polys}
-        return g
-
-    geom_geojson = normalize_geojson_longitudes(geom_geojson)
-
-    # Fast path: no Shapely if not crossing
-    if not geojson_crosses_antimeridian(geom_geojson):
-        return geom_geojson
-    g = shape(geom_geojson)
-    if g.is_empty:
-        return geom_geojson
 
-    if not crosses_antimeridian(g):
+def _antimeridian_steps(x, coord_ring):
+    """Per-coordinate -1/0/+1 turns where a ring jumps more than 180° in longitude.
+
+    The cumulative sum of these steps within a ring, times 360, unwraps the ring
+    into continuous longitudes.
+    """
+    steps = np.zeros(len(x), dtype=np.int64)
+    if len(x) < 2:
+        return steps
+    dx = np.diff(x)
+    same_ring = coord_ring[1:] == coord_ring[:-1]
+    steps[1:][same_ring & (dx > 180)] = -1
+    steps[1:][same_ring & (dx < -180)] = 1
+    return steps
+
+
+def _split_unwrapped_polygon(polygon):
+    """Cut a polygon with continuous (possibly > 180°) longitudes into 360° bands
+    and shift each band back into [-180, 180]."""
+    minx, miny, maxx, maxy = polygon.bounds
+    pieces = []
+    first_band = math.floor((minx + 180.0) / 360.0)
+    last_band = math.floor((maxx + 180.0) / 360.0)
+    for band in range(first_band, last_band + 1):
+        west = -180.0 + 360.0 * band
+        clipped = shapely.clip_by_rect(polygon, west, miny, west + 360.0, maxy)
+        if clipped.is_empty:
+            continue
+        if band != 0:
+            clipped = shapely.transform(clipped, lambda c, shift=360.0 * band: c - [shift, 0.0])
+        pieces.extend(
+            p for p in shapely.get_parts(clipped) if p.geom_type == 'Polygon' and not p.is_empty
+        )
+    return pieces
+
+
+def antimeridian_split_geometry(geom):
+    """Return a Shapely geometry with longitudes normalized to [-180, 180] and no
+    parts crossing the antimeridian. Input is assumed to be EPSG:4326.
+
+    Works on flat coordinate arrays: normalization and crossing detection are
+    vectorized over every vertex, and only polygons with a crossing ring are
+    unwrapped (cumulative sum of ±360 corrections) and cut at the antimeridian.
+    Geometries other than Polygon and MultiPolygon are returned unchanged; Z
+    values are dropped.
+    """
+    if not isinstance(geom, (Polygon, MultiPolygon)):
+        return geom
+    has_z = geom.has_z
+    minx, _, maxx, _ = geom.bounds
+    # Most features are in range and narrower than 180°, so no edge can cross.
+    if minx >= -180 and maxx <= 180 and maxx - minx <= 180 and not has_z:
+        return geom
+
+    coords = shapely.get_coordinates(geom)
+    lons = coords[:, 0]
+    x = normalize_longitudes(lons)
+    normalized = geom
+    if has_z or x is not lons:
+        normalized = shapely.transform(geom, lambda c: np.column_stack([x, c[:, 1]]))
+    # Jumps between the end of one ring and the start of the next can only add
+    # false positives here, which the ring-aware check below rules out.
+    if len(x) < 2 or not (np.abs(np.diff(x)) > 180).any():
+        return normalized
+
+    polygons = list(geom.geoms) if isinstance(geom, MultiPolygon) else [geom]
+    rings, ring_polygon = shapely.get_rings(polygons, return_index=True)
+    coord_ring = np.repeat(np.arange(len(rings)), shapely.get_num_coordinates(rings))
+    steps = _antimeridian_steps(x, coord_ring)
+    if not steps.any():
+        return normalized
+
+    crossing = set(ring_polygon[coord_ring[steps != 0]].tolist())
+    normalized_polygons = (
+        list(normalized.geoms) if isinstance(normalized, MultiPolygon) else [normalized]
+    )
+    # Unwrap every ring: cumulative turns since the start of its ring
+    turns = np.cumsum(steps)
+    ring_start = np.searchsorted(coord_ring, np.arange(len(rings)))
+    turns -= turns[ring_start[coord_ring]]
+    unwrapped_x = x + 360.0 * turns
+
+    parts = []
+    for polygon_idx, polygon in enumerate(normalized_polygons):
+        if polygon_idx not in crossing:
+            parts.append(polygon)
+            continue
+        ring_ids = np.flatnonzero(ring_polygon == polygon_idx)
+        ring_coords = []
+        for ring_id in ring_ids:
+            in_ring = coord_ring == ring_id
+            ring_coords.append(np.column_stack([unwrapped_x[in_ring], coords[in_ring, 1]]))
+        # Rings are unwrapped independently; move holes to the exterior's turn.
+        exterior_center = ring_coords[0][:, 0].mean()
+        for hole in ring_coords[1:]:
+            hole[:, 0] += 360.0 * round((exterior_center - hole[:, 0].mean()) / 360.0)
+        unwrapped = Polygon(ring_coords[0], ring_coords[1:])
+        pieces = _split_unwrapped_polygon(unwrapped)
+        parts.extend(pieces if pieces else [polygon])
+
+    if not parts:
+        return normalized
+    return MultiPolygon(parts) if len(parts) > 1 else parts[0]
+
+
+def antimeridian_split_to_non_crossing(geom_geojson):
+    """Return a GeoJSON geometry with no parts crossing the antimeridian.
+    Input is assumed to be EPSG:4326. See antimeridian_split_geometry.
+    """
+    if geom_geojson.get('type') not in ('Polygon', 'MultiPolygon'):
         return geom_geojson
+    return mapping(antimeridian_split_geometry(shape(geom_geojson)))
+
+
+# Geodesic calculator (input is always EPSG:4326)
+_geod = Geod(ellps="WGS84")
+
+
+def geodesic_areas_sqkm(geometries):
+    """Compute geodesic areas in sq km for an array of Shapely geometries.
+
+    All rings in the batch are packed into one flat lon/lat array with per-ring
+    offsets using Shapely's vectorized accessors, so no per-ring Python lists are
+    built. pyproj.Geod has no batched polygon area call, so each ring is still
+    passed to polygon_area_perimeter, but as a view into the packed arrays.
+    Holes are subtracted from their exterior and each polygon's area is clamped
+    at zero. Non-polygonal geometries and None have zero area.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    areas = np.zeros(len(geometries), dtype=np.float64)
+    parts, geometry_idx = shapely.get_parts(geometries, return_index=True)
+    polygonal = shapely.get_type_id(parts) == 3
+    parts, geometry_idx = parts[polygonal], geometry_idx[polygonal]
+    rings, part_idx = shapely.get_rings(parts, return_index=True)
+    if len(rings) == 0:
+        return areas
+
+    ring_sizes = shapely.get_num_coordinates(rings)
+    is_hole = np.zeros(len(rings), dtype=bool)
+    is_hole[1:] = part_idx[1:] == part_idx[:-1]
+    coords = shapely.get_coordinates(rings)
+    split_at = np.cumsum(ring_sizes)[:-1]
+    ring_lons = np.split(np.ascontiguousarray(coords[:, 0]), split_at)
+    ring_lats = np.split(np.ascontiguousarray(coords[:, 1]), split_at)
+
+    ring_areas = np.fromiter(
+        (abs(area) for area, _ in map(_geod.polygon_area_perimeter, ring_lons, ring_lats)),
+        dtype=np.float64,
+        count=len(rings),
+    )
+    ring_areas[ring_sizes < 3] = 0.0
+    ring_areas[is_hole] *= -1
+
+    polygon_areas = np.bincount(part_idx, weights=ring_areas, minlength=len(parts))
+    np.maximum(polygon_areas, 0.0, out=polygon_areas)
+    areas += np.bincount(geometry_idx, weights=polygon_areas, minlength=len(geometries))
+    return areas / 1_000_000.0
+
+
+def _exterior_node_counts(geometries):
+    """Exterior ring coordinate counts, summed over parts (as count_nodes does for GeoJSON)."""
+    parts, geometry_idx = shapely.get_parts(geometries, return_index=True)
+    counts = shapely.get_num_coordinates(shapely.get_exterior_ring(parts))
+    return np.bincount(geometry_idx, weights=counts, minlength=len(geometries)).astype(np.int64)
+
+
+def _polygonal_result(repaired):
+    """Polygonal part of a make_valid() result, or None if there is none."""
+    if repaired is None or repaired.is_empty:
+        return None
+    # make_valid can return GeometryCollection; extract polygons
+    if repaired.geom_type == 'GeometryCollection':
+        polys = [g for g in repaired.geoms if g.geom_type in ('Polygon', 'MultiPolygon')]
+        if not polys:
+            return None
+        repaired = MultiPolygon(polys) if len(polys) > 1 else polys[0]
+    if repaired.geom_type not in ('Polygon', 'MultiPolygon'):
+        return None
+    return repaired
+
 
-    def unwrap_polygon(poly: Polygon) -> Polygon:
-        ext = _unwrap_ring_longitudes(list(poly.exterior.coords)) if poly.exterior else []
-        holes = [
-            _unwrap_ring_longitudes(list(r.coords))
-            for r in poly.interiors
+def _repair_polygonal(geom):
+    """make_valid() a geometry, keeping only polygonal output. Returns None if unfixable."""
+    return _polygonal_result(make_valid(geom))
+
+
+def repair_polygonal_array(geometries):
+    """make_valid() an array of geometries in one call, keeping polygonal output.
+
+    Returns an object array where geometries that could not be repaired are None.
+    If GEOS fails on the batch, geometries are repaired one at a time so a
+    single bad geometry only loses itself.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    out = np.empty(len(geometries), dtype=object)
+    try:
+        repaired = shapely.make_valid(geometries)
+    except Exception:
+        for k, geom in enumerate(geometries):
+            try:
+                out[k] = _repair_polygonal(geom)
+            except Exception as e:
+                print(f"Failed to repair geometry: {e}")
+        return out
+    type_ids = shapely.get_type_id(repaired)
+    # Polygon (3) and MultiPolygon (6) are used as-is
+    polygonal = ((type_ids == 3) | (type_ids == 6)) & ~shapely.is_empty(repaired)
+    out[polygonal] = repaired[polygonal]
+    # GeometryCollection (7) needs its polygons extracted
+    for k in np.flatnonzero(type_ids == 7):
+        try:
+            out[k] = _polygonal_result(repaired[k])
+        except Exception as e:
+            print(f"Failed to repair geometry: {e}")
+    return out
+
+
+def _new_feature_result(index, invalid_original):
+    return {
+        "index": index,
+        "records": [],
+        "invalid_original": invalid_original,
+        "invalid_outputs": 0,
+        "filtered_antimeridian": 0,
+        "repaired": False,
+        "unfixable": False,
+        "big": False,
+    }
+
+
+def _prepare_features(items, repair_invalid, timings):
+    """Parse, validate, antimeridian-split and optionally repair a batch of features.
+
+    Validity is only computed for items whose invalid_original is None (it was
+    not cached by the scan pass), in one vectorized is_valid call. Repair
+    runs one vectorized make_valid over the split geometries of every invalid
+    feature, so a valid feature is never checked twice and an invalid one is
+    not re-validated before repair.
+
+    Returns a list of (result, geom) pairs where result is a fresh
+    subdivide_feature result dict and geom is the Shapely geometry to
+    subdivide, or None if the feature is finished (unfixable, or unparseable
+    and already written through to result["records"]).
+    """
+    parsed = []
+    for index, geometry, properties, invalid_original in items:
+        try:
+            parsed.append(shape(geometry))
+        except Exception as e:
+            parsed.append(e)
+
+    is_parsed = [not isinstance(geom, Exception) for geom in parsed]
+    unknown = [
+        k for k, item in enumerate(items)
+        if item[3] is None and is_parsed[k]
+    ]
+    start = time.perf_counter()
+    valid = is_valid([parsed[k] for k in unknown]) if unknown else []
+    timings["validate_seconds"] += time.perf_counter() - start
+    timings["num_validated"] += len(unknown)
+    validity = dict(zip(unknown, valid))
+
+    prepared = []
+    for k, (index, geometry, properties, invalid_original) in enumerate(items):
+        if invalid_original is None:
+            invalid_original = not validity.get(k, False)
+        result = _new_feature_result(index, invalid_original)
+        # Common props for all outputs from this input feature
+        base_props = dict(properties)
+        base_props['__oidx'] = index
+        result["base_props"] = base_props
+
+        if not is_parsed[k]:
+            if repair_invalid:
+                print(f"Failed to repair feature {index}: {parsed[k]}")
+                result["unfixable"] = True
+            else:
+                # Geometry Shapely cannot parse (e.g. rings with too few points) is
+                # written unchanged and counted as invalid.
+                result["records"].append((geometry, base_props, False))
+            prepared.append((result, None))
+            continue
+        prepared.append((result, antimeridian_split_geometry(parsed[k])))
+
+    if repair_invalid:
+        to_repair = [
+            k for k, (result, geom) in enumerate(prepared)
+            if geom is not None and result["invalid_original"]
         ]
-        return Polygon(ext, holes)
+        if to_repair:
+            start = time.perf_counter()
+            repaired = repair_polygonal_array([prepared[k][1] for k in to_repair])
+            timings["make_valid_seconds"] += time.perf_counter() - start
+            timings["num_make_valid"] += len(to_repair)
+            for k, geom in zip(to_repair, repaired):
+                result = prepared[k][0]
+                if geom is None:
+                    print(f"Failed to repair feature {result['index']}: no polygonal result")
+                    result["unfixable"] = True
+                else:
+                    result["repaired"] = True
+                prepared[k] = (result, geom)
+    return prepared
+
+
+def _subdivide_prepared(result, geom, max_nodes, strategy):
+    """Subdivide a prepared feature geometry into result["records"]."""
+    base_props = result.pop("base_props")
+    if geom is None:
+        return result
+    subdivide = get_subdivision_strategy(strategy)
+    records = result["records"]
+    polygons = list(geom.geoms) if geom.geom_type == 'MultiPolygon' else [geom]
+    for polygon in polygons:
+        # Decide on the exterior ring node count (consistent with count_nodes)
+        exterior = polygon.exterior if polygon.geom_type == 'Polygon' else None
+        exterior_nodes = get_num_coordinates(exterior) if exterior is not None else 0
+        if exterior_nodes > max_nodes:
+            result["big"] = True
+            for part, _ in subdivide(polygon, max_nodes):
+                records.append((part, base_props, True))
+        else:
+            records.append((polygon, base_props, False))
+    return result
 
-    parts = []
-    polys = list(g.geoms) if isinstance(g, MultiPolygon) else [g]
-    for poly in polys:
-        p_unwrap = unwrap_polygon(poly)
-        minx, miny, maxx, maxy = p_unwrap.bounds
-        lines = []
-        start = math.floor((minx - 180) / 360) * 360 + 180
-        x = start
-        while x <= maxx + 1e-9:
-            lines.append(LineString([(x, -90), (x, 90)]))
-            x += 360
-        splitter = MultiLineString(lines) if len(lines) > 1 else (lines[0] if lines else None)
-        split_result = [p_unwrap]
-        if splitter is not None:
+
+def _new_repair_timings():
+    return {
+        "validate_seconds": 0.0,
+        "make_valid_seconds": 0.0,
+        "num_validated": 0,
+        "num_make_valid": 0,
+    }
+
+
+def subdivide_feature(
+    index,
+    geometry,
+    properties,
+    max_nodes,
+    repair_invalid=False,
+    invalid_original=None,
+    strategy='bisect',
+):
+    """Split, optionally repair, and subdivide a single input feature.
+
+    This is the per-feature unit of work; process_file runs the same stages
+    over whole chunks of features (see _subdivide_chunk). It has no side
+    effects. Output pieces stay Shapely geometries; _finalize_records filters,
+    measures and serializes them in bulk.
+
+    Args:
+        index: Position of the feature in the input, written as __oidx
+        geometry: GeoJSON-like Polygon or MultiPolygon (2D, EPSG:4326)
+        properties: Input feature properties
+        max_nodes: Maximum number of nodes per output geometry
+        repair_invalid: If True, attempt make_valid() on invalid geometries
+        invalid_original: Whether the input geometry is known to be invalid.
+            If None, validity is checked here.
+        strategy: Subdivision strategy for large polygons ('bisect' or 'quadtree')
+
+    Returns:
+        dict with keys:
+            index: the input index
+            records: list of (geometry, properties, is_split) tuples
+            invalid_original: whether the input geometry was invalid
+            invalid_outputs: how many records have invalid geometry
+            filtered_antimeridian: how many pieces were dropped as antimeridian artifacts
+            repaired: True if make_valid() repaired the feature
+            unfixable: True if the feature could not be repaired and was skipped
+            big: True if any part exceeded max_nodes and was subdivided
+    """
+    [(result, geom)] = _prepare_features(
+        [(index, geometry, properties, invalid_original)],
+        repair_invalid,
+        _new_repair_timings(),
+    )
+    return _subdivide_prepared(result, geom, max_nodes, strategy)
+
+
+def _read_input_features(src, strip_dimensions, invalid_original_indices=None):
+    """Yield (index, geometry, properties, invalid_original) tuples for subdivide_feature.
+
+    Geometries and properties are plain dicts so they can be sent to worker processes.
+    """
+    for index, feature in enumerate(src):
+        geometry = (
+            strip_extra_dimensions(feature['geometry'])
+            if strip_dimensions
+            else dict(feature['geometry'])
+        )
+        invalid_original = (
+            None if invalid_original_indices is None else index in invalid_original_indices
+        )
+        yield (index, geometry, dict(feature['properties']), invalid_original)
+
+
+def _finalize_records(feature_results, keep_geometries=False):
+    """Prepare every record of a chunk of subdivide_feature results for writing.
+
+    Antimeridian artifact filtering, validity checks, node counts and geodesic
+    areas run once over all records of the chunk using vectorized Shapely
+    functions. Pieces of invalid originals are checked with is_valid; invalid
+    pieces of repaired features (splitting make_valid output can still yield
+    an invalid piece) are repaired again in one make_valid batch, and only
+    counted as invalid outputs if that fails. Records become (geometry,
+    properties, progress_nodes) tuples, where geometry is GeoJSON, or with
+    keep_geometries the piece's WKB: the process that writes the output
+    needs the pieces for overlap detection too (see _decode_wkb_records), and
+    one representation is cheaper to send back from a worker than two.
+    """
+    entries = []
+    for feature_result in feature_results:
+        for geom, props, is_split in feature_result["records"]:
+            entries.append((feature_result, geom, props, is_split))
+        feature_result["records"] = []
+    if not entries:
+        return
+
+    is_geometry = np.fromiter(
+        (isinstance(geom, BaseGeometry) for _, geom, _, _ in entries), dtype=bool, count=len(entries)
+    )
+    geoms = np.empty(len(entries), dtype=object)
+    geoms[is_geometry] = [geom for _, geom, _, _ in itertools.compress(entries, is_geometry)]
+
+    kept = filter_antimeridian_artifacts_array(geoms)
+    is_kept = ~shapely.is_missing(kept)
+    # Only pieces of invalid originals can be invalid
+    needs_check = is_kept & np.fromiter(
+        (feature_result["invalid_original"] for feature_result, _, _, _ in entries),
+        dtype=bool,
+        count=len(entries),
+    )
+    invalid = np.zeros(len(entries), dtype=bool)
+    invalid[needs_check] = ~shapely.is_valid(kept[needs_check])
+    repair = np.flatnonzero(invalid & np.fromiter(
+        (feature_result["repaired"] for feature_result, _, _, _ in entries),
+        dtype=bool,
+        count=len(entries),
+    ))
+    if len(repair) > 0:
+        repaired = repair_polygonal_array(kept[repair])
+        fixed = ~shapely.is_missing(repaired)
+        kept[repair[fixed]] = repaired[fixed]
+        invalid[repair[fixed]] = False
+    node_counts = _exterior_node_counts(kept)
+    areas = geodesic_areas_sqkm(kept)
+    if keep_geometries:
+        wkb = np.empty(len(entries), dtype=object)
+        wkb[is_kept] = shapely.to_wkb(kept[is_kept])
+
+    for k, (feature_result, geom, props, is_split) in enumerate(entries):
+        if not is_geometry[k]:
+            # Unparseable GeoJSON passed through by subdivide_feature
+            props = dict(props)
+            props.setdefault('__area', 0.0)
+            if feature_result["invalid_original"]:
+                feature_result["invalid_outputs"] += 1
             try:
-                split_result = list(split(p_unwrap, splitter).geoms)
+                progress_nodes = count_nodes(geom)
             except Exception:
-                split_result = [p_unwrap]
-        for piece in split_result:
-            # Shift the entire piece by a multiple of 360 so its centroid.x is within [-180, 180]
-            cx = piece.centroid.x
-            shift = -360 * math.floor((cx + 180.0) / 360.0)
-            if abs(shift) > 1e-9:
-                def _shift_func(x, y, z=None):
-                    return (x + shift, y)
-                piece = transform(_shift_func, piece)
-            if not piece.is_empty:
-                parts.append(piece)
+                progress_nodes = 0
+            feature_result["records"].append((geom, props, progress_nodes))
+            continue
+        if not is_kept[k]:
+            feature_result["filtered_antimeridian"] += 1
+            continue
+        props = dict(props)
+        if '__area' not in props:
+            props['__area'] = float(areas[k])
+        if invalid[k]:
+            feature_result["invalid_outputs"] += 1
+        progress_nodes = int(node_counts[k]) - (1 if is_split else 0)
+        geometry = wkb[k] if keep_geometries else mapping(kept[k])
+        feature_result["records"].append((geometry, props, progress_nodes))
+
+
+def _decode_wkb_records(feature_results, overlaps):
+    """Turn the WKB records of a keep_geometries chunk into GeoJSON for
+    writing, and add the pieces to the OverlapCollector overlaps."""
+    positions = []
+    wkb = []
+    oidx = []
+    for feature_result in feature_results:
+        for k, (geometry, _, _) in enumerate(feature_result["records"]):
+            if isinstance(geometry, bytes):
+                positions.append((feature_result["records"], k))
+                wkb.append(geometry)
+                oidx.append(feature_result["index"])
+    if not wkb:
+        return
+    geometries = shapely.from_wkb(wkb)
+    overlaps.add(wkb, shapely.get_num_coordinates(geometries), oidx)
+    for (records, k), geom in zip(positions, geometries):
+        _, props, progress_nodes = records[k]
+        records[k] = (mapping(geom), props, progress_nodes)
+
+
+def _subdivide_chunk(items, max_nodes, repair_invalid, strategy='bisect', keep_geometries=False):
+    """Validate, repair and subdivide a chunk of _read_input_features items,
+    then finalize every output record of the chunk in one batch.
+
+    Returns (results, repair_timings).
+    """
+    timings = _new_repair_timings()
+    results = [
+        _subdivide_prepared(result, geom, max_nodes, strategy)
+        for result, geom in _prepare_features(items, repair_invalid, timings)
+    ]
+    _finalize_records(results, keep_geometries)
+    return results, timings
+
+
+class PolygonScan:
+    """Results of the scan pass: node count and invalid original features.
+
+    process_file builds one while reading its input, and scan_polygon_stream
+    builds one from a FlatGeobuf that is still being downloaded. With
+    histogram=True it also records the VertexHistogram that max_nodes "auto"
+    mode needs.
+    """
+
+    def __init__(self, histogram=False):
+        self.num_features = 0
+        self.total_nodes = 0
+        self.invalid_original_indices = set()
+        self.validate_seconds = 0.0
+        self.histogram = VertexHistogram() if histogram else None
+
+    def add(self, feature_geom):
+        """Scan the next feature's (2D) GeoJSON-like geometry."""
+        nodes = count_nodes(feature_geom)
+        self.total_nodes += nodes
+        if self.histogram is not None:
+            self.histogram.add(nodes, geometry_extent(feature_geom))
+        validate_start = time.perf_counter()
+        if is_invalid_geometry(feature_geom):
+            self.invalid_original_indices.add(self.num_features)
+        self.validate_seconds += time.perf_counter() - validate_start
+        self.num_features += 1
+
+
+def scan_polygon_stream(chunks, histogram=False):
+    """Run the scan pass over FlatGeobuf bytes as they arrive.
+
+    Args:
+        chunks: Iterable of consecutive byte chunks of the file
+        histogram: Also record the VertexHistogram for max_nodes "auto" mode
+
+    Returns:
+        PolygonScan, or None as soon as a feature is not a Polygon or
+        MultiPolygon (process_file then scans the file itself)
+    """
+    parser = FeatureStreamParser()
+    scan = PolygonScan(histogram=histogram)
+    for data in chunks:
+        for feature in parser.feed(data):
+            feature_geom = decode_polygonal_geometry(feature, parser.header['geometry_type'])
+            if feature_geom is None:
+                return None
+            scan.add(feature_geom)
+    return scan
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
 
-    if not parts:
-        return geom_geojson
-    result = MultiPolygon(parts) if len(parts) > 1 else parts[0]
-    result_geojson = mapping(result)
-    # Final normalize to guard against split/shift edge cases near 180/-180.
-    result_geojson = normalize_geojson_longitudes(result_geojson)
-    return result_geojson
 
 def process_file(
     input_file,
@@ -287,37 +987,91 @@ def process_file(
     progress_callback=None,
     repair_invalid=False,
     strip_dimensions=None,
+    single_pass=False,
+    workers=1,
+    strategy='bisect',
+    detect_overlaps=False,
+    overlap_stats=False,
+    scan=None,
+    metrics=None,
 ):
     """Process the input file and write the subdivided output as FlatGeobuf.
     
     Args:
         input_file: Path to input file (any format supported by Fiona)
         output_file: Path to output FlatGeobuf file
-        max_nodes: Maximum number of nodes per geometry
+        max_nodes: Maximum number of nodes per geometry, or "auto" to choose it
+            from the scan pass's vertex histogram (see auto_max_nodes). In
+            single-pass mode there is no scan and "auto" means 256.
         progress_callback: Optional callback function(phase, current, total) for progress updates
         repair_invalid: If True, attempt shapely make_valid() on invalid geometries.
             Only features that cannot be repaired are counted as invalid.
+        single_pass: If True, skip the scanning pass and validate features while
+            processing them. Progress is reported in features (using the feature
+            count from the FlatGeobuf header) rather than nodes.
+        workers: Number of worker processes used to subdivide features. With more
+            than one worker, features are read in this process, subdivided in a
+            process pool and written in input order, so output is identical to a
+            serial run.
+        strategy: How polygons over max_nodes are subdivided. 'bisect' (default)
+            recursively splits along the longer axis; 'quadtree' clips into
+            quadrants or halves, keeping whichever of the vertex-median or bbox
+            cut gives fewer pieces. It is faster on large polygons and writes
+            about as many pieces as 'bisect' or fewer (see benchmark.py
+            check-area).
+        detect_overlaps: If True, check whether pieces of different input
+            features overlap (see detect_overlapping_features). Output pieces
+            are kept in memory as WKB for the check, up to
+            overlap.overlap_max_coords_from_env() coordinates (a quarter of the
+            Lambda function's memory by default); larger outputs are checked by
+            reading the output file.
+        overlap_stats: If True, find every overlapping pair of pieces from
+            different input features instead of sampling (see
+            overlap.exact_overlap_stats) and report overlap_stats. This also
+            sets contains_overlapping_features, exactly.
+        scan: PolygonScan of the input made ahead of time, e.g. by
+            scan_polygon_stream while the input was downloading. If it covers
+            every input feature (and has a histogram, if max_nodes is "auto")
+            the scan pass is skipped. Ignored in single-pass mode.
+        metrics: Optional JobMetrics that receives the scanning, processing
+            and overlap_detection phase times and input/output counts
     
     Returns:
         dict with keys:
+            max_nodes: the max_nodes used
+            max_nodes_model: inputs and candidate costs of the auto max_nodes
+                model (only present when max_nodes was "auto" and chosen
+                from a scan)
             num_features: total features in the output FlatGeobuf (post-subdivision)
             num_invalid_features: how many output features have invalid geometry
             num_repaired_features: how many invalid originals were successfully repaired
                 via make_valid() (only present when repair_invalid=True)
+            repair_timings: seconds spent validating and repairing, and how many
+                features each step covered (only present when repair_invalid=True)
+            contains_overlapping_features: whether pieces of different input
+                features overlap (only present when detect_overlaps or
+                overlap_stats is True)
+            overlap_stats: num_overlapping_feature_pairs, num_overlapping_piece_pairs,
+                overlap_area_sqkm, num_failed_piece_pairs and num_passes (only
+                present when overlap_stats=True)
     """
+    progress_callback = throttle_progress(progress_callback)
+    metrics = metrics if metrics is not None else JobMetrics()
+    auto_max_nodes = max_nodes == "auto"
+    max_nodes_model = None
     total_nodes = 0
     total_features = 0
     batch = []
-    invalid_original_indices = set()
     output_feature_count = 0
     invalid_output_feature_count = 0
     repaired_count = 0
     filtered_antimeridian_count = 0
-    
-    # Geodesic calculator (input is always EPSG:4326)
-    geod = Geod(ellps="WGS84")
+    # Validation happens once per input feature, in the scan pass or (in
+    # single-pass mode) in the chunk workers; make_valid runs in batches.
+    repair_timings = _new_repair_timings()
     
     # First pass: get schema, count nodes, and detect invalid geometries
+    scan_start = time.perf_counter()
     with fiona.open(input_file, "r") as src:
         schema = src.schema.copy()
         if strip_dimensions is None:
@@ -329,91 +1083,105 @@ def process_file(
             schema['properties']['__oidx'] = 'int'
         total_features = len(src)
 
-        total_nodes_in_dataset = int(0)  # Explicit 64-bit integer for large datasets
-        # Report scanning progress by number of features read
-        scanned_features = 0
-        if progress_callback is not None:
-          try:
-            progress_callback('scanning', 0, total_features)
-          except Exception:
-            pass
-        scan_idx = 0
-        for feature in src:
-          feature_geom = (
-              strip_extra_dimensions(feature['geometry'])
-              if strip_dimensions
-              else feature['geometry']
-          )
-          total_nodes_in_dataset += count_nodes(feature_geom)
-          try:
-            geom = shape(feature_geom)
-            if not is_valid(geom):
-              invalid_original_indices.add(scan_idx)
-          except Exception:
-            invalid_original_indices.add(scan_idx)
-          scan_idx += 1
-          scanned_features += 1
+        if scan is not None and (
+            single_pass
+            or scan.num_features != total_features
+            or (auto_max_nodes and scan.histogram is None)
+        ):
+          if not single_pass:
+            print(f"Ignoring scan of {scan.num_features} features; input has {total_features}")
+          scan = None
+        if scan is not None:
+          print(f"Using scan of {scan.num_features} features made during download")
           if progress_callback is not None:
             try:
-              progress_callback('scanning', scanned_features, total_features)
+              progress_callback('scanning', total_features, total_features)
+            except Exception:
+              pass
+        else:
+          scan = PolygonScan(histogram=auto_max_nodes and not single_pass)
+          # Report scanning progress by number of features read
+          if progress_callback is not None and not single_pass:
+            try:
+              progress_callback('scanning', 0, total_features)
             except Exception:
               pass
+          # In single-pass mode the feature count from the header is enough for
+          # progress, and validity is checked as each feature is processed.
+          for feature in ([] if single_pass else src):
+            feature_geom = (
+                strip_extra_dimensions(feature['geometry'])
+                if strip_dimensions
+                else feature['geometry']
+            )
+            scan.add(feature_geom)
+            if progress_callback is not None:
+              try:
+                progress_callback('scanning', scan.num_features, total_features)
+              except Exception:
+                pass
+
+    metrics.add_time('scanning', time.perf_counter() - scan_start)
+    total_nodes_in_dataset = int(scan.total_nodes)  # Explicit 64-bit integer for large datasets
+    invalid_original_indices = scan.invalid_original_indices
+    repair_timings["validate_seconds"] += scan.validate_seconds
+    repair_timings["num_validated"] += scan.num_features
 
     if len(invalid_original_indices) > 0:
         print(f"Detected {len(invalid_original_indices)} invalid original features out of {total_features} total")
 
-    unfixable_count = 0
+    if auto_max_nodes:
+        if scan.histogram is not None:
+            max_nodes, max_nodes_model = choose_max_nodes(scan.histogram, **model_settings_from_env())
+            print(f"Chose max_nodes={max_nodes} from the vertex histogram of {scan.num_features} features")
+        else:
+            max_nodes = DEFAULT_MAX_NODES
+            print(f"No scan pass in single-pass mode; using max_nodes={max_nodes}")
+
+    # Progress is measured in nodes when the scan pass counted them, otherwise
+    # in features.
+    progress_total = total_features if single_pass else total_nodes_in_dataset
 
-    big_poly_indexes = {}
-    i = 0
-    total_small_nodes_added = 0
-    total_node_count = 0
+    unfixable_count = 0
+    big_feature_count = 0
+    processed_features = 0
     cumulative_processed_nodes = int(0)
 
-    def geodesic_area_sqkm(geom_geojson):
-        """Compute geodesic area in sq km directly from GeoJSON coordinates using pyproj.Geod.
-        Supports Polygon and MultiPolygon. Holes are subtracted from the exterior.
-        """
-        def polygon_area_sq_m(coords):
-            if not coords or len(coords) == 0:
-                return 0.0
-            # Exterior
-            ext = coords[0]
-            if not ext or len(ext) < 3:
-                return 0.0
-            lons_ext = [pt[0] for pt in ext]
-            lats_ext = [pt[1] for pt in ext]
-            area_ext_m2, _ = geod.polygon_area_perimeter(lons_ext, lats_ext)
-            area_m2_total = abs(area_ext_m2)
-            # Holes
-            for hole in coords[1:]:
-                if not hole or len(hole) < 3:
-                    continue
-                lons_h = [pt[0] for pt in hole]
-                lats_h = [pt[1] for pt in hole]
-                area_h_m2, _ = geod.polygon_area_perimeter(lons_h, lats_h)
-                area_m2_total -= abs(area_h_m2)
-            return max(area_m2_total, 0.0)
-
-        gtype = geom_geojson.get('type')
-        if gtype == 'Polygon':
-            return polygon_area_sq_m(geom_geojson.get('coordinates', [])) / 1_000_000.0
-        elif gtype == 'MultiPolygon':
-            total_m2 = 0.0
-            for coords in geom_geojson.get('coordinates', []):
-                total_m2 += polygon_area_sq_m(coords)
-            return total_m2 / 1_000_000.0
-        else:
-            return 0.0
+    # Features are subdivided in chunks; each chunk is one unit of work for the
+    # process pool and one batch for the geodesic area stage.
+    try:
+      CHUNK_SIZE = int(os.getenv("SUBDIVIDE_CHUNK_SIZE", "128"))
+    except Exception:
+      CHUNK_SIZE = 128
+
+    # Fail on an unknown strategy before any work is done
+    get_subdivision_strategy(strategy)
+    task = partial(
+        _subdivide_chunk,
+        max_nodes=max_nodes,
+        repair_invalid=repair_invalid,
+        strategy=strategy,
+        keep_geometries=detect_overlaps or overlap_stats,
+    )
+    overlaps = OverlapCollector() if detect_overlaps or overlap_stats else None
+    # Start worker processes before opening the input so they do not inherit
+    # open GDAL datasets.
+    pool = OrderedProcessPool(task, workers, preload=[__name__]) if workers and workers > 1 else None
+    if pool is not None:
+      print(f"Subdividing with {pool.workers} worker processes")
 
     # Second pass: process features
-    with fiona.open(input_file, "r") as src:
-        with fiona.open(output_file, "w", driver="FlatGeobuf", crs=src.crs, schema=schema) as dst:
+    processing_start = time.perf_counter()
+    try:
+      with fiona.open(input_file, "r") as src:
+        with fiona.open(
+            output_file, "w", driver="FlatGeobuf", crs=src.crs, schema=schema, **output_layer_options()
+        ) as dst:
           # Initialize local progress bar only if no external callback is provided
           pbar = None if progress_callback is not None else tqdm(total=total_features, desc="Processing features")
           if progress_callback is not None:
             try:
-              progress_callback('processing_start', 0, total_nodes_in_dataset)
+              progress_callback('processing_start', 0, progress_total)
             except Exception:
               pass
           # batching doesn't seem to help, even though the fiona docs suggest
@@ -425,150 +1193,55 @@ def process_file(
           except Exception:
             BATCH_SIZE = 10000
 
-          def write(feature, is_split=False):
-            nonlocal output_feature_count
-            nonlocal invalid_output_feature_count
-            nonlocal filtered_antimeridian_count
-            geom_geojson = filter_antimeridian_artifacts(feature['geometry'])
-            if geom_geojson is None:
-              filtered_antimeridian_count += 1
-              return
-            props = dict(feature['properties'])
-            if '__area' not in props:
-              area_val = geodesic_area_sqkm(geom_geojson)
-              props['__area'] = area_val
-            batch.append({'geometry': geom_geojson, 'properties': props})
-            output_feature_count += 1
-            oidx = props.get('__oidx')
-            if oidx is not None and oidx in invalid_original_indices:
-              try:
-                if not is_valid(shape(geom_geojson)):
-                  invalid_output_feature_count += 1
-              except Exception:
-                invalid_output_feature_count += 1
-            nonlocal cumulative_processed_nodes
-            cumulative_processed_nodes += count_nodes(geom_geojson)
-            if is_split:
-              cumulative_processed_nodes -= 1
-            if progress_callback is not None:
-              try:
-                progress_callback('processing', cumulative_processed_nodes, total_nodes_in_dataset)
-              except Exception:
-                pass
-            if len(batch) >= BATCH_SIZE:
-              dst.writerecords(batch)
-              batch.clear()
-
-          # Process features (file is opened fresh in second pass)
-          for feature in src:
-            feature_geom = (
-                strip_extra_dimensions(feature['geometry'])
-                if strip_dimensions
-                else feature['geometry']
-            )
-            adjusted_geom = antimeridian_split_to_non_crossing(feature_geom)
-
-            # Optionally repair invalid geometries
-            if repair_invalid:
-              try:
-                geom_check = shape(adjusted_geom)
-                if not is_valid(geom_check):
-                  repaired = make_valid(geom_check)
-                  if repaired.is_empty:
-                    unfixable_count += 1
-                    i += 1
-                    continue
-                  # make_valid can return GeometryCollection; extract polygons
-                  if repaired.geom_type == 'GeometryCollection':
-                    polys = [g for g in repaired.geoms if g.geom_type in ('Polygon', 'MultiPolygon')]
-                    if not polys:
-                      unfixable_count += 1
-                      i += 1
-                      continue
-                    repaired = MultiPolygon(polys) if len(polys) > 1 else polys[0]
-                  if repaired.geom_type not in ('Polygon', 'MultiPolygon'):
-                    unfixable_count += 1
-                    i += 1
-                    continue
-                  adjusted_geom = mapping(repaired)
-                  repaired_count += 1
-              except Exception as e:
-                print(f"Failed to repair feature {i}: {e}")
-                unfixable_count += 1
-                i += 1
-                continue
-
-            # Common props for all outputs from this input feature
-            base_props = dict(feature['properties'])
-            base_props['__oidx'] = i
-
-            # Progress accounting helpers for subdivision
-            nodes_processed = 0
-            update_total = 0.0
-
-            def writeSubdividedFeature(f, f_node_count):
-              nonlocal nodes_processed
-              nonlocal update_total
-              # Slight adjustment carried over from previous logic
-              try:
-                f_node_adj = f_node_count - 2
-              except Exception:
-                f_node_adj = f_node_count
-              nodes_processed += f_node_adj
-              write(f, True)
-              if pbar is not None:
+          items = _read_input_features(
+              src,
+              strip_dimensions,
+              None if single_pass else invalid_original_indices,
+          )
+          chunks = _chunked(items, max(1, CHUNK_SIZE))
+          chunk_results = pool.imap(chunks, 1) if pool is not None else map(task, chunks)
+
+          def _chunk_feature_results():
+            for chunk_feature_results, chunk_timings in chunk_results:
+              for key, value in chunk_timings.items():
+                repair_timings[key] += value
+              if overlaps is not None:
+                _decode_wkb_records(chunk_feature_results, overlaps)
+              yield from chunk_feature_results
+
+          for feature_result in _chunk_feature_results():
+            if feature_result["invalid_original"]:
+              invalid_original_indices.add(feature_result["index"])
+            if feature_result["repaired"]:
+              repaired_count += 1
+            if feature_result["unfixable"]:
+              unfixable_count += 1
+            if feature_result["big"]:
+              big_feature_count += 1
+            filtered_antimeridian_count += feature_result["filtered_antimeridian"]
+            invalid_output_feature_count += feature_result["invalid_outputs"]
+
+            for geom_geojson, props, progress_nodes in feature_result["records"]:
+              batch.append({'geometry': geom_geojson, 'properties': props})
+              output_feature_count += 1
+              cumulative_processed_nodes += progress_nodes
+              if progress_callback is not None and not single_pass:
                 try:
-                  amount = f_node_adj / node_count
-                  update_total += amount
-                  if update_total < 1.0:
-                    pbar.update(amount)
+                  progress_callback('processing', cumulative_processed_nodes, total_nodes_in_dataset)
                 except Exception:
                   pass
-
-            any_big = False
-            if adjusted_geom['type'] == 'MultiPolygon':
-              if pbar is not None:
-                pbar.set_postfix({"Task": "Analyzing multipolygon parts"})
-              for coords in adjusted_geom['coordinates']:
-                poly_geom = {'type': 'Polygon', 'coordinates': coords}
-                # Count nodes of the exterior ring (consistent with count_nodes for Polygon)
-                part_nodes = len(coords[0]) if coords and len(coords) > 0 else 0
-                total_node_count += part_nodes
-                # Set denominator for progress updates within the wrapper
-                node_count = part_nodes
-                if part_nodes > max_nodes:
-                  any_big = True
-                  part_feature = fiona.Feature(
-                    geometry=fiona.Geometry.from_dict(poly_geom),
-                    properties=base_props
-                  )
-                  subdivide_and_write_feature(part_feature, writeSubdividedFeature, max_nodes)
-                else:
-                  props = dict(base_props)
-                  write({'geometry': poly_geom, 'properties': props})
-              if any_big:
-                big_poly_indexes[str(i)] = True
-              if pbar is not None:
-                pbar.update(1)
-            else:
-              # Single polygon case
-              node_count = count_nodes(adjusted_geom)
-              total_node_count += node_count
-              if node_count > max_nodes:
-                if pbar is not None:
-                  pbar.set_postfix({"Task": "Subdividing big features"})
-                adj_feature = fiona.Feature(
-                  geometry=fiona.Geometry.from_dict(adjusted_geom),
-                  properties=base_props
-                )
-                subdivide_and_write_feature(adj_feature, writeSubdividedFeature, max_nodes)
-                big_poly_indexes[str(i)] = True
-              else:
-                write({'geometry': adjusted_geom, 'properties': base_props})
-              if pbar is not None:
-                pbar.update(1)
-
-            i += 1
+              if len(batch) >= BATCH_SIZE:
+                dst.writerecords(batch)
+                batch.clear()
+
+            processed_features += 1
+            if pbar is not None:
+              pbar.update(1)
+            if progress_callback is not None and single_pass:
+              try:
+                progress_callback('processing', processed_features, progress_total)
+              except Exception:
+                pass
           if pbar is not None:
             try:
               pbar.close()
@@ -577,11 +1250,12 @@ def process_file(
           if batch:
             dst.writerecords(batch)
             batch.clear()
+          flush_progress(progress_callback)
 
           print(f"Total nodes in input dataset: {total_nodes}")
           print(f"Total features in input dataset: {total_features}")
-          print(f"Total small features in input dataset: {total_features - len(big_poly_indexes.keys())}")
-          print(f"Total big features in input dataset: {len(big_poly_indexes.keys())}")
+          print(f"Total small features in input dataset: {total_features - big_feature_count}")
+          print(f"Total big features in input dataset: {big_feature_count}")
           print(f"Total output features: {output_feature_count}")
           print(f"Filtered antimeridian box artifacts: {filtered_antimeridian_count}")
           print(f"Invalid original features: {len(invalid_original_indices)}")
@@ -589,6 +1263,24 @@ def process_file(
           if repair_invalid:
             print(f"Repaired features: {repaired_count}")
             print(f"Unfixable features (skipped): {unfixable_count}")
+          print(
+            f"Validated {repair_timings['num_validated']} features in "
+            f"{repair_timings['validate_seconds']:.2f}s"
+          )
+          if repair_invalid:
+            print(
+              f"make_valid on {repair_timings['num_make_valid']} features took "
+              f"{repair_timings['make_valid_seconds']:.2f}s"
+            )
+    finally:
+      if pool is not None:
+        pool.close()
+    metrics.add_time('processing', time.perf_counter() - processing_start)
+    metrics.count('input_features', total_features)
+    if not single_pass:
+      # Only the scan pass counts input vertices
+      metrics.count('input_vertices', total_nodes_in_dataset)
+    metrics.count('output_features', output_feature_count)
 
     # Validate final output bounds using dataset metadata/index.
     with fiona.open(output_file, "r") as out_src:
@@ -604,13 +1296,51 @@ def process_file(
             )
 
     result = {
+        "max_nodes": max_nodes,
         "num_features": output_feature_count,
         "num_invalid_features": invalid_output_feature_count,
         "num_filtered_antimeridian_artifacts": filtered_antimeridian_count,
     }
+    if max_nodes_model is not None:
+        result["max_nodes_model"] = max_nodes_model
     if repair_invalid:
         result["num_repaired_features"] = repaired_count
         result["was_repaired"] = True
+        result["repair_timings"] = {
+            key: round(value, 3) if isinstance(value, float) else value
+            for key, value in repair_timings.items()
+        }
+    overlap_start = time.perf_counter()
+    if overlap_stats:
+        if overlaps.available:
+            chunks = array_chunks(*overlaps.arrays())
+        else:
+            chunks = file_chunks(output_file)
+        stats = exact_overlap_stats(
+            chunks,
+            area_fn=geodesic_areas_sqkm,
+            max_coords=None if overlaps.available else overlaps.max_coords,
+        )
+        stats["overlap_area_sqkm"] = stats.pop("overlap_area")
+        print(
+            f"Overlapping feature pairs: {stats['num_overlapping_feature_pairs']}, "
+            f"overlap area: {stats['overlap_area_sqkm']:.3f} sq km "
+            f"({stats['num_passes']} passes, {time.perf_counter() - overlap_start:.2f}s)"
+        )
+        if stats["num_failed_piece_pairs"]:
+            print(
+                f"Warning: skipped {stats['num_failed_piece_pairs']} piece pairs whose "
+                "intersection could not be computed"
+            )
+        result["overlap_stats"] = stats
+        result["contains_overlapping_features"] = stats["num_overlapping_feature_pairs"] > 0
+    elif overlaps is not None:
+        if overlaps.available:
+            result["contains_overlapping_features"] = sample_overlaps(*overlaps.arrays())
+        else:
+            result["contains_overlapping_features"] = detect_overlapping_features(output_file)
+    if overlaps is not None:
+        metrics.add_time('overlap_detection', time.perf_counter() - overlap_start)
     return result
 
 
@@ -695,11 +1425,24 @@ def main():
     parser = argparse.ArgumentParser(description="Subdivide vector geometries into smaller parts and output as FlatGeobuf.")
     parser.add_argument("input", help="Input vector file (any format supported by Fiona).")
     parser.add_argument("output", help="Output FlatGeobuf file (must have .fgb extension).")
-    parser.add_argument("--max-nodes", type=int, default=256,
-                        help="Maximum number of nodes per geometry (default: 256).")
+    parser.add_argument("--max-nodes", type=parse_max_nodes, default=DEFAULT_MAX_NODES,
+                        help="Maximum number of nodes per geometry, or 'auto' (default: 256).")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="Skip the scanning pass and validate features while processing.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes used to subdivide features (default: 1).")
+    parser.add_argument("--strategy", choices=sorted(SUBDIVISION_STRATEGIES), default="bisect",
+                        help="How large polygons are subdivided (default: bisect). quadtree is faster "
+                             "on large polygons and writes about as many pieces as bisect or fewer.")
+    parser.add_argument("--overlap-stats", action="store_true",
+                        help="Report exact overlap statistics between pieces of different input features.")
     
     args = parser.parse_args()
 
+    if args.max_nodes is None:
+        print("Error: --max-nodes must be a positive integer or 'auto'.")
+        sys.exit(1)
+
     # Validate input file
     if not os.path.exists(args.input):
         print(f"Error: Input file {args.input} does not exist.")
@@ -711,7 +1454,8 @@ def main():
         sys.exit(1)
 
     # process_file now accepts file path directly
-    process_file(args.input, args.output, args.max_nodes)
+    process_file(args.input, args.output, args.max_nodes, single_pass=args.single_pass, workers=args.workers,
+                 strategy=args.strategy, overlap_stats=args.overlap_stats)
     print(f"\nSubdivision complete. Output written to {args.output}.")
 
 if __name__ == "__main__":